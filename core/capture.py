@@ -0,0 +1,434 @@
+"""
+Outgoing packet capture: an append-only binary log of every packet the
+drivers write, readable through mmap, with a decoder for the four
+protocols and time-accurate replay against a real or virtual device.
+
+File layout (little endian):
+    header   "LEDCAP" magic, u16 version, f64 wall-clock start time
+    records  u8 type, then
+             type 0 (string): u16 id, u16 length, UTF-8 bytes
+             type 1 (packet): u64 monotonic ns, u16 device id,
+                              u16 characteristic id, u16 length, payload
+             type 2 (session): u64 monotonic ns, f64 wall-clock time
+Device addresses and characteristic UUIDs are written once per session as
+strings and referenced by id, so a color packet costs 15 bytes plus its
+payload. Every recorder (app run) appends a session record first: string
+ids restart there, and packet timestamps are only comparable within one
+session. The recorder flushes every few packets or fractions of a second.
+A record cut short by a crash is dropped when the next recorder opens the
+file, and the reader skips a damaged record to the next session record.
+"""
+
+import argparse
+import asyncio
+import mmap
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from core.services import LoggerService as logger
+from core.drivers.device_factory import DeviceFactory
+
+MAGIC = b"LEDCAP"
+VERSION = 2
+_HEADER = struct.Struct("<6sHd")
+_STRING = struct.Struct("<BHH")
+_PACKET = struct.Struct("<BQHHH")
+_SESSION = struct.Struct("<BQd")
+_TYPE_STRING = 0
+_TYPE_PACKET = 1
+_TYPE_SESSION = 2
+_RECORD_TYPES = (_TYPE_STRING, _TYPE_PACKET, _TYPE_SESSION)
+
+
+def _record_end(data: Any, offset: int) -> Optional[int]:
+    """End offset of the record at offset, or None if it is cut off, overruns or is of an unknown type."""
+    size = len(data)
+    kind = data[offset]
+    if kind == _TYPE_SESSION:
+        end = offset + _SESSION.size
+    elif kind == _TYPE_STRING:
+        if offset + _STRING.size > size:
+            return None
+        end = offset + _STRING.size + _STRING.unpack_from(data, offset)[2]
+    elif kind == _TYPE_PACKET:
+        if offset + _PACKET.size > size:
+            return None
+        end = offset + _PACKET.size + _PACKET.unpack_from(data, offset)[4]
+    else:
+        return None
+    # A length read from a cut-off record runs into the next session's bytes
+    if end > size or (end < size and data[end] not in _RECORD_TYPES):
+        return None
+    return end
+
+
+def _next_session(data: Any, start: int, not_before: float) -> Optional[int]:
+    """Offset of the first plausible session record at or after start."""
+    size = len(data)
+    pos = data.find(bytes((_TYPE_SESSION,)), start)
+    latest = time.time() + 86400
+    while pos != -1 and pos + _SESSION.size <= size:
+        _, _, wall_time = _SESSION.unpack_from(data, pos)
+        after = pos + _SESSION.size
+        # A session record is followed by another record or the end of the file
+        if not_before <= wall_time <= latest and (after == size or data[after] in _RECORD_TYPES):
+            return pos
+        pos = data.find(bytes((_TYPE_SESSION,)), pos + 1)
+    return None
+
+
+def _complete_records(data: Any, started_at: float, path: str) -> Iterator[Tuple[int, int]]:
+    """
+    (offset, end) of every complete record after the header.
+
+    A damaged record (a crash mid-write, then another session appended
+    behind it) is skipped up to the next session record; a cut-off
+    record at the very end just ends the walk.
+    """
+    size = len(data)
+    offset = _HEADER.size
+    while offset < size:
+        end = _record_end(data, offset)
+        if end is None:
+            resume = _next_session(data, offset + 1, started_at)
+            if resume is None:
+                if data[offset] not in _RECORD_TYPES:
+                    logger.warning(f"Capture {path}: unknown record type {data[offset]} at offset {offset}, stopping")
+                return
+            logger.warning(f"Capture {path}: damaged record at offset {offset}, resuming at offset {resume}")
+            offset = resume
+            continue
+        yield offset, end
+        offset = end
+
+
+@dataclass(frozen=True)
+class CapturedPacket:
+    """One packet as a driver wrote it."""
+    timestamp_ns: int  # time.monotonic_ns() at write
+    device: str
+    characteristic: str
+    payload: bytes
+    session: int = 0  # index of the recording session within the file
+
+
+class PacketRecorder:
+    """
+    Appends packets to a capture file.
+
+    record() costs two struct packs and buffered writes; it is called
+    from AbstractLedDevice.write_packet when a recorder is attached and
+    not at all otherwise. Safe to share between devices and threads.
+    """
+
+    def __init__(self, path: str, *, flush_packets: int = 64, flush_interval: float = 0.5):
+        """
+        Args:
+            path: Capture file; appended to if it exists
+            flush_packets: Flush after this many unflushed packets
+            flush_interval: Flush when the oldest unflushed packet is this many seconds old
+        """
+        self.path = path
+        self.flush_packets = max(1, int(flush_packets))
+        self._flush_interval_ns = int(max(0.0, float(flush_interval)) * 1e9)
+        self._lock = threading.Lock()
+        self._ids: Dict[str, int] = {}
+        self.packets = 0
+        self._unflushed = 0
+        self._first_unflushed_ns = 0
+        self._file = open(path, "ab")
+        if self._file.tell() < _HEADER.size:
+            # New file, or one that crashed while writing its header
+            self._file.truncate(0)
+            self._file.write(_HEADER.pack(MAGIC, VERSION, time.time()))
+        else:
+            self._drop_partial_record()
+        # New time base: monotonic clocks of different runs are unrelated
+        self._file.write(_SESSION.pack(_TYPE_SESSION, time.monotonic_ns(), time.time()))
+        self._file.flush()
+
+    def _drop_partial_record(self) -> None:
+        """Cut a record left half-written by a crash so this session starts on a record boundary."""
+        size = self._file.tell()
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, version, started_at = _HEADER.unpack_from(data, 0)
+            if magic != MAGIC or version != VERSION:
+                self._file.close()
+                raise ValueError(f"{self.path} is not a version {VERSION} packet capture, not appending")
+            end = _HEADER.size
+            for _, end in _complete_records(data, started_at, self.path):
+                pass
+        if end < size:
+            logger.warning(f"Capture {self.path}: dropping {size - end} bytes of a partial record before appending")
+            self._file.truncate(end)
+            self._file.seek(end)
+
+    def _string_id(self, value: str) -> int:
+        string_id = self._ids.get(value)
+        if string_id is None:
+            # Ids are per recorder; a later session appending to the file declares its own
+            string_id = len(self._ids)
+            data = value.encode("utf-8")
+            self._file.write(_STRING.pack(_TYPE_STRING, string_id, len(data)) + data)
+            self._ids[value] = string_id
+        return string_id
+
+    def record(self, device: str, characteristic: str, payload: Union[bytes, bytearray]) -> None:
+        """Append one packet stamped with the current monotonic time."""
+        timestamp = time.monotonic_ns()
+        with self._lock:
+            if self._file.closed:
+                return
+            header = _PACKET.pack(
+                _TYPE_PACKET, timestamp, self._string_id(device), self._string_id(characteristic), len(payload)
+            )
+            self._file.write(header + payload)
+            self.packets += 1
+            # Bounded loss on a crash: flush by count or by age
+            if self._unflushed == 0:
+                self._first_unflushed_ns = timestamp
+            self._unflushed += 1
+            if (self._unflushed >= self.flush_packets
+                    or timestamp - self._first_unflushed_ns >= self._flush_interval_ns):
+                self._file.flush()
+                self._unflushed = 0
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                self._unflushed = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def __enter__(self) -> "PacketRecorder":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class CaptureReader:
+    """Iterates the packets of a capture file through a read-only mmap."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path} is empty, not a packet capture")
+        if len(self._map) < _HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is not a packet capture")
+        magic, self.version, self.started_at = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or self.version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} packet capture")
+        # Wall-clock start of each session, filled in while iterating
+        self.sessions: List[float] = []
+
+    def __iter__(self) -> Iterator[CapturedPacket]:
+        data = self._map
+        strings: Dict[int, str] = {}
+        session = -1
+        self.sessions = []
+        for offset, end in _complete_records(data, self.started_at, self.path):
+            kind = data[offset]
+            if kind == _TYPE_SESSION:
+                _, _, wall_time = _SESSION.unpack_from(data, offset)
+                session += 1
+                self.sessions.append(wall_time)
+                strings = {}
+            elif kind == _TYPE_STRING:
+                _, string_id, _ = _STRING.unpack_from(data, offset)
+                strings[string_id] = data[offset + _STRING.size:end].decode("utf-8")
+            else:
+                if session < 0:
+                    logger.warning(f"Capture {self.path}: packet before any session record, stopping")
+                    return
+                _, timestamp, device_id, char_id, _ = _PACKET.unpack_from(data, offset)
+                yield CapturedPacket(
+                    timestamp, strings.get(device_id, ""), strings.get(char_id, ""), data[offset + _PACKET.size:end],
+                    session
+                )
+
+    def close(self) -> None:
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self) -> "CaptureReader":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def read_capture(path: str) -> List[CapturedPacket]:
+    """All packets of a capture file."""
+    with CaptureReader(path) as reader:
+        return list(reader)
+
+
+@lru_cache(maxsize=64)
+def protocol_for_characteristic(uuid: str) -> Optional[str]:
+    """Protocol whose driver writes to this characteristic (None if unknown)."""
+    uuid = uuid.lower()
+    for protocol in ("elk_bledom", "triones", "magichome", "tuya"):
+        driver = DeviceFactory.create_driver(protocol)
+        candidates = driver.WRITE_CHAR_CANDIDATES or (driver.get_write_characteristic_uuid(),)
+        if uuid in (c.lower() for c in candidates):
+            return protocol
+    return None
+
+
+def decode_packet(packet: CapturedPacket, protocol: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Turn captured bytes back into a command.
+
+    Args:
+        packet: Captured packet
+        protocol: DeviceFactory protocol key; guessed from the characteristic if None
+
+    Returns:
+        The driver's decode_packet() result plus "protocol", or None if undecodable.
+    """
+    protocol = protocol or protocol_for_characteristic(packet.characteristic)
+    if protocol is None:
+        return None
+    decoded = type(DeviceFactory.create_driver(protocol)).decode_packet(packet.payload)
+    if decoded is not None:
+        decoded["protocol"] = protocol
+    return decoded
+
+
+async def replay(
+    packets: Iterable[CapturedPacket],
+    write: Callable[[CapturedPacket], Awaitable[Any]],
+    *,
+    speed: float = 1.0
+) -> int:
+    """
+    Re-issue packets with their original spacing.
+
+    The gap between recording sessions (app runs) is not replayed: the
+    first packet of a session goes out right after the last one of the
+    previous session.
+
+    Args:
+        packets: Captured packets in capture order
+        write: Coroutine function sending one packet
+        speed: Time scale (2.0 = twice as fast, 0 = no waiting at all)
+
+    Returns:
+        Number of packets written.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    first: Optional[int] = None
+    session: Optional[int] = None
+    count = 0
+    for packet in packets:
+        if packet.session != session:
+            # Timestamps of different sessions share no time base: re-anchor
+            session = packet.session
+            started = loop.time()
+            first = packet.timestamp_ns
+        if speed > 0:
+            # Scheduled against the start, so slow writes do not accumulate drift
+            delay = started + (packet.timestamp_ns - first) / 1e9 / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await write(packet)
+        count += 1
+    return count
+
+
+async def replay_to_client(
+    packets: Iterable[CapturedPacket],
+    client: Any,
+    *,
+    speed: float = 1.0,
+    device: Optional[str] = None
+) -> int:
+    """Replay onto a connected (Bleak or virtual) client, optionally one device's packets only."""
+    if device is not None:
+        packets = [p for p in packets if p.device.upper() == device.upper()]
+
+    async def write(packet: CapturedPacket) -> None:
+        await client.write_gatt_char(packet.characteristic, packet.payload, response=False)
+
+    return await replay(packets, write, speed=speed)
+
+
+def _format_packet(packet: CapturedPacket, first_ns: int) -> str:
+    decoded = decode_packet(packet)
+    if decoded is None:
+        text = "?"
+    else:
+        fields = " ".join(f"{k}={v}" for k, v in decoded.items() if k not in ("command", "protocol"))
+        text = f"{decoded['protocol']} {decoded['command']} {fields}"
+    offset_ms = (packet.timestamp_ns - first_ns) / 1e6
+    return f"{offset_ms:12.3f} ms  {packet.device:<17}  {packet.characteristic[4:8]}  {packet.payload.hex()}  {text}"
+
+
+async def _replay_command(args: argparse.Namespace) -> None:
+    packets = read_capture(args.capture)
+    if args.virtual:
+        from core.virtual import VirtualBleBackend, VirtualDeviceSpec
+        protocol = args.protocol or next(
+            (p for p in map(protocol_for_characteristic, (pk.characteristic for pk in packets)) if p),
+            "elk_bledom"
+        )
+        backend = VirtualBleBackend([VirtualDeviceSpec(args.address, protocol=protocol, write_latency=0.0)])
+        client = backend.create_client(args.address)
+    else:
+        from bleak import BleakClient
+        client = BleakClient(args.address)
+    async with client:
+        count = await replay_to_client(packets, client, speed=args.speed, device=args.device)
+    logger.info(f"Replayed {count} packets to {args.address}")
+    if args.virtual:
+        logger.info(f"Virtual device state: {backend.get(args.address).state()}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Inspect or replay an LED packet capture.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    dump = commands.add_parser("dump", help="Print packets with their decoded commands")
+    dump.add_argument("capture")
+    play = commands.add_parser("replay", help="Re-issue packets against a device")
+    play.add_argument("capture")
+    play.add_argument("--address", required=True, help="MAC of the device to write to")
+    play.add_argument("--speed", type=float, default=1.0, help="Time scale, 0 = as fast as possible")
+    play.add_argument("--device", help="Only replay packets captured from this MAC")
+    play.add_argument("--virtual", action="store_true", help="Replay against a virtual device")
+    play.add_argument("--protocol", help="Protocol of the virtual device (default: from the capture)")
+    args = parser.parse_args(argv)
+
+    if args.command == "dump":
+        with CaptureReader(args.capture) as reader:
+            first: Optional[int] = None
+            session: Optional[int] = None
+            for packet in reader:
+                if packet.session != session:
+                    session, first = packet.session, packet.timestamp_ns
+                    started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(reader.sessions[session]))
+                    print(f"-- session {session + 1}, started {started}")
+                print(_format_packet(packet, first))
+    else:
+        asyncio.run(_replay_command(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Command queue between the application bridge and the BLE writer.
+Continuous values (color, brightness, speed) are coalesced so only the
+newest survives; discrete commands (mode, disconnect) go through a
+priority lane and are never stuck behind a backlog of color frames.
+"""
+
+import threading
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Deque, Dict, List
+
+
+class CommandType(str, Enum):
+    """Kinds of commands accepted by the controller."""
+    DISCONNECT = "DISCONNECT"
+    CONNECT = "CONNECT"
+    MODE = "MODE"
+    SPEED = "SPEED"
+    BRIGHTNESS = "BRIGHTNESS"
+    COLOR = "COLOR"
+
+
+@dataclass(frozen=True)
+class Command:
+    """Single command for the BLE writer."""
+    type: CommandType
+    value: Any = None
+
+
+class CommandQueue:
+    """
+    Bounded, thread-safe command queue with latest-value coalescing.
+
+    - Discrete commands keep FIFO order in the priority lane (bounded;
+      the oldest mode change is dropped first when full).
+    - Continuous commands occupy one slot per type; a newer value
+      replaces the pending one.
+    - drain() returns the priority lane first, then the coalesced slots.
+    """
+
+    # Latest value wins for these types, in drain order
+    COALESCED_TYPES = (CommandType.SPEED, CommandType.BRIGHTNESS, CommandType.COLOR)
+
+    def __init__(self, max_discrete: int = 16):
+        self.max_discrete = max(1, int(max_discrete))
+        self._lock = threading.Lock()
+        self._discrete: Deque[Command] = deque()
+        self._latest: Dict[CommandType, Command] = {}
+
+        # Counters (read without the lock; informational only)
+        self.coalesced_count = 0
+        self.dropped_count = 0
+
+    def put(self, command: Command) -> None:
+        """Enqueue command (safe to call from any thread)."""
+        with self._lock:
+            if command.type in self.COALESCED_TYPES:
+                if command.type in self._latest:
+                    self.coalesced_count += 1
+                self._latest[command.type] = command
+                return
+
+            if len(self._discrete) >= self.max_discrete:
+                self._drop_oldest_discrete()
+            self._discrete.append(command)
+
+    def _drop_oldest_discrete(self) -> None:
+        """Make room in the priority lane, sparing disconnect/connect requests."""
+        for queued in self._discrete:
+            if queued.type not in (CommandType.DISCONNECT, CommandType.CONNECT):
+                self._discrete.remove(queued)
+                break
+        else:
+            self._discrete.popleft()
+        self.dropped_count += 1
+
+    def drain(self) -> List[Command]:
+        """Remove and return all pending commands in execution order."""
+        with self._lock:
+            commands = list(self._discrete)
+            self._discrete.clear()
+            for command_type in self.COALESCED_TYPES:
+                command = self._latest.pop(command_type, None)
+                if command is not None:
+                    commands.append(command)
+            return commands
+
+    def take(self, *command_types: CommandType) -> List[Command]:
+        """Remove and return the pending coalesced commands of command_types, in drain order."""
+        with self._lock:
+            return [
+                self._latest.pop(command_type)
+                for command_type in self.COALESCED_TYPES
+                if command_type in command_types and command_type in self._latest
+            ]
+
+    def clear(self) -> None:
+        """Drop all pending commands."""
+        with self._lock:
+            self._discrete.clear()
+            self._latest.clear()
+
+    def __len__(self) -> int:
+        """Number of pending commands (queue depth)."""
+        with self._lock:
+            return len(self._discrete) + len(self._latest)
@@ -5,14 +5,24 @@ Uses driver-based architecture for protocol abstraction.
 """
 
 import asyncio
+import concurrent.futures
 import threading
-from typing import Callable, Optional
-import psutil
-import math
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from bleak import BleakClient, BleakScanner, BLEDevice
-from core.models import Color, ColorMode, DeviceStatus, DeviceConfig
+from core.models import Color, ColorMode, DeviceStatus, DeviceConfig, DeviceShadow
 from core.services import LoggerService as logger, ConfigService
+from core.commands import Command, CommandQueue, CommandType
+from core.rate_limiter import RateGovernor
+from core.effects import EffectFrameCache, EffectScheduler, TABLE_FRAME_RATE
+from core.sampling import METRIC_MODE_SOURCES, MetricSampler
+from core.scanner import Advertisement, BleScanner, rank_candidates
+from core.profiles import ProfileStore
+from core.virtual import VirtualBleBackend
+from core.capture import PacketRecorder
+from core.metrics import REGISTRY, DeviceMetrics, MetricsRegistry, MetricsServer, summary_lines
+from core.gradient import MetricColorMapper
 from core.interfaces import AbstractLedDevice
 from core.drivers.device_factory import DeviceFactory
 
@@ -32,7 +42,17 @@ class BleDeviceController:
         auto_reconnect: bool = True,
         reconnect_interval: float = 5.0,
         use_real_device: bool = True,
-        initial_speed: int = 0x10
+        initial_speed: int = 0x10,
+        keepalive_interval: float = 10.0,
+        metric_sample_interval: float = 0.5,
+        gradients: Optional[Dict[str, Dict[str, Any]]] = None,
+        metric_sampler: Optional[MetricSampler] = None,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        scanner: Optional[BleScanner] = None,
+        profile_store: Optional[ProfileStore] = None,
+        virtual_backend: Optional[VirtualBleBackend] = None,
+        packet_recorder: Optional[PacketRecorder] = None,
+        metrics_registry: Optional[MetricsRegistry] = None
     ):
         self.device_config = device_config
         self.on_status_change = on_status_change
@@ -40,15 +60,49 @@ class BleDeviceController:
         
         self.client: Optional[BleakClient] = None
         self.device_driver: Optional[AbstractLedDevice] = None
-        self.loop = asyncio.new_event_loop()
+        # Own loop + thread by default; a DeviceManager passes its shared loop
+        self._owns_loop: bool = loop is None
+        self.loop = loop or asyncio.new_event_loop()
         self.thread: Optional[threading.Thread] = None
+        self._main_future: Optional[concurrent.futures.Future] = None
+        self._main_task: Optional[asyncio.Task] = None
+        # Shared advertisement index; None = scan on every connect attempt
+        self.scanner = scanner
+        # Fast reconnect: retry the last device (and keep its driver) before rescanning
+        self._last_device: Optional[BLEDevice] = None
+        self._link_lost_at: Optional[float] = None
+        self.connect_time_avg: Optional[float] = None  # EMA of connect duration, seconds
+        self.fast_connect_min: float = 2.0
+        self.fast_connect_max: float = 10.0
+        # Per-MAC profiles: known devices skip fingerprinting and service walking
+        self.profile_store = profile_store
+        self._profile_address: Optional[str] = None
+        # Ranked devices still to try when no MAC is configured (best first)
+        self._candidates: List[Advertisement] = []
+        # Capture of every packet written (None = off)
+        self.packet_recorder = packet_recorder
+        # Counters/histograms, preallocated so hot paths only do arithmetic
+        self.metrics = DeviceMetrics(
+            metrics_registry or REGISTRY,
+            device_config.device_id or device_config.target_mac or "default"
+        )
+        self._write_metrics = None
+        self._write_metrics_driver: Optional[AbstractLedDevice] = None
+        self._frames_dropped_seen: int = 0
+        self._commands_dropped_seen: int = 0
         # Reconnect policy
         self.auto_reconnect: bool = bool(auto_reconnect)
         self.reconnect_interval: float = max(1.0, float(reconnect_interval))
         self.use_real_device: bool = bool(use_real_device)
+        # Hardware-free runs: virtual devices stand in for the adapter
+        self.virtual_backend: Optional[VirtualBleBackend] = None
+        if not self.use_real_device:
+            self.virtual_backend = virtual_backend or VirtualBleBackend.from_configs([device_config])
 
         # Protocol/behavior
         self.speed: int = max(0, min(255, int(initial_speed)))
+        # Unchanged state is re-sent at most this often (0 = never)
+        self.keepalive_interval: float = max(0.0, float(keepalive_interval))
         # Backoff policy
         self.backoff_factor: float = 2.0
         self.backoff_max: float = 300.0  # max sleep between reconnect attempts
@@ -59,8 +113,46 @@ class BleDeviceController:
         self.current_color = Color()
         self.brightness = 1.0
         self.force_disconnect = False
+        # Set (thread-safely) whenever target state changes; created on the loop
+        self._wake_event: Optional[asyncio.Event] = None
+        self.rssi_interval: float = 5.0
+        # Commands submitted by the bridge, drained by the controller loop
+        self.commands = CommandQueue()
+        # Paces every frame source to the learned sustainable write rate
+        self.rate_governor = RateGovernor()
+        # Precomputed breath/rainbow cycles, invalidated on brightness/speed change
+        self.effect_cache = EffectFrameCache()
+        # Monotonic effect clock with frame-drop policy, restarted on mode change
+        self.effect_scheduler = EffectScheduler()
+        # Host effect currently rendering; cancelled and replaced on mode change
+        self._effect_task: Optional[asyncio.Task] = None
+        self._effect_mode: Optional[ColorMode] = None
+        # Background metric sampler; pass one in to share it between devices
+        self.metric_sampler = metric_sampler or MetricSampler(interval=metric_sample_interval)
+        # Metric-to-color mappers and source specs keyed by mode name
+        if gradients is None:
+            gradients = ConfigService.DEFAULT_CONFIG["gradients"]
+        self.metric_mappers: Dict[str, MetricColorMapper] = {}
+        self.metric_source_specs: Dict[str, str] = {}
+        # Valid gradient configs, for groups that map this device's metrics with their own state
+        self.gradients: Dict[str, Dict[str, Any]] = {}
+        for name, cfg in gradients.items():
+            try:
+                self.metric_mappers[name] = MetricColorMapper.from_config(cfg)
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Skipping invalid gradient {name}: {e}")
+                continue
+            self.gradients[name] = cfg
+            if cfg.get("source"):
+                self.metric_source_specs[name] = cfg["source"]
+        self._last_metric_sample: Optional[float] = None
+        
+        # DeviceGroup rendering for this device (own effects and color writes pause)
+        self.group = None
         
         self.status = DeviceStatus()
+        # Last state actually written to the device (dirty-tracking)
+        self.shadow = DeviceShadow()
     
     def start(self):
         """Start BLE controller in background thread."""
@@ -69,44 +161,139 @@ class BleDeviceController:
             return
         
         self.is_running = True
-        self.thread = threading.Thread(
-            target=self._run_event_loop,
-            daemon=True,
-            name="BLE-Controller"
-        )
-        self.thread.start()
+        if self._owns_loop:
+            self.thread = threading.Thread(
+                target=self._run_event_loop,
+                daemon=True,
+                name="BLE-Controller"
+            )
+            self.thread.start()
+        else:
+            # Runs as a task on the shared loop (no thread of its own)
+            self._main_future = asyncio.run_coroutine_threadsafe(self._main_loop(), self.loop)
         logger.info("BLE controller started")
     
     def stop(self):
         """Stop BLE controller."""
         self.is_running = False
+        self._request_wake()
+        self._cancel_main_task()
         if self.thread:
             self.thread.join(timeout=5.0)
+        future = self._main_future
+        self._main_future = None
+        if future is not None and not self._on_loop_thread():
+            concurrent.futures.wait([future], timeout=5.0)
         logger.info("BLE controller stopped")
     
+    def _on_loop_thread(self) -> bool:
+        """Check if the caller runs on the controller's event loop thread."""
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+    
+    def _cancel_main_task(self):
+        """Interrupt the main loop wherever it waits (scan, backoff sleep)."""
+        task = self._main_task
+        if task is None or task.done() or self.loop.is_closed():
+            return
+        try:
+            self.loop.call_soon_threadsafe(task.cancel)
+        except RuntimeError:
+            # Loop closed between the check and the call
+            pass
+    
     def _run_event_loop(self):
         """Run asyncio event loop."""
         asyncio.set_event_loop(self.loop)
         try:
             self.loop.run_until_complete(self._main_loop())
+        except asyncio.CancelledError:
+            pass
         except Exception as e:
             logger.error(f"Event loop error: {e}")
         finally:
             self.loop.close()
     
+    def _request_wake(self):
+        """Wake the controller loop immediately (safe to call from any thread)."""
+        event = self._wake_event
+        if event is None or self.loop.is_closed():
+            return
+        try:
+            self.loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            # Loop closed between the check and the call
+            pass
+    
+    def _create_client(self, device: BLEDevice, **kwargs) -> BleakClient:
+        """BleakClient for device, or a virtual one when use_real_device is off."""
+        if self.virtual_backend is not None:
+            return self.virtual_backend.create_client(device, **kwargs)
+        return BleakClient(device, **kwargs)
+    
+    def _scanner_api(self):
+        """Discovery entry points: BleakScanner, or the virtual backend."""
+        return self.virtual_backend if self.virtual_backend is not None else BleakScanner
+    
+    def _on_client_disconnected(self, client: BleakClient):
+        """Bleak disconnect callback: let the loop notice the drop right away."""
+        self._request_wake()
+    
+    async def _wait_for_wake(self, timeout: Optional[float]):
+        """Sleep until a setter wakes the loop or the timeout (seconds) expires."""
+        event = self._wake_event
+        if event is None:
+            await asyncio.sleep(timeout or 0)
+            return
+        if not event.is_set():
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        event.clear()
+    
+    def _next_wake_timeout(self, last_rssi_check: float) -> float:
+        """Time until the next scheduled housekeeping (RSSI poll or keepalive)."""
+        now = time.monotonic()
+        deadline = last_rssi_check + self.rssi_interval
+        if self.keepalive_interval > 0 and self.shadow.last_write > 0:
+            deadline = min(deadline, self.shadow.last_write + self.keepalive_interval)
+        return max(0.0, deadline - now)
+    
     async def _main_loop(self):
         """Main BLE connection and communication loop."""
+        self._main_task = asyncio.current_task()
+        self._wake_event = asyncio.Event()
         reconnect_count = 0
         max_reconnect_attempts = 10
         
         while self.is_running:
+            fast_path = False
+            device: Optional[BLEDevice] = None
+            connected = False
             try:
-                # Attempt to find device
-                self.status.is_connected = False
-                self._emit_status_change("Device search...", "scanning")
-                logger.debug("Scanning for BLE device...")
+                self._drain_commands()
                 
-                device = await self._find_device()
+                self.status.is_connected = False
+                if self.force_disconnect:
+                    # Stay disconnected until a CONNECT command clears the flag
+                    self._emit_status_change("Disconnected", "disconnected")
+                    await self._wait_for_wake(None)
+                    continue
+                if self._last_device is not None and self.device_driver is not None:
+                    # Fast path: cached device and driver, no scan
+                    fast_path = True
+                    device = self._last_device
+                    logger.debug(f"Fast reconnect to {device.address}")
+                else:
+                    # Attempt to find device
+                    self._emit_status_change("Device search...", "scanning")
+                    logger.debug("Scanning for BLE device...")
+                    scan_started = time.monotonic()
+                    device = await self._find_device()
+                    self.metrics.scan_duration.observe(time.monotonic() - scan_started)
                 
                 if not device:
                     reconnect_count += 1
@@ -125,45 +312,82 @@ class BleDeviceController:
                 # Connect to device
                 self._emit_status_change(f"Connecting to {device.name}...", "connecting")
                 
-                async with BleakClient(device) as client:
+                connect_started = time.monotonic()
+                client_kwargs = {"timeout": self._fast_connect_timeout()} if fast_path else {}
+                async with self._create_client(
+                    device,
+                    disconnected_callback=self._on_client_disconnected,
+                    **client_kwargs
+                ) as client:
                     self.client = client
+                    fast_path = False
+                    self._record_connect(device, connect_started)
+                    connected = True
                     
                     # Connect driver to client
                     if self.device_driver:
+                        self.device_driver.recorder = self.packet_recorder
+                        self.device_driver.packet_metrics = self.metrics.packets_for(
+                            DeviceFactory.get_protocol_key(self.device_driver) or "unknown"
+                        )
                         await self.device_driver.connect(client)
+                        self._update_profile(device, client)
+                    # Device state is unknown after (re)connect: resend everything
+                    self.shadow.invalidate()
                     
                     self.status.is_connected = True
                     self.status.device_name = device.name or "Unknown Device"
                     self._emit_status_change("Connected", "connected")
                     logger.success(f"Connected to {device.name}")
 
-                    # Communication loop
+                    # Connection supervisor; host effects run in their own task
                     last_rssi_check = 0.0
-                    while client.is_connected and self.is_running:
-                        if self.force_disconnect:
-                            break
+                    try:
+                        while client.is_connected and self.is_running:
+                            self._drain_commands()
+                            if self.force_disconnect:
+                                break
 
-                        # Periodic RSSI read (every ~5s)
-                        try:
-                            now = self.loop.time()
-                            if now - last_rssi_check >= 5.0:
-                                last_rssi_check = now
-                                rssi = await self._read_rssi()
-                                if isinstance(rssi, int):
-                                    self.status.signal_strength = rssi
-                                    self._emit_status_change("RSSI updated", "info")
-                        except Exception as e:
-                            # Non-critical: RSSI failures should be debug-only
-                            logger.debug(f"RSSI read failed: {e}")
+                            # Periodic RSSI read (every ~5s)
+                            try:
+                                now = time.monotonic()
+                                if now - last_rssi_check >= self.rssi_interval:
+                                    last_rssi_check = now
+                                    rssi = await self._read_rssi()
+                                    if isinstance(rssi, int):
+                                        self.status.signal_strength = rssi
+                                        self.metrics.rssi.set(rssi)
+                                        self._emit_status_change("RSSI updated", "info")
+                            except Exception as e:
+                                # Non-critical: RSSI failures should be debug-only
+                                logger.debug(f"RSSI read failed: {e}")
 
-                        # Execute current mode
-                        await self._execute_mode()
-                        await asyncio.sleep(0.1)
+                            # Apply current mode (starts/replaces the effect task)
+                            await self._execute_mode()
+                            
+                            # Sleep until a setter, a disconnect or housekeeping wakes us
+                            await self._wait_for_wake(self._next_wake_timeout(last_rssi_check))
+                    finally:
+                        await self._cancel_effect_task()
+                        if self.is_running and not self.force_disconnect:
+                            self._link_lost_at = time.monotonic()
                 
             except asyncio.CancelledError:
                 logger.debug("BLE task cancelled")
                 break
             except Exception as e:
+                if fast_path:
+                    # Cached device did not answer in time: rescan right away
+                    logger.debug(f"Fast reconnect failed, rescanning: {e}")
+                    self._last_device = None
+                    continue
+                if device is not None and not connected and self.profile_store is not None:
+                    # Only failures to connect count; errors on an established link do not
+                    self.profile_store.record_connect_failure(device.address)
+                if self._candidates:
+                    # Next ranked candidate right away; backoff once all failed
+                    logger.debug(f"Connect failed, trying next candidate: {e}")
+                    continue
                 # Distinguish GATT connection timeouts from other exceptions using exception types when possible
                 self.status.is_connected = False
                 is_timeout = self._is_gatt_timeout_exception(e)
@@ -196,6 +420,62 @@ class BleDeviceController:
             
             self.client = None
     
+    def _fast_connect_timeout(self) -> float:
+        """Connect timeout for the fast path, learned from past connect durations."""
+        if self.connect_time_avg is None:
+            return self.fast_connect_max / 2
+        return max(self.fast_connect_min, min(self.fast_connect_max, 2.5 * self.connect_time_avg))
+    
+    def _record_connect(self, device: BLEDevice, started: float):
+        """Remember the device and publish connect / time-to-reconnect metrics."""
+        now = time.monotonic()
+        duration = now - started
+        if self.connect_time_avg is None:
+            self.connect_time_avg = duration
+        else:
+            self.connect_time_avg += 0.3 * (duration - self.connect_time_avg)
+        self._last_device = device
+        self._candidates = []
+        self.status.connect_time_ms = round(duration * 1000, 1)
+        self.metrics.connect_duration.observe(duration)
+        if self._link_lost_at is not None:
+            self.status.reconnect_time_ms = round((now - self._link_lost_at) * 1000, 1)
+            self.status.reconnect_count += 1
+            self.metrics.reconnects.inc()
+            self.metrics.reconnect_duration.observe(now - self._link_lost_at)
+            self._link_lost_at = None
+            logger.info(f"Reconnected in {self.status.reconnect_time_ms:.0f} ms")
+    
+    def _update_profile(self, device: BLEDevice, client: BleakClient):
+        """Store what this connect learned in the device profile."""
+        if self.profile_store is None:
+            return
+        try:
+            known = self.profile_store.get(device.address)
+            driver = self.device_driver
+            self.profile_store.record_connect(
+                device.address,
+                protocol=DeviceFactory.get_protocol_key(driver),
+                write_char_uuid=driver.actual_uuid or driver.get_write_characteristic_uuid(),
+                connect_time_ms=self.status.connect_time_ms,
+                # GATT layout only walked for devices without a profile
+                services=None if known and known.services else self._gatt_summary(client)
+            )
+            self._profile_address = device.address
+        except Exception as e:
+            logger.debug(f"Device profile update failed: {e}")
+    
+    @staticmethod
+    def _gatt_summary(client: BleakClient) -> Dict[str, list]:
+        """Service UUID -> characteristic UUIDs of a connected client."""
+        try:
+            return {
+                str(service.uuid): [str(char.uuid) for char in service.characteristics]
+                for service in client.services
+            }
+        except Exception:
+            return {}
+    
     async def _find_device(self) -> Optional[BLEDevice]:
         """
         Find BLE device by MAC or name.
@@ -203,10 +483,24 @@ class BleDeviceController:
         """
         try:
             device: Optional[BLEDevice] = None
+            advertisement: Optional[Advertisement] = None
+            
+            if self._candidates:
+                # Remaining ranked candidates from the last scan
+                advertisement = self._candidates.pop(0)
+                await self._initialize_driver(advertisement.device, advertisement)
+                return advertisement.device
+            
+            if self.scanner is not None and self.scanner.is_running:
+                advertisement = await self._find_device_in_index()
+                if advertisement is None:
+                    return None
+                await self._initialize_driver(advertisement.device, advertisement)
+                return advertisement.device
             
             # Try to find by MAC
             if self.device_config.target_mac:
-                device = await BleakScanner.find_device_by_address(
+                device = await self._scanner_api().find_device_by_address(
                     self.device_config.target_mac,
                     timeout=5.0
                 )
@@ -215,31 +509,58 @@ class BleDeviceController:
             
             # Fallback: scan and search by name
             if not device:
-                devices = await BleakScanner.discover(timeout=5.0)
-                search_names = ["ELK", "LED", "CTRL", "RGB"]
-                
-                for d in devices:
-                    if d.name and any(n in d.name.upper() for n in search_names):
-                        device = d
-                        logger.info(f"Found device by name scan: {device.name}")
-                        break
+                discovered = await self._scanner_api().discover(timeout=5.0, return_adv=True)
+                advertisement = self._pick_candidate(
+                    Advertisement.from_bleak(d, data) for d, data in discovered.values()
+                )
+                if advertisement:
+                    device = advertisement.device
             
             # Initialize driver if device found
             if device:
-                await self._initialize_driver(device)
+                await self._initialize_driver(device, advertisement)
             
             return device
         except Exception as e:
             logger.debug(f"Device discovery error: {e}")
             return None
     
-    async def _initialize_driver(self, device: BLEDevice) -> None:
+    async def _find_device_in_index(self) -> Optional[Advertisement]:
+        """Look the device up in the live advertisement index (no blocking scan)."""
+        if self.device_config.target_mac:
+            advertisement = await self.scanner.wait_for(self.device_config.target_mac, timeout=5.0)
+            if advertisement:
+                logger.info(f"Found device by MAC: {advertisement.name or advertisement.address}")
+                return advertisement
+            return None
+        
+        # No MAC configured: best ranked supported device
+        return self._pick_candidate(self.scanner.index.entries())
+    
+    def _pick_candidate(self, advertisements) -> Optional[Advertisement]:
+        """
+        Rank supported devices by signal, fingerprint confidence and connect
+        history; return the best and queue the rest for the next attempts.
+        """
+        ranked = rank_candidates(advertisements, self.profile_store)
+        if not ranked:
+            return None
+        best, self._candidates = ranked[0], ranked[1:]
+        logger.info(
+            f"Found device by scan: {best.name or best.address} "
+            f"(RSSI {best.rssi}, {len(self._candidates)} more candidates)"
+        )
+        return best
+    
+    async def _initialize_driver(self, device: BLEDevice, advertisement: Optional[Advertisement] = None) -> None:
         """
         Initialize device driver based on configuration or auto-detection.
         
         Args:
             device: BLEDevice instance for fingerprinting (if auto-detect needed)
+            advertisement: Classified advertisement of the device, if one was seen
         """
+        profile = self.profile_store.get(device.address) if self.profile_store else None
         try:
             # Create driver using factory
             if self.device_config.protocol:
@@ -248,12 +569,31 @@ class BleDeviceController:
                     protocol_type=self.device_config.protocol
                 )
                 logger.info(f"Using explicit protocol: {self.device_config.protocol}")
+            elif profile and profile.protocol and DeviceFactory.is_protocol_supported(profile.protocol):
+                # Known device: no fingerprinting
+                self.device_driver = DeviceFactory.create_driver(protocol_type=profile.protocol)
+                logger.info(f"Using profiled protocol: {profile.protocol}")
+            elif advertisement is not None and advertisement.driver_class is not None:
+                # Picked from name / service UUIDs / manufacturer data: no probing
+                self.device_driver = advertisement.driver_class()
+                logger.info(
+                    f"Detected protocol from advertisement: {self.device_driver.get_protocol_name()} "
+                    f"(confidence {advertisement.confidence:.2f})"
+                )
             else:
                 # Auto-detect protocol
                 self.device_driver = DeviceFactory.create_driver(device=device)
                 protocol_name = self.device_driver.get_protocol_name()
                 logger.info(f"Auto-detected protocol: {protocol_name}")
             
+            self.rate_governor.set_max_rate(self.device_driver.MAX_FRAME_RATE)
+            
+            if profile and profile.protocol == DeviceFactory.get_protocol_key(self.device_driver):
+                # Known characteristic: the driver skips walking the services
+                self.device_driver.known_write_uuid = profile.write_char_uuid
+                if self.connect_time_avg is None and profile.connect_time_ms:
+                    self.connect_time_avg = profile.connect_time_ms / 1000
+            
             # Update device config with driver's UUID if not set
             if not self.device_config.write_char_uuid:
                 self.device_config.write_char_uuid = self.device_driver.get_write_characteristic_uuid()
@@ -265,99 +605,261 @@ class BleDeviceController:
             try:
                 from core.drivers.elk_bledom import ElkBledomDriver
                 self.device_driver = ElkBledomDriver()
+                self.rate_governor.set_max_rate(self.device_driver.MAX_FRAME_RATE)
                 logger.warning("Falling back to ELK-BLEDOM driver")
             except Exception:
                 logger.error("Could not initialize fallback driver")
                 raise
     
     async def _execute_mode(self):
-        """Execute current effect mode."""
-        if self.current_mode == ColorMode.MANUAL:
-            await self._send_color(self.current_color)
+        """
+        Apply the current mode.
         
-        elif self.current_mode == ColorMode.CPU:
-            await self._execute_cpu_mode()
+        A running effect task for another mode is cancelled first, then the
+        device mode is synced; MANUAL writes the color directly, host effects
+        get (or keep) their own task.
+        """
+        mode = self.current_mode
+        if self._effect_mode != mode or self.group is not None:
+            await self._cancel_effect_task()
         
-        elif self.current_mode == ColorMode.BREATH:
-            await self._execute_breath_mode()
+        await self._send_mode_command(mode)
         
-        elif self.current_mode == ColorMode.RAINBOW:
-            await self._execute_rainbow_mode()
+        if self.group is not None:
+            # The group writes the frames; only the device mode is synced here
+            return
+        
+        if mode == ColorMode.MANUAL:
+            await self._paced_write(self._render_manual_color)
+            return
+        
+        task = self._effect_task
+        if task is not None and task.done():
+            if not task.cancelled() and task.exception() is not None:
+                logger.debug(f"Effect task failed: {task.exception()}")
+            task = None
+        if task is None:
+            self._effect_mode = mode
+            self._effect_task = asyncio.get_running_loop().create_task(self._run_effect(mode))
     
-    async def _execute_cpu_mode(self):
-        """CPU-based color mode."""
+    async def _cancel_effect_task(self):
+        """Cancel the running effect task (if any) and wait for it to finish."""
+        task = self._effect_task
+        self._effect_task = None
+        self._effect_mode = None
+        if task is None or task.done():
+            return
+        task.cancel()
         try:
-            cpu = psutil.cpu_percent(interval=0.5)
-            self.status.cpu_usage = cpu
-            
-            # Color gradient based on CPU usage
-            if cpu < 40:
-                color = Color(0, 200, 255)  # Cyan
-            elif cpu < 70:
-                color = Color(138, 43, 226)  # Violet
+            await task
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.debug(f"Effect task error on cancel: {e}")
+    
+    async def _run_effect(self, mode: ColorMode):
+        """Effect task body: render the host effect for mode until cancelled."""
+        if mode in METRIC_MODE_SOURCES:
+            await self._run_metric_effect(mode)
+            return
+        while self.is_running and self.current_mode == mode:
+            if mode == ColorMode.BREATH:
+                await self._execute_breath_mode()
+            elif mode == ColorMode.RAINBOW:
+                await self._execute_rainbow_mode()
             else:
-                color = Color(255, 0, 0)  # Red
+                return
+            # Yield between cycles
+            await asyncio.sleep(0)
+    
+    def _metric_source_spec(self, mode: ColorMode) -> str:
+        """Metric source spec for a metric mode (gradient config may override)."""
+        return self.metric_source_specs.get(mode.value, METRIC_MODE_SOURCES[mode])
+    
+    async def _run_metric_effect(self, mode: ColorMode):
+        """Subscribe the mode's metric for as long as the effect runs."""
+        spec = self._metric_source_spec(mode)
+        try:
+            self.metric_sampler.subscribe(spec)
+        except ValueError as e:
+            logger.warning(f"Metric mode {mode.value} unavailable: {e}")
+            return
+        try:
+            while self.is_running and self.current_mode == mode:
+                await self._execute_metric_mode(mode)
+                await asyncio.sleep(0)
+        finally:
+            self.metric_sampler.unsubscribe(spec)
+    
+    async def _execute_metric_mode(self, mode: ColorMode):
+        """
+        Metric-based color mode, one frame.
+        
+        Reads the latest sample published by the background sampler, so the
+        event loop never blocks and the mode renders at the effect frame rate.
+        """
+        try:
+            self.effect_scheduler.frame_interval = max(1.0 / TABLE_FRAME_RATE, self.rate_governor.interval)
+            await self.effect_scheduler.wait_next_frame()
+            
+            buffer = self.metric_sampler.buffer(self._metric_source_spec(mode))
+            sample = buffer.latest() if buffer else None
+            if sample is None:
+                return
+            timestamp, value = sample
+            self.status.metric_value = value
+            if mode == ColorMode.CPU:
+                self.status.cpu_usage = value
             
-            await self._send_color(color)
+            mapper = self.metric_mappers.get(mode.value)
+            if mapper is None:
+                return
+            # Feed each sample once so smoothing does not depend on frame rate
+            if timestamp != self._last_metric_sample:
+                self._last_metric_sample = timestamp
+                mapper.update(value)
+            
+            # Shadow dedupes the unchanged color; keepalive still refreshes it
+            if mapper.current is not None:
+                await self._send_color(mapper.current)
         except Exception as e:
-            logger.debug(f"CPU mode error: {e}")
+            logger.debug(f"{mode.value} mode error: {e}")
     
     async def _execute_breath_mode(self):
         """Neon breath effect."""
+        await self._play_frame_table(ColorMode.BREATH)
+    
+    async def _execute_rainbow_mode(self):
+        """Rainbow cycle effect."""
+        await self._play_frame_table(ColorMode.RAINBOW)
+    
+    async def _play_frame_table(self, mode: ColorMode):
+        """
+        Play one cycle of a precomputed periodic effect.
+        
+        Frames are evaluated at the scheduler's effect time, so a slow link
+        drops frames instead of slowing the effect down.
+        """
         try:
-            for i in range(0, 314):
-                if self.current_mode != ColorMode.BREATH or not self.is_running:
+            scheduler = self.effect_scheduler
+            if not scheduler.started:
+                scheduler.reset()
+            cycle_end = None
+            while True:
+                if self.current_mode != mode or not self.is_running:
                     break
                 
-                val = (math.sin(i / 50) + 1) / 2
-                color = Color(
-                    r=int(160 * val),
-                    g=int(32 * val),
-                    b=int(240 * val)
-                )
+                # Never schedule faster than the device can take
+                scheduler.frame_interval = max(1.0 / TABLE_FRAME_RATE, self.rate_governor.interval)
+                t = await scheduler.wait_next_frame()
                 
-                await self._send_color(color)
-                await asyncio.sleep(0.02)
+                # Looked up per frame so brightness/speed changes apply mid-cycle;
+                # the frame itself is picked once the governor slot is ours
+                table = self.effect_cache.get(mode, self.brightness, self.speed)
+                if cycle_end is None:
+                    cycle_end = t + table.period
+                elif t >= cycle_end:
+                    break
+                
+                await self._paced_write(lambda: self._render_table_frame(mode))
+                self.status.frames_dropped = scheduler.frames_dropped
+                if scheduler.frames_dropped != self._frames_dropped_seen:
+                    self.metrics.frames_dropped.inc(scheduler.frames_dropped - self._frames_dropped_seen)
+                    self._frames_dropped_seen = scheduler.frames_dropped
+                self.status.frame_jitter_ms = round(scheduler.jitter_avg * 1000, 2)
         except Exception as e:
-            logger.debug(f"Breath mode error: {e}")
+            logger.debug(f"{mode.value} mode error: {e}")
     
-    async def _execute_rainbow_mode(self):
-        """Rainbow cycle effect."""
-        try:
-            colors = [
-                Color(255, 0, 0),      # Red
-                Color(255, 127, 0),    # Orange
-                Color(255, 255, 0),    # Yellow
-                Color(0, 255, 0),      # Green
-                Color(0, 0, 255),      # Blue
-                Color(75, 0, 130),     # Indigo
-                Color(148, 0, 211),    # Violet
-            ]
-            
-            idx = 0
-            while self.current_mode == ColorMode.RAINBOW and self.is_running:
-                color = colors[idx % len(colors)]
-                await self._send_color(color)
-                idx += 1
-                await asyncio.sleep(0.5)
-        except Exception as e:
-            logger.debug(f"Rainbow mode error: {e}")
+    def _render_table_frame(self, mode: ColorMode) -> Tuple[Color, Optional[bytes]]:
+        """Frame of the mode's table at the current effect time, pre-encoded if possible."""
+        table = self.effect_cache.get(mode, self.brightness, self.speed)
+        i = table.index_at(self.effect_scheduler.elapsed())
+        packets = table.packets_for(self.device_driver) if self.device_driver else None
+        return table.colors[i], packets[i] if packets else None
+    
+    def _render_manual_color(self) -> Tuple[Color, Optional[bytes]]:
+        """Final manual color, taking a newer color or brightness still waiting in the queue."""
+        for command in self.commands.take(CommandType.BRIGHTNESS, CommandType.COLOR):
+            self._apply_command(command)
+        self.metrics.queue_depth.set(len(self.commands))
+        return self.current_color.apply_brightness(self.brightness), None
     
-    async def _send_color(self, color: Color):
-        """Send color to BLE device via driver."""
+    def _is_keepalive_due(self) -> bool:
+        """Check if unchanged state should be refreshed on the device."""
+        if self.keepalive_interval <= 0:
+            return False
+        return time.monotonic() - self.shadow.last_write >= self.keepalive_interval
+    
+    async def _send_color(self, color: Color, force: bool = False):
+        """
+        Send color to BLE device via driver.
+        
+        The write is skipped when the final color matches the shadow
+        and no keepalive refresh is due, unless force is set.
+        """
+        await self._paced_write(lambda: (color.apply_brightness(self.brightness), None), force)
+    
+    async def _paced_write(self, render: Callable[[], Tuple[Color, Optional[bytes]]], force: bool = False):
+        """
+        Wait for a rate governor slot, then write what render() returns.
+        
+        render() gives (final color, pre-encoded frame or None). It is called
+        again after the wait, which can last a full governor interval, so the
+        write carries the newest state instead of the one seen before it.
+        """
+        if not force and not self._color_write_due(render()[0]):
+            return
+        await self.rate_governor.acquire()
+        final_color, frame = render()
+        await self._write_color(final_color, frame, force)
+    
+    def _color_write_due(self, final_color: Color) -> bool:
+        """Check if final_color differs from the device or a keepalive refresh is due."""
+        return self.shadow.is_color_dirty(final_color) or self._is_keepalive_due()
+    
+    async def _write_color(
+        self,
+        final_color: Color,
+        frame: Optional[bytes] = None,
+        force: bool = False
+    ):
+        """
+        Write a final (brightness-applied) color now, optionally as a pre-encoded frame.
+        
+        Does not wait for the rate governor: callers reserve the slot first
+        (see _paced_write()).
+        
+        Args:
+            final_color: Color as it should appear on the wire
+            frame: Packet already encoded by the current driver, if available
+            force: Write even if the shadow says the device already shows it
+        """
         if not self.device_driver:
             logger.warning("No device driver initialized")
             return
         
         try:
-            final_color = color.apply_brightness(self.brightness)
-            success = await self.device_driver.set_color(
-                final_color.r,
-                final_color.g,
-                final_color.b
-            )
+            if not force and not self._color_write_due(final_color):
+                return
+            
+            started = time.monotonic()
+            try:
+                if frame is not None:
+                    success = await self.device_driver.write_frame(frame)
+                else:
+                    success = await self.device_driver.set_color(
+                        final_color.r,
+                        final_color.g,
+                        final_color.b
+                    )
+            except Exception:
+                self._record_write(False, started)
+                raise
+            self._record_write(success, started)
             
             if success:
+                self.shadow.color = final_color
+                self.shadow.last_write = time.monotonic()
                 self.status.current_color = final_color
                 try:
                     self.on_color_received(final_color)
@@ -374,6 +876,25 @@ class BleDeviceController:
                     max(self.current_backoff * self.backoff_factor, self.reconnect_interval)
                 )
 
+    def _record_write(self, success: bool, started: float):
+        """Feed a write outcome to the rate governor and metrics, and publish the limit."""
+        latency = time.monotonic() - started
+        if success:
+            self.rate_governor.record_success(latency)
+        else:
+            self.rate_governor.record_failure()
+        if self._write_metrics_driver is not self.device_driver:
+            # Resolved once per driver, not per write
+            self._write_metrics_driver = self.device_driver
+            driver_key = DeviceFactory.get_protocol_key(self.device_driver) if self.device_driver else None
+            self._write_metrics = self.metrics.writes_for(driver_key or "unknown")
+        self._write_metrics.record(success, latency)
+        self.status.frame_rate_limit = round(self.rate_governor.rate, 1)
+        if self.profile_store is not None and self.profile_store.record_write(self._profile_address, success):
+            # Profile went stale: walk the services again on the next connect
+            if self.device_driver is not None:
+                self.device_driver.known_write_uuid = None
+    
     async def _send_mode_command(self, mode: ColorMode) -> bool:
         """Send mode command via driver."""
         if not self.device_driver:
@@ -383,16 +904,35 @@ class BleDeviceController:
             # Get mode mapping from driver (static method, call via class)
             driver_class = self.device_driver.__class__
             mode_mapping = driver_class.get_supported_modes()
-            mode_name = mode.value
+            # Metric modes are host-rendered like CPU; the device runs its CPU mode
+            mode_name = ColorMode.CPU.value if mode in METRIC_MODE_SOURCES else mode.value
+            
+            if not self.shadow.is_mode_dirty(mode, self.speed):
+                return True
             
             if mode_name not in mode_mapping:
+                # Remember it so the loop does not retry (and warn) every pass
+                self.shadow.mode = mode
+                self.shadow.speed = self.speed
                 logger.warning(f"Mode {mode_name} not supported by driver")
                 return False
             
             mode_id = mode_mapping[mode_name]
-            success = await self.device_driver.set_mode(mode_id, self.speed)
+            await self.rate_governor.acquire()
+            started = time.monotonic()
+            try:
+                success = await self.device_driver.set_mode(mode_id, self.speed)
+            except Exception:
+                self._record_write(False, started)
+                raise
+            self._record_write(success, started)
             
             if success:
+                self.shadow.mode = mode
+                self.shadow.speed = self.speed
+                # Mode command may change what the device displays
+                self.shadow.color = None
+                self.shadow.last_write = time.monotonic()
                 self.status.current_mode = mode
                 logger.debug(f"Mode set: {mode_name} (ID: {mode_id})")
             
@@ -401,38 +941,82 @@ class BleDeviceController:
             logger.error(f"Error sending mode command: {e}")
             return False
     
+    def submit(self, command: Command):
+        """
+        Queue a command for the controller loop (safe to call from any thread).
+        
+        Color, brightness and speed are coalesced (latest wins); mode changes
+        and disconnect requests are applied ahead of them.
+        """
+        self.commands.put(command)
+        self.metrics.queue_depth.set(len(self.commands))
+        self._request_wake()
+    
+    def _drain_commands(self):
+        """Apply all pending commands to the target state, priority lane first."""
+        commands = self.commands.drain()
+        self.metrics.queue_depth.set(0)
+        # Published from the loop thread, which owns the counter
+        dropped = self.commands.dropped_count
+        if dropped != self._commands_dropped_seen:
+            self.metrics.commands_dropped.inc(dropped - self._commands_dropped_seen)
+            self._commands_dropped_seen = dropped
+        for command in commands:
+            try:
+                self._apply_command(command)
+            except Exception as e:
+                logger.debug(f"Command {command.type.value} failed: {e}")
+    
+    def _apply_command(self, command: Command):
+        """Dispatch a single command to the matching setter."""
+        if command.type == CommandType.DISCONNECT:
+            self.request_disconnect()
+        elif command.type == CommandType.CONNECT:
+            self.request_connect()
+        elif command.type == CommandType.MODE:
+            self.set_mode(command.value)
+        elif command.type == CommandType.SPEED:
+            self.set_speed(command.value)
+        elif command.type == CommandType.BRIGHTNESS:
+            self.set_brightness(command.value)
+        elif command.type == CommandType.COLOR:
+            self.set_color(command.value)
+    
     def set_mode(self, mode: ColorMode):
-        """Change effect mode."""
+        """Change effect mode. The device is updated from the controller loop."""
         if self.current_mode != mode:
             self.current_mode = mode
             self.status.current_mode = mode
+            self.effect_scheduler.reset()
             logger.info(f"Mode changed: {mode.value}")
-            # Try to immediately notify device of mode change (best-effort)
-            try:
-                if self.loop and self.client and self.client.is_connected:
-                    asyncio.run_coroutine_threadsafe(self._send_mode_command(mode), self.loop)
-            except Exception:
-                logger.debug("Failed to send mode change immediately; will apply in loop")
+            self._request_wake()
             self._emit_status_change(f"Mode: {mode.value}", "info")
     
     def set_color(self, color: Color):
         """Set manual color (for MANUAL mode)."""
         self.current_color = color
+        self._request_wake()
     
     def set_brightness(self, brightness: float):
         """Set brightness level (0.0 - 1.0)."""
-        self.brightness = max(0.0, min(1.0, brightness))
+        brightness = max(0.0, min(1.0, brightness))
+        if brightness != self.brightness:
+            self.brightness = brightness
+            self.effect_cache.invalidate()
+        self._request_wake()
 
     def set_speed(self, speed: int):
         """
-        Set effect speed (0 - 255). Optionally resend current mode.
+        Set effect speed (0 - 255).
         
-        Speed is stored and used in subsequent packets.
+        Speed is stored and used in subsequent packets; the controller loop
+        resends the current mode because the shadow speed no longer matches.
         Also updates driver if it supports speed setting.
         """
         s = max(0, min(255, int(speed)))
         if s != self.speed:
             self.speed = s
+            self.effect_cache.invalidate()
             logger.info(f"Speed set to {self.speed}")
             
             # Update driver speed if supported
@@ -442,18 +1026,21 @@ class BleDeviceController:
                 except Exception:
                     pass
             
-            # Best-effort: resend current mode so that device adjusts speed
-            try:
-                if self.loop and self.client and self.client.is_connected:
-                    asyncio.run_coroutine_threadsafe(self._send_mode_command(self.current_mode), self.loop)
-            except Exception:
-                logger.debug("Resend mode on speed change failed")
+            self._request_wake()
     
     def request_disconnect(self):
         """Request graceful disconnection."""
         self.force_disconnect = True
+        self._request_wake()
         logger.info("Disconnect requested")
     
+    def request_connect(self):
+        """Resume connecting after request_disconnect()."""
+        if self.force_disconnect:
+            self.force_disconnect = False
+            self._request_wake()
+            logger.info("Connect requested")
+    
     def _emit_status_change(self, message: str, status_type: str):
         """Emit status change event."""
         try:
@@ -526,21 +1113,57 @@ class BleDeviceController:
 
 
 class BleApplicationBridge:
-    """Bridge connecting UI, BLE controller, and services."""
+    """Bridge connecting UI, BLE controllers, and services."""
     
     def __init__(self):
-        self.config = ConfigService.get_device_config()
+        from core.manager import DeviceManager
+        
+        self.configs = ConfigService.get_device_configs()
+        self.config = self.configs[0]
         self.preferences = ConfigService.get_preferences()
-        # Pass reconnect preferences and device mode into controller
-        self.ble_controller = BleDeviceController(
-            self.config,
+        # use_real_device off: virtual twins of the configured devices
+        virtual_backend = None
+        if not self.preferences.use_real_device:
+            virtual_backend = VirtualBleBackend.from_configs(self.configs)
+            logger.info(f"Using {len(virtual_backend.devices)} virtual BLE device(s)")
+        # Packet capture for debugging stutter (capture_file empty = off)
+        self.packet_recorder: Optional[PacketRecorder] = None
+        if self.preferences.capture_file:
+            try:
+                self.packet_recorder = PacketRecorder(self.preferences.capture_file)
+                logger.info(f"Capturing packets to {self.preferences.capture_file}")
+            except OSError as e:
+                logger.error(f"Packet capture disabled: {e}")
+        # All devices run as tasks on one shared loop
+        self.device_manager = DeviceManager(
             self._on_device_status_change,
             self._on_color_received,
-            auto_reconnect=self.preferences.auto_reconnect,
-            reconnect_interval=self.preferences.reconnect_interval,
-            use_real_device=True,
-            initial_speed=getattr(self.preferences, 'default_speed', 0x10)
+            metric_sample_interval=self.preferences.metric_sample_interval,
+            virtual_backend=virtual_backend,
+            packet_recorder=self.packet_recorder
         )
+        # Prometheus endpoint on localhost (metrics_port 0 = off)
+        self.metrics_server: Optional[MetricsServer] = None
+        if self.preferences.metrics_port:
+            self.metrics_server = MetricsServer(self.device_manager.metrics_registry, port=self.preferences.metrics_port)
+        gradients = ConfigService.get_gradients()
+        for config in self.configs:
+            # Pass reconnect preferences and device mode into controller
+            self.device_manager.add_device(
+                config,
+                auto_reconnect=self.preferences.auto_reconnect,
+                reconnect_interval=self.preferences.reconnect_interval,
+                use_real_device=self.preferences.use_real_device,
+                initial_speed=getattr(self.preferences, 'default_speed', 0x10),
+                keepalive_interval=self.preferences.keepalive_interval,
+                gradients=gradients
+            )
+        for group_id, device_ids in ConfigService.get_groups().items():
+            try:
+                self.device_manager.add_group(group_id, device_ids)
+            except ValueError as e:
+                logger.warning(f"Group {group_id} skipped: {e}")
+        self.ble_controller = self.device_manager.get(self.config.device_id)
         
         # Both callbacks supported for compatibility
         self.on_ui_update: Optional[Callable] = None
@@ -548,58 +1171,92 @@ class BleApplicationBridge:
     
     @property
     def controller(self):
-        """Expose controller for direct access if needed."""
+        """Expose primary controller for direct access if needed."""
         return self.ble_controller
     
     def initialize(self):
         """Initialize and start the application."""
-        self.ble_controller.set_brightness(self.preferences.brightness)
-        self.ble_controller.set_color(self.preferences.last_color)
-        self.ble_controller.set_mode(self.preferences.last_mode)
-        self.ble_controller.start()
+        for controller in self.device_manager.controllers.values():
+            controller.set_brightness(self.preferences.brightness)
+            controller.set_color(self.preferences.last_color)
+            controller.set_mode(self.preferences.last_mode)
+        for group in self.device_manager.groups.values():
+            group.submit(Command(CommandType.BRIGHTNESS, self.preferences.brightness))
+            group.submit(Command(CommandType.COLOR, self.preferences.last_color))
+            group.submit(Command(CommandType.MODE, self.preferences.last_mode))
+        self.device_manager.start()
+        if self.metrics_server is not None:
+            self.metrics_server.start()
         logger.success("Application initialized")
     
     def shutdown(self):
         """Clean shutdown."""
-        self.ble_controller.stop()
+        self.device_manager.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.packet_recorder is not None:
+            self.packet_recorder.close()
         logger.info("Application shutdown complete")
     
-    def set_color(self, color: Color):
-        """Set color from UI."""
-        self.ble_controller.set_color(color)
+    def set_color(self, color: Color, target: Optional[str] = None):
+        """Set color from UI (all devices unless a device or group id is given)."""
+        self.device_manager.submit(Command(CommandType.COLOR, color), target)
         self.preferences.last_color = color
     
-    def set_brightness(self, brightness: float):
-        """Set brightness from UI."""
-        self.ble_controller.set_brightness(brightness)
+    def set_brightness(self, brightness: float, target: Optional[str] = None):
+        """Set brightness from UI (all devices unless a device or group id is given)."""
+        self.device_manager.submit(Command(CommandType.BRIGHTNESS, brightness), target)
         self.preferences.brightness = brightness
     
-    def set_mode(self, mode: ColorMode):
-        """Set effect mode from UI."""
-        self.ble_controller.set_mode(mode)
+    def set_mode(self, mode: ColorMode, target: Optional[str] = None):
+        """Set effect mode from UI (all devices unless a device or group id is given)."""
+        self.device_manager.submit(Command(CommandType.MODE, mode), target)
         self.preferences.last_mode = mode
     
+    def disconnect(self, target: Optional[str] = None):
+        """Request disconnect from UI (jumps ahead of queued color changes)."""
+        self.device_manager.submit(Command(CommandType.DISCONNECT), target)
+    
+    def connect(self, target: Optional[str] = None):
+        """Reconnect after disconnect() (jumps ahead of queued color changes)."""
+        self.device_manager.submit(Command(CommandType.CONNECT), target)
+    
+    def discovered_devices(self) -> list:
+        """Supported devices seen by the scanner (read from the index, no blocking scan)."""
+        return self.device_manager.discovered_devices()
+    
+    def metrics_snapshot(self) -> Dict[str, list]:
+        """Current values of all metrics (see MetricsRegistry.snapshot)."""
+        return self.device_manager.metrics_registry.snapshot()
+    
+    def metrics_summary(self, target: Optional[str] = None) -> List[str]:
+        """Short metric digest for the UI (all devices unless a device id is given)."""
+        return summary_lines(self.device_manager.metrics_registry, target)
+    
     def save_preferences(self):
         """Save user preferences."""
         ConfigService.save_preferences(self.preferences)
         logger.success("Preferences saved")
 
-    def set_speed(self, speed: int):
-        """Proxy to set effect speed on the BLE controller."""
+    def set_speed(self, speed: int, target: Optional[str] = None):
+        """Proxy to set effect speed on the BLE controllers."""
         try:
-            self.ble_controller.set_speed(int(speed))
+            self.device_manager.submit(Command(CommandType.SPEED, int(speed)), target)
         except Exception as e:
             logger.debug(f"Failed to set speed: {e}")
     
-    def _on_device_status_change(self, status: DeviceStatus):
+    def _on_device_status_change(self, device_id: str, status: DeviceStatus):
         """Handle device status change."""
+        # The single-device UI follows the primary device
+        if device_id != self.config.device_id:
+            return
         # Support both old and new callback signatures
         if self.on_status_change:
             self.on_status_change(status)
         if self.on_ui_update:
             self.on_ui_update(status)
     
-    def _on_color_received(self, color: Color):
+    def _on_color_received(self, device_id: str, color: Color):
         """Handle color confirmation from device."""
         pass  # Update UI if needed
 
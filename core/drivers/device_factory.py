@@ -3,10 +3,11 @@ Device driver factory with automatic protocol detection (fingerprinting).
 Selects appropriate driver based on configuration or device characteristics.
 """
 
-from typing import Optional, Dict, Type
+from functools import lru_cache
+from typing import Iterable, List, Mapping, Optional, Dict, Tuple, Type
 from bleak import BLEDevice
 
-from core.interfaces import AbstractLedDevice
+from core.interfaces import AbstractLedDevice, AdvertisementFingerprint
 from core.drivers.elk_bledom import ElkBledomDriver
 from core.drivers.triones import TrionesDriver
 from core.drivers.magichome import MagicHomeDriver
@@ -33,6 +34,147 @@ _DETECTION_ORDER = [
     ElkBledomDriver,    # ELK-BLEDOM as fallback (most common)
 ]
 
+# Generic LED controller name keywords (defaults to ELK-BLEDOM)
+_GENERIC_LED_KEYWORDS = ["LED", "RGB", "CTRL", "LIGHT"]
+
+# Confidence of each kind of detection evidence (fingerprints carry their own)
+CONFIDENCE_SERVICE_UUID = 0.8
+CONFIDENCE_NAME = 0.6
+CONFIDENCE_GENERIC_NAME = 0.3
+
+# Suffix of UUIDs derived from the Bluetooth base UUID (0000xxxx-...)
+_BASE_UUID_SUFFIX = "-0000-1000-8000-00805f9b34fb"
+
+
+@lru_cache(maxsize=1024)
+def _uuid16(uuid: str) -> Optional[int]:
+    """16-bit form of a Bluetooth base UUID ("ffd9" or "0000ffd9-0000-1000-..."), else None."""
+    uuid = uuid.lower()
+    try:
+        if len(uuid) == 4:
+            return int(uuid, 16)
+        if len(uuid) == 36 and uuid.startswith("0000") and uuid.endswith(_BASE_UUID_SUFFIX):
+            return int(uuid[4:8], 16)
+    except ValueError:
+        pass
+    return None
+
+
+class _DetectionIndex:
+    """
+    Precomputed fingerprint, name-keyword and 16-bit UUID lookup over the registered drivers.
+    
+    Priority is the position in _DETECTION_ORDER (lower wins), generic LED
+    keywords rank after every driver. Name keywords are bucketed by their
+    first two characters, so matching a name costs one dict lookup per
+    character regardless of how many drivers are registered. Manufacturer
+    and service data fingerprints are keyed by company ID / 16-bit UUID
+    and outrank name and UUID evidence.
+    """
+    
+    def __init__(self, detection_order: List[Type[AbstractLedDevice]]):
+        self.by_uuid16: Dict[int, Tuple[int, Type[AbstractLedDevice]]] = {}
+        self.by_bigram: Dict[str, List[Tuple[str, int, Type[AbstractLedDevice]]]] = {}
+        self.by_manufacturer: Dict[int, List[Tuple[AdvertisementFingerprint, int, Type[AbstractLedDevice]]]] = {}
+        self.by_service_data: Dict[int, List[Tuple[AdvertisementFingerprint, int, Type[AbstractLedDevice]]]] = {}
+        # Drivers that declare no index entries: probed with can_handle_device()
+        self.legacy: List[Tuple[int, Type[AbstractLedDevice]]] = []
+        
+        for priority, driver_class in enumerate(detection_order):
+            for fingerprint in getattr(driver_class, "ADVERTISEMENT_FINGERPRINTS", ()):
+                if fingerprint.manufacturer_id is not None:
+                    bucket = self.by_manufacturer.setdefault(fingerprint.manufacturer_id, [])
+                else:
+                    bucket = self.by_service_data.setdefault(fingerprint.service_data_uuid16, [])
+                bucket.append((fingerprint, priority, driver_class))
+            keywords = getattr(driver_class, "NAME_KEYWORDS", ())
+            uuids = getattr(driver_class, "SERVICE_UUID16", ())
+            if not keywords and not uuids:
+                self.legacy.append((priority, driver_class))
+                continue
+            for keyword in keywords:
+                self._add_keyword(keyword, priority, driver_class)
+            for uuid in uuids:
+                # First (highest priority) driver keeps a shared UUID
+                self.by_uuid16.setdefault(uuid, (priority, driver_class))
+        
+        self.fallback_priority = len(detection_order)
+        for keyword in _GENERIC_LED_KEYWORDS:
+            self._add_keyword(keyword, self.fallback_priority, ElkBledomDriver)
+    
+    def _add_keyword(self, keyword: str, priority: int, driver_class: Type[AbstractLedDevice]):
+        keyword = keyword.upper()
+        if len(keyword) < 2:
+            raise ValueError(f"Name keyword too short for detection index: {keyword!r}")
+        self.by_bigram.setdefault(keyword[:2], []).append((keyword, priority, driver_class))
+    
+    def match(self, device_name: Optional[str], service_uuids: Iterable[str]) -> Optional[Type[AbstractLedDevice]]:
+        """Highest-priority driver class matching name or UUIDs, or None."""
+        result = self.classify(device_name, service_uuids)
+        return result[0] if result else None
+    
+    def classify(
+        self,
+        device_name: Optional[str],
+        service_uuids: Iterable[str],
+        manufacturer_data: Optional[Mapping[int, bytes]] = None,
+        service_data: Optional[Mapping[str, bytes]] = None
+    ) -> Optional[Tuple[Type[AbstractLedDevice], float]]:
+        """(driver class, confidence) for an advertisement, or None if nothing matches."""
+        fingerprint_hit = self._match_fingerprints(manufacturer_data, service_data)
+        if fingerprint_hit is not None:
+            return fingerprint_hit
+        
+        # (priority, driver class, confidence)
+        best: Optional[Tuple[int, Type[AbstractLedDevice], float]] = None
+        uuids = [str(uuid) for uuid in service_uuids]
+        
+        for uuid in uuids:
+            hit = self.by_uuid16.get(_uuid16(uuid))
+            if hit is not None and (best is None or hit[0] < best[0]):
+                best = (hit[0], hit[1], CONFIDENCE_SERVICE_UUID)
+        
+        if device_name:
+            name_upper = device_name.upper()
+            for i in range(len(name_upper) - 1):
+                bucket = self.by_bigram.get(name_upper[i:i + 2])
+                if not bucket:
+                    continue
+                for keyword, priority, driver_class in bucket:
+                    if (best is None or priority < best[0]) and name_upper.startswith(keyword, i):
+                        confidence = CONFIDENCE_GENERIC_NAME if priority == self.fallback_priority else CONFIDENCE_NAME
+                        best = (priority, driver_class, confidence)
+        
+        for priority, driver_class in self.legacy:
+            if best is not None and priority >= best[0]:
+                break
+            if driver_class.can_handle_device(device_name, uuids):
+                return driver_class, CONFIDENCE_NAME
+        
+        return (best[1], best[2]) if best else None
+    
+    def _match_fingerprints(
+        self,
+        manufacturer_data: Optional[Mapping[int, bytes]],
+        service_data: Optional[Mapping[str, bytes]]
+    ) -> Optional[Tuple[Type[AbstractLedDevice], float]]:
+        """Best fingerprint hit: highest confidence, then detection priority."""
+        best: Optional[Tuple[float, int, Type[AbstractLedDevice]]] = None
+        candidates = []
+        for company_id, payload in (manufacturer_data or {}).items():
+            candidates.extend((entry, payload) for entry in self.by_manufacturer.get(company_id, ()))
+        for uuid, payload in (service_data or {}).items():
+            candidates.extend((entry, payload) for entry in self.by_service_data.get(_uuid16(str(uuid)), ()))
+        for (fingerprint, priority, driver_class), payload in candidates:
+            if not fingerprint.matches(payload):
+                continue
+            if best is None or (-fingerprint.confidence, priority) < (-best[0], best[1]):
+                best = (fingerprint.confidence, priority, driver_class)
+        return (best[2], best[0]) if best else None
+
+
+_DETECTION_INDEX = _DetectionIndex(_DETECTION_ORDER)
+
 
 class DeviceFactory:
     """
@@ -92,7 +234,7 @@ class DeviceFactory:
         Detection strategy:
         1. Check device name patterns
         2. Check advertised service UUIDs
-        3. Try each driver's can_handle_device() method
+        3. Try can_handle_device() of drivers without index entries
         
         Args:
             device: BLEDevice instance to analyze.
@@ -111,22 +253,54 @@ class DeviceFactory:
             services = device.metadata.get('uuids', [])
             service_uuids = [str(uuid) for uuid in services]
         
-        # Try each driver in detection order
-        for driver_class in _DETECTION_ORDER:
-            if driver_class.can_handle_device(device_name, service_uuids):
-                return driver_class()
-        
-        # Fallback: if device name contains common LED keywords, default to ELK-BLEDOM
-        if device_name:
-            name_upper = device_name.upper()
-            if any(keyword in name_upper for keyword in ["LED", "RGB", "CTRL", "LIGHT"]):
-                return ElkBledomDriver()
+        driver_class = DeviceFactory._match_driver_class(device_name, service_uuids)
+        if driver_class is not None:
+            return driver_class()
         
         raise ValueError(
             f"Could not detect protocol for device: {device_name or device.address}. "
             f"Please specify protocol_type in configuration."
         )
     
+    @staticmethod
+    def _match_driver_class(
+        device_name: Optional[str],
+        service_uuids: List[str]
+    ) -> Optional[Type[AbstractLedDevice]]:
+        """Driver class for name/service UUIDs, or None if nothing matches."""
+        return _DETECTION_INDEX.match(device_name, service_uuids)
+    
+    @staticmethod
+    def classify_advertisement(
+        device_name: Optional[str],
+        service_uuids: Iterable[str],
+        manufacturer_data: Optional[Mapping[int, bytes]] = None,
+        service_data: Optional[Mapping[str, bytes]] = None
+    ) -> Optional[Tuple[Type[AbstractLedDevice], float]]:
+        """
+        Pick a driver class from advertisement contents alone.
+        
+        Args:
+            device_name: Advertised local name
+            service_uuids: Advertised service UUIDs
+            manufacturer_data: Company ID -> payload
+            service_data: Service UUID -> payload
+            
+        Returns:
+            (driver class, confidence 0-1), or None if nothing matches.
+        """
+        return _DETECTION_INDEX.classify(device_name, service_uuids, manufacturer_data, service_data)
+    
+    @staticmethod
+    def get_advertised_service_uuids() -> List[str]:
+        """Service UUIDs advertised by devices of all registered drivers."""
+        uuids: List[str] = []
+        for driver_class in _DETECTION_ORDER:
+            for uuid in getattr(driver_class, "ADVERTISED_SERVICE_UUIDS", ()):
+                if uuid.lower() not in uuids:
+                    uuids.append(uuid.lower())
+        return uuids
+    
     @staticmethod
     def register_driver(protocol_name: str, driver_class: Type[AbstractLedDevice]) -> None:
         """
@@ -136,10 +310,20 @@ class DeviceFactory:
             protocol_name: Protocol identifier (e.g., "triones", "magichome")
             driver_class: Driver class implementing AbstractLedDevice
         """
+        global _DETECTION_INDEX
         _DRIVER_REGISTRY[protocol_name.lower()] = driver_class
         if driver_class not in _DETECTION_ORDER:
             _DETECTION_ORDER.append(driver_class)
+            _DETECTION_INDEX = _DetectionIndex(_DETECTION_ORDER)
     
+    @staticmethod
+    def get_protocol_key(driver: AbstractLedDevice) -> Optional[str]:
+        """Registry key that creates this driver's class (first registered name)."""
+        for protocol_name, driver_class in _DRIVER_REGISTRY.items():
+            if driver_class is type(driver):
+                return protocol_name
+        return None
+
     @staticmethod
     def get_available_protocols() -> list:
         """Get list of available protocol names."""
@@ -3,10 +3,10 @@ ELK-BLEDOM protocol driver implementation.
 Handles communication with ELK-BLEDOM compatible LED controllers.
 """
 
-from typing import Optional
+from typing import Any, Dict, Optional, Union
 from bleak import BleakClient
 
-from core.interfaces import AbstractLedDevice
+from core.interfaces import AbstractLedDevice, clamp_byte
 
 
 class ElkBledomDriver(AbstractLedDevice):
@@ -22,8 +22,13 @@ class ElkBledomDriver(AbstractLedDevice):
     
     # Protocol constants
     WRITE_CHAR_UUID = "0000fff3-0000-1000-8000-00805f9b34fb"
+    ADVERTISED_SERVICE_UUIDS = ("0000fff0-0000-1000-8000-00805f9b34fb",)
+    NAME_KEYWORDS = ("ELK", "BLEDOM")
+    SERVICE_UUID16 = (0xFFF3,)
     PACKET_HEADER = bytearray([0x7E, 0x07, 0x05])
     PACKET_FOOTER = 0xEF
+    PACKET_TEMPLATE = bytes([*PACKET_HEADER, 0x00, 0x00, 0x00, 0x00, 0x00, PACKET_FOOTER])
+    MAX_FRAME_RATE = 50.0  # Tolerates 20 ms frame spacing
     
     # Command codes
     CMD_COLOR = 0x03
@@ -38,12 +43,15 @@ class ElkBledomDriver(AbstractLedDevice):
     def __init__(self, client: Optional[BleakClient] = None):
         super().__init__(client)
         self.current_speed: int = 0x10  # Default speed
+        # Preallocated color packet, patched in place by encode_color()
+        self._color_frame = self._build_packet(self.CMD_COLOR, 0, 0, 0)
     
     async def connect(self, client: BleakClient) -> bool:
         """Establish connection to ELK-BLEDOM device."""
         try:
             self.client = client
             if client.is_connected:
+                self.resolve_write_characteristic(client)
                 self.is_connected = True
                 return True
             return False
@@ -54,6 +62,7 @@ class ElkBledomDriver(AbstractLedDevice):
         """Disconnect from device."""
         self.is_connected = False
         self.client = None
+        self.release_write_characteristic()
     
     def _build_packet(self, cmd: int, p1: int, p2: int, p3: int, speed: Optional[int] = None) -> bytearray:
         """
@@ -64,42 +73,48 @@ class ElkBledomDriver(AbstractLedDevice):
         if speed is None:
             speed = self.current_speed
         
-        return bytearray([
-            *self.PACKET_HEADER,
-            cmd & 0xFF,
-            p1 & 0xFF,
-            p2 & 0xFF,
-            p3 & 0xFF,
-            speed & 0xFF,
-            self.PACKET_FOOTER
-        ])
+        packet = bytearray(self.PACKET_TEMPLATE)
+        packet[3] = cmd & 0xFF
+        packet[4] = p1 & 0xFF
+        packet[5] = p2 & 0xFF
+        packet[6] = p3 & 0xFF
+        packet[7] = speed & 0xFF
+        return packet
+    
+    @classmethod
+    def decode_packet(cls, packet: Union[bytes, bytearray]) -> Optional[Dict[str, Any]]:
+        """Decode [0x7E, 0x07, 0x05, CMD, P1, P2, P3, SPEED, 0xEF]."""
+        if len(packet) != 9 or packet[:3] != cls.PACKET_HEADER or packet[8] != cls.PACKET_FOOTER:
+            return None
+        cmd = packet[3]
+        if cmd == cls.CMD_COLOR:
+            return {"command": "color", "r": packet[4], "g": packet[5], "b": packet[6]}
+        if cmd == cls.CMD_MODE:
+            return {"command": "mode", "mode_id": packet[4], "speed": packet[7]}
+        return None
+    
+    def encode_color(self, r: int, g: int, b: int) -> bytearray:
+        """Patch RGB and speed into the preallocated color packet."""
+        frame = self._color_frame
+        try:
+            # bytearray rejects anything but ints in 0..255, so in-range
+            # values (the common case) skip clamping entirely
+            frame[4] = r
+            frame[5] = g
+            frame[6] = b
+        except (TypeError, ValueError):
+            frame[4] = clamp_byte(r)
+            frame[5] = clamp_byte(g)
+            frame[6] = clamp_byte(b)
+        frame[7] = self.current_speed
+        return frame
     
     async def set_color(self, r: int, g: int, b: int) -> bool:
         """Set RGB color on ELK-BLEDOM device."""
         if not self.client or not self.client.is_connected:
             return False
         
-        try:
-            # Clamp RGB values
-            r = max(0, min(255, int(r)))
-            g = max(0, min(255, int(g)))
-            b = max(0, min(255, int(b)))
-            
-            payload = self._build_packet(
-                cmd=self.CMD_COLOR,
-                p1=r,
-                p2=g,
-                p3=b
-            )
-            
-            await self.client.write_gatt_char(
-                self.WRITE_CHAR_UUID,
-                payload,
-                response=False
-            )
-            return True
-        except Exception:
-            return False
+        return await self.write_frame(self.encode_color(r, g, b))
     
     async def set_brightness(self, brightness: int) -> bool:
         """
@@ -136,11 +151,7 @@ class ElkBledomDriver(AbstractLedDevice):
                 speed=self.current_speed
             )
             
-            await self.client.write_gatt_char(
-                self.WRITE_CHAR_UUID,
-                payload,
-                response=False
-            )
+            await self.write_packet(payload)
             return True
         except Exception:
             return False
@@ -164,7 +175,7 @@ class ElkBledomDriver(AbstractLedDevice):
         """
         if device_name:
             name_upper = device_name.upper()
-            if "ELK" in name_upper or "BLEDOM" in name_upper:
+            if any(keyword in name_upper for keyword in ElkBledomDriver.NAME_KEYWORDS):
                 return True
         
         # Check for characteristic UUID in services
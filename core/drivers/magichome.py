@@ -9,10 +9,10 @@ Protocol details (based on common MagicHome implementations):
 - Color command: CMD=0x05, DATA=[R, G, B, W, ...]
 """
 
-from typing import Optional
+from typing import Any, Dict, Optional, Union
 from bleak import BleakClient
 
-from core.interfaces import AbstractLedDevice
+from core.interfaces import AbstractLedDevice, clamp_byte
 
 
 class MagicHomeDriver(AbstractLedDevice):
@@ -26,6 +26,10 @@ class MagicHomeDriver(AbstractLedDevice):
     # Common MagicHome UUIDs
     WRITE_CHAR_UUID = "0000ffe5-0000-1000-8000-00805f9b34fb"
     ALTERNATIVE_UUID = "0000ffe9-0000-1000-8000-00805f9b34fb"
+    WRITE_CHAR_CANDIDATES = (WRITE_CHAR_UUID, ALTERNATIVE_UUID)
+    ADVERTISED_SERVICE_UUIDS = (WRITE_CHAR_UUID, "0000ffe0-0000-1000-8000-00805f9b34fb")
+    NAME_KEYWORDS = ("MAGIC", "MAGICHOME", "MH-")
+    SERVICE_UUID16 = (0xFFE5, 0xFFE9)
     
     # Packet constants
     PACKET_START = 0x7E
@@ -46,27 +50,16 @@ class MagicHomeDriver(AbstractLedDevice):
     def __init__(self, client: Optional[BleakClient] = None):
         super().__init__(client)
         self.current_speed: int = 0x20  # Default speed
-        self.actual_uuid: Optional[str] = None
+        # Preallocated color packet [R, G, B, W], patched in place by encode_color()
+        self._color_frame = self._build_packet(self.CMD_COLOR, [0x00, 0x00, 0x00, 0x00])
     
     async def connect(self, client: BleakClient) -> bool:
         """Establish connection to MagicHome device."""
         try:
             self.client = client
             if client.is_connected:
-                # Try to determine correct UUID
-                try:
-                    services = client.services
-                    for service in services:
-                        for char in service.characteristics:
-                            char_uuid = str(char.uuid).lower()
-                            if "ffe5" in char_uuid or "ffe9" in char_uuid:
-                                self.actual_uuid = str(char.uuid)
-                                break
-                except Exception:
-                    pass
-                
-                if not self.actual_uuid:
-                    self.actual_uuid = self.WRITE_CHAR_UUID
+                # Resolve the write characteristic once (alternative UUID if the main one is absent)
+                self.resolve_write_characteristic(client)
                 
                 self.is_connected = True
                 return True
@@ -78,7 +71,7 @@ class MagicHomeDriver(AbstractLedDevice):
         """Disconnect from device."""
         self.is_connected = False
         self.client = None
-        self.actual_uuid = None
+        self.release_write_characteristic()
     
     def _build_packet(self, cmd: int, data: list) -> bytearray:
         """
@@ -86,57 +79,54 @@ class MagicHomeDriver(AbstractLedDevice):
         
         Format: [0x7E, LEN, CMD, DATA..., 0xEF]
         """
-        data_bytes = [d & 0xFF for d in data]
-        length = len(data_bytes) + 1  # +1 for CMD byte
+        packet = bytearray(len(data) + 4)
+        packet[0] = self.PACKET_START
+        packet[1] = (len(data) + 1) & 0xFF  # +1 for CMD byte
+        packet[2] = cmd & 0xFF
+        for i, d in enumerate(data, 3):
+            packet[i] = d & 0xFF
+        packet[-1] = self.PACKET_END
+        return packet
+    
+    @classmethod
+    def decode_packet(cls, packet: Union[bytes, bytearray]) -> Optional[Dict[str, Any]]:
+        """Decode [0x7E, LEN, CMD, DATA..., 0xEF] (4 data bytes for every command)."""
+        if (len(packet) != 8 or packet[0] != cls.PACKET_START or packet[-1] != cls.PACKET_END
+                or packet[1] != len(packet) - 3):
+            return None
+        cmd = packet[2]
+        if cmd == cls.CMD_COLOR:
+            return {"command": "color", "r": packet[3], "g": packet[4], "b": packet[5]}
+        if cmd == cls.CMD_MODE:
+            return {"command": "mode", "mode_id": packet[3], "speed": packet[4]}
+        if cmd == cls.CMD_BRIGHTNESS:
+            return {"command": "brightness", "value": packet[3]}
+        return None
+    
+    def encode_color(self, r: int, g: int, b: int) -> bytearray:
+        """
+        Patch RGB into the preallocated color packet.
         
-        return bytearray([
-            self.PACKET_START,
-            length & 0xFF,
-            cmd & 0xFF,
-            *data_bytes,
-            self.PACKET_END
-        ])
+        MagicHome color packet: [R, G, B, W]; W (white) stays 0 for RGB-only strips.
+        """
+        frame = self._color_frame
+        try:
+            # bytearray rejects anything but ints in 0..255
+            frame[3] = r
+            frame[4] = g
+            frame[5] = b
+        except (TypeError, ValueError):
+            frame[3] = clamp_byte(r)
+            frame[4] = clamp_byte(g)
+            frame[5] = clamp_byte(b)
+        return frame
     
     async def set_color(self, r: int, g: int, b: int) -> bool:
         """Set RGB color on MagicHome device."""
         if not self.client or not self.client.is_connected:
             return False
         
-        try:
-            # Clamp RGB values
-            r = max(0, min(255, int(r)))
-            g = max(0, min(255, int(g)))
-            b = max(0, min(255, int(b)))
-            
-            # MagicHome color packet: [R, G, B, W, ...]
-            # W (white) is typically 0 for RGB-only strips
-            payload = self._build_packet(
-                cmd=self.CMD_COLOR,
-                data=[r, g, b, 0x00]  # RGB + white channel
-            )
-            
-            uuid = self.actual_uuid or self.WRITE_CHAR_UUID
-            await self.client.write_gatt_char(
-                uuid,
-                payload,
-                response=False
-            )
-            return True
-        except Exception:
-            # Try alternative UUID
-            if self.actual_uuid != self.ALTERNATIVE_UUID:
-                try:
-                    self.actual_uuid = self.ALTERNATIVE_UUID
-                    uuid = self.ALTERNATIVE_UUID
-                    await self.client.write_gatt_char(
-                        uuid,
-                        payload,
-                        response=False
-                    )
-                    return True
-                except Exception:
-                    pass
-            return False
+        return await self.write_frame(self.encode_color(r, g, b))
     
     async def set_brightness(self, brightness: int) -> bool:
         """
@@ -156,12 +146,7 @@ class MagicHomeDriver(AbstractLedDevice):
                 data=[brightness_byte, 0x00, 0x00, 0x00]
             )
             
-            uuid = self.actual_uuid or self.WRITE_CHAR_UUID
-            await self.client.write_gatt_char(
-                uuid,
-                payload,
-                response=False
-            )
+            await self.write_packet(payload)
             return True
         except Exception:
             return False
@@ -186,12 +171,7 @@ class MagicHomeDriver(AbstractLedDevice):
                 data=[mode_id & 0xFF, self.current_speed & 0xFF, 0x00, 0x00]
             )
             
-            uuid = self.actual_uuid or self.WRITE_CHAR_UUID
-            await self.client.write_gatt_char(
-                uuid,
-                payload,
-                response=False
-            )
+            await self.write_packet(payload)
             return True
         except Exception:
             return False
@@ -215,7 +195,7 @@ class MagicHomeDriver(AbstractLedDevice):
         """
         if device_name:
             name_upper = device_name.upper()
-            if any(keyword in name_upper for keyword in ["MAGIC", "MAGICHOME", "MH-"]):
+            if any(keyword in name_upper for keyword in MagicHomeDriver.NAME_KEYWORDS):
                 return True
         
         # Check for characteristic UUID in services
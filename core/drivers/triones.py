@@ -9,10 +9,10 @@ Protocol details (based on common Triones implementations):
 - Color command: CMD=0x01, P1=R, P2=G, P3=B
 """
 
-from typing import Optional
+from typing import Any, Dict, Optional, Union
 from bleak import BleakClient
 
-from core.interfaces import AbstractLedDevice
+from core.interfaces import AbstractLedDevice, clamp_byte
 
 
 class TrionesDriver(AbstractLedDevice):
@@ -26,10 +26,15 @@ class TrionesDriver(AbstractLedDevice):
     # Common Triones UUIDs (may vary by device model)
     WRITE_CHAR_UUID = "0000ffd9-0000-1000-8000-00805f9b34fb"
     ALTERNATIVE_UUID = "0000ffd5-0000-1000-8000-00805f9b34fb"
+    WRITE_CHAR_CANDIDATES = (WRITE_CHAR_UUID, ALTERNATIVE_UUID)
+    ADVERTISED_SERVICE_UUIDS = (ALTERNATIVE_UUID, "0000ffd0-0000-1000-8000-00805f9b34fb")
+    NAME_KEYWORDS = ("TRIONES", "TRION")
+    SERVICE_UUID16 = (0xFFD9, 0xFFD5)
     
     # Packet constants
     PACKET_START = bytearray([0x56, 0xAA])
     PACKET_END = bytearray([0xAA, 0xAA])
+    PACKET_TEMPLATE = bytes([*PACKET_START, 0x00, 0x00, 0x00, 0x00, *PACKET_END])
     
     # Command codes
     CMD_COLOR = 0x01
@@ -46,28 +51,16 @@ class TrionesDriver(AbstractLedDevice):
     def __init__(self, client: Optional[BleakClient] = None):
         super().__init__(client)
         self.current_speed: int = 0x20  # Default speed
-        self.actual_uuid: Optional[str] = None  # Will be determined on connect
+        # Preallocated color packet, patched in place by encode_color()
+        self._color_frame = self._build_packet(self.CMD_COLOR)
     
     async def connect(self, client: BleakClient) -> bool:
         """Establish connection to Triones device."""
         try:
             self.client = client
             if client.is_connected:
-                # Try to determine correct UUID by checking available characteristics
-                try:
-                    services = client.services
-                    for service in services:
-                        for char in service.characteristics:
-                            char_uuid = str(char.uuid).lower()
-                            if "ffd9" in char_uuid or "ffd5" in char_uuid:
-                                self.actual_uuid = str(char.uuid)
-                                break
-                except Exception:
-                    pass
-                
-                # Fallback to default UUID
-                if not self.actual_uuid:
-                    self.actual_uuid = self.WRITE_CHAR_UUID
+                # Resolve the write characteristic once (alternative UUID if the main one is absent)
+                self.resolve_write_characteristic(client)
                 
                 self.is_connected = True
                 return True
@@ -79,7 +72,7 @@ class TrionesDriver(AbstractLedDevice):
         """Disconnect from device."""
         self.is_connected = False
         self.client = None
-        self.actual_uuid = None
+        self.release_write_characteristic()
     
     def _build_packet(self, cmd: int, p1: int = 0, p2: int = 0, p3: int = 0) -> bytearray:
         """
@@ -87,55 +80,47 @@ class TrionesDriver(AbstractLedDevice):
         
         Format: [0x56, 0xAA, CMD, P1, P2, P3, 0xAA, 0xAA]
         """
-        return bytearray([
-            *self.PACKET_START,
-            cmd & 0xFF,
-            p1 & 0xFF,
-            p2 & 0xFF,
-            p3 & 0xFF,
-            *self.PACKET_END
-        ])
+        packet = bytearray(self.PACKET_TEMPLATE)
+        packet[2] = cmd & 0xFF
+        packet[3] = p1 & 0xFF
+        packet[4] = p2 & 0xFF
+        packet[5] = p3 & 0xFF
+        return packet
+    
+    @classmethod
+    def decode_packet(cls, packet: Union[bytes, bytearray]) -> Optional[Dict[str, Any]]:
+        """Decode [0x56, 0xAA, CMD, P1, P2, P3, 0xAA, 0xAA]."""
+        if len(packet) != 8 or packet[:2] != cls.PACKET_START or packet[6:] != cls.PACKET_END:
+            return None
+        cmd = packet[2]
+        if cmd == cls.CMD_COLOR:
+            return {"command": "color", "r": packet[3], "g": packet[4], "b": packet[5]}
+        if cmd == cls.CMD_MODE:
+            return {"command": "mode", "mode_id": packet[3], "speed": packet[4]}
+        if cmd == cls.CMD_BRIGHTNESS:
+            return {"command": "brightness", "value": packet[3]}
+        return None
+    
+    def encode_color(self, r: int, g: int, b: int) -> bytearray:
+        """Patch RGB into the preallocated color packet."""
+        frame = self._color_frame
+        try:
+            # bytearray rejects anything but ints in 0..255
+            frame[3] = r
+            frame[4] = g
+            frame[5] = b
+        except (TypeError, ValueError):
+            frame[3] = clamp_byte(r)
+            frame[4] = clamp_byte(g)
+            frame[5] = clamp_byte(b)
+        return frame
     
     async def set_color(self, r: int, g: int, b: int) -> bool:
         """Set RGB color on Triones device."""
         if not self.client or not self.client.is_connected:
             return False
         
-        try:
-            # Clamp RGB values
-            r = max(0, min(255, int(r)))
-            g = max(0, min(255, int(g)))
-            b = max(0, min(255, int(b)))
-            
-            payload = self._build_packet(
-                cmd=self.CMD_COLOR,
-                p1=r,
-                p2=g,
-                p3=b
-            )
-            
-            uuid = self.actual_uuid or self.WRITE_CHAR_UUID
-            await self.client.write_gatt_char(
-                uuid,
-                payload,
-                response=False
-            )
-            return True
-        except Exception:
-            # Try alternative UUID if first attempt fails
-            if self.actual_uuid != self.ALTERNATIVE_UUID:
-                try:
-                    self.actual_uuid = self.ALTERNATIVE_UUID
-                    uuid = self.ALTERNATIVE_UUID
-                    await self.client.write_gatt_char(
-                        uuid,
-                        payload,
-                        response=False
-                    )
-                    return True
-                except Exception:
-                    pass
-            return False
+        return await self.write_frame(self.encode_color(r, g, b))
     
     async def set_brightness(self, brightness: int) -> bool:
         """
@@ -158,12 +143,7 @@ class TrionesDriver(AbstractLedDevice):
                 p3=0x00
             )
             
-            uuid = self.actual_uuid or self.WRITE_CHAR_UUID
-            await self.client.write_gatt_char(
-                uuid,
-                payload,
-                response=False
-            )
+            await self.write_packet(payload)
             return True
         except Exception:
             return False
@@ -190,12 +170,7 @@ class TrionesDriver(AbstractLedDevice):
                 p3=0x00
             )
             
-            uuid = self.actual_uuid or self.WRITE_CHAR_UUID
-            await self.client.write_gatt_char(
-                uuid,
-                payload,
-                response=False
-            )
+            await self.write_packet(payload)
             return True
         except Exception:
             return False
@@ -219,7 +194,7 @@ class TrionesDriver(AbstractLedDevice):
         """
         if device_name:
             name_upper = device_name.upper()
-            if "TRIONES" in name_upper or "TRION" in name_upper:
+            if any(keyword in name_upper for keyword in TrionesDriver.NAME_KEYWORDS):
                 return True
         
         # Check for characteristic UUID in services
@@ -9,10 +9,10 @@ Protocol details (based on common Tuya BLE implementations):
 - Note: Tuya protocol is complex and may require encryption/decryption
 """
 
-from typing import Optional
+from typing import Any, Dict, Optional, Union
 from bleak import BleakClient
 
-from core.interfaces import AbstractLedDevice
+from core.interfaces import AbstractLedDevice, AdvertisementFingerprint, clamp_byte
 
 
 class TuyaDriver(AbstractLedDevice):
@@ -27,7 +27,15 @@ class TuyaDriver(AbstractLedDevice):
     # Common Tuya UUIDs
     WRITE_CHAR_UUID = "0000fe95-0000-1000-8000-00805f9b34fb"
     ALTERNATIVE_UUID = "0000fe40-0000-1000-8000-00805f9b34fb"
+    WRITE_CHAR_CANDIDATES = (WRITE_CHAR_UUID, ALTERNATIVE_UUID)
     SERVICE_UUID = "0000fe95-0000-1000-8000-00805f9b34fb"
+    ADVERTISED_SERVICE_UUIDS = (SERVICE_UUID, ALTERNATIVE_UUID)
+    NAME_KEYWORDS = ("TUYA", "TY-", "SMART LIFE", "SMARTLIFE")
+    SERVICE_UUID16 = (0xFE95, 0xFE40)
+    ADVERTISEMENT_FINGERPRINTS = (
+        AdvertisementFingerprint(manufacturer_id=0x07D0),      # Tuya company identifier
+        AdvertisementFingerprint(service_data_uuid16=0xFD50),  # Tuya-registered service UUID
+    )
     
     # Command codes (basic Tuya commands, may vary)
     CMD_COLOR = 0x01
@@ -44,27 +52,16 @@ class TuyaDriver(AbstractLedDevice):
     def __init__(self, client: Optional[BleakClient] = None):
         super().__init__(client)
         self.current_speed: int = 0x20  # Default speed
-        self.actual_uuid: Optional[str] = None
+        # Preallocated color packet [CMD, LEN, R, G, B], patched in place by encode_color()
+        self._color_frame = self._build_simple_packet(self.CMD_COLOR, [0x00, 0x00, 0x00])
     
     async def connect(self, client: BleakClient) -> bool:
         """Establish connection to Tuya device."""
         try:
             self.client = client
             if client.is_connected:
-                # Try to determine correct UUID
-                try:
-                    services = client.services
-                    for service in services:
-                        for char in service.characteristics:
-                            char_uuid = str(char.uuid).lower()
-                            if "fe95" in char_uuid or "fe40" in char_uuid:
-                                self.actual_uuid = str(char.uuid)
-                                break
-                except Exception:
-                    pass
-                
-                if not self.actual_uuid:
-                    self.actual_uuid = self.WRITE_CHAR_UUID
+                # Resolve the write characteristic once (alternative UUID if the main one is absent)
+                self.resolve_write_characteristic(client)
                 
                 self.is_connected = True
                 return True
@@ -76,7 +73,7 @@ class TuyaDriver(AbstractLedDevice):
         """Disconnect from device."""
         self.is_connected = False
         self.client = None
-        self.actual_uuid = None
+        self.release_write_characteristic()
     
     def _build_simple_packet(self, cmd: int, data: list) -> bytearray:
         """
@@ -85,52 +82,47 @@ class TuyaDriver(AbstractLedDevice):
         Format: [CMD, LEN, DATA...]
         Some Tuya devices use simpler format without encryption.
         """
-        data_bytes = [d & 0xFF for d in data]
-        return bytearray([
-            cmd & 0xFF,
-            len(data_bytes) & 0xFF,
-            *data_bytes
-        ])
+        packet = bytearray(len(data) + 2)
+        packet[0] = cmd & 0xFF
+        packet[1] = len(data) & 0xFF
+        for i, d in enumerate(data, 2):
+            packet[i] = d & 0xFF
+        return packet
+    
+    @classmethod
+    def decode_packet(cls, packet: Union[bytes, bytearray]) -> Optional[Dict[str, Any]]:
+        """Decode the simple [CMD, LEN, DATA...] format."""
+        if len(packet) < 3 or packet[1] != len(packet) - 2:
+            return None
+        cmd = packet[0]
+        if cmd == cls.CMD_COLOR and len(packet) == 5:
+            return {"command": "color", "r": packet[2], "g": packet[3], "b": packet[4]}
+        if cmd == cls.CMD_MODE and len(packet) == 4:
+            return {"command": "mode", "mode_id": packet[2], "speed": packet[3]}
+        if cmd == cls.CMD_BRIGHTNESS and len(packet) == 3:
+            return {"command": "brightness", "value": packet[2]}
+        return None
+    
+    def encode_color(self, r: int, g: int, b: int) -> bytearray:
+        """Patch RGB into the preallocated color packet [CMD, LEN, R, G, B]."""
+        frame = self._color_frame
+        try:
+            # bytearray rejects anything but ints in 0..255
+            frame[2] = r
+            frame[3] = g
+            frame[4] = b
+        except (TypeError, ValueError):
+            frame[2] = clamp_byte(r)
+            frame[3] = clamp_byte(g)
+            frame[4] = clamp_byte(b)
+        return frame
     
     async def set_color(self, r: int, g: int, b: int) -> bool:
         """Set RGB color on Tuya device."""
         if not self.client or not self.client.is_connected:
             return False
         
-        try:
-            # Clamp RGB values
-            r = max(0, min(255, int(r)))
-            g = max(0, min(255, int(g)))
-            b = max(0, min(255, int(b)))
-            
-            # Simple Tuya color packet: [CMD, LEN, R, G, B]
-            payload = self._build_simple_packet(
-                cmd=self.CMD_COLOR,
-                data=[r, g, b]
-            )
-            
-            uuid = self.actual_uuid or self.WRITE_CHAR_UUID
-            await self.client.write_gatt_char(
-                uuid,
-                payload,
-                response=False
-            )
-            return True
-        except Exception:
-            # Try alternative UUID
-            if self.actual_uuid != self.ALTERNATIVE_UUID:
-                try:
-                    self.actual_uuid = self.ALTERNATIVE_UUID
-                    uuid = self.ALTERNATIVE_UUID
-                    await self.client.write_gatt_char(
-                        uuid,
-                        payload,
-                        response=False
-                    )
-                    return True
-                except Exception:
-                    pass
-            return False
+        return await self.write_frame(self.encode_color(r, g, b))
     
     async def set_brightness(self, brightness: int) -> bool:
         """
@@ -150,12 +142,7 @@ class TuyaDriver(AbstractLedDevice):
                 data=[brightness_byte]
             )
             
-            uuid = self.actual_uuid or self.WRITE_CHAR_UUID
-            await self.client.write_gatt_char(
-                uuid,
-                payload,
-                response=False
-            )
+            await self.write_packet(payload)
             return True
         except Exception:
             return False
@@ -180,12 +167,7 @@ class TuyaDriver(AbstractLedDevice):
                 data=[mode_id & 0xFF, self.current_speed & 0xFF]
             )
             
-            uuid = self.actual_uuid or self.WRITE_CHAR_UUID
-            await self.client.write_gatt_char(
-                uuid,
-                payload,
-                response=False
-            )
+            await self.write_packet(payload)
             return True
         except Exception:
             return False
@@ -209,7 +191,7 @@ class TuyaDriver(AbstractLedDevice):
         """
         if device_name:
             name_upper = device_name.upper()
-            if any(keyword in name_upper for keyword in ["TUYA", "TY-", "SMART LIFE", "SMARTLIFE"]):
+            if any(keyword in name_upper for keyword in TuyaDriver.NAME_KEYWORDS):
                 return True
         
         # Check for characteristic UUID in services
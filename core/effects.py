@@ -0,0 +1,250 @@
+"""
+Precomputed frame tables for host-rendered periodic effects.
+Each (effect, brightness, speed) combination is rendered once into a
+table of final colors (and, lazily, encoded driver packets) so that
+playback is just indexing and writing. Playback is paced by a
+deadline-based scheduler on the monotonic clock.
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from core.models import Color, ColorMode
+from core.interfaces import AbstractLedDevice
+
+
+# Sampling rate of the tables (frames per second of effect time)
+TABLE_FRAME_RATE = 50.0
+
+# Effect period at the default speed (0x10), in seconds
+BASE_PERIODS: Dict[ColorMode, float] = {
+    ColorMode.BREATH: 2 * math.pi,  # 314 frames at 20 ms
+    ColorMode.RAINBOW: 3.5,         # 7 colors held for 0.5 s
+}
+
+BREATH_COLOR = (160, 32, 240)  # Neon violet
+
+RAINBOW_COLORS = (
+    (255, 0, 0),      # Red
+    (255, 127, 0),    # Orange
+    (255, 255, 0),    # Yellow
+    (0, 255, 0),      # Green
+    (0, 0, 255),      # Blue
+    (75, 0, 130),     # Indigo
+    (148, 0, 211),    # Violet
+)
+
+
+def effect_period(mode: ColorMode, speed: int) -> float:
+    """
+    Period of one effect cycle in seconds.
+
+    Speed 0x10 (the default) gives the base period; higher is faster
+    (speed 255 is ~8.5x faster), 0 is twice as slow.
+    """
+    base = BASE_PERIODS[mode]
+    speed = max(0, min(255, int(speed)))
+    return base * 32.0 / (speed + 16)
+
+
+def _breath_rgb(phase: float) -> Tuple[float, float, float]:
+    """Breath effect color at phase 0..1 (before brightness)."""
+    val = (math.sin(2 * math.pi * phase) + 1) / 2
+    r, g, b = BREATH_COLOR
+    return r * val, g * val, b * val
+
+
+def _rainbow_rgb(phase: float) -> Tuple[float, float, float]:
+    """Rainbow effect color at phase 0..1 (before brightness)."""
+    idx = int(phase * len(RAINBOW_COLORS)) % len(RAINBOW_COLORS)
+    return RAINBOW_COLORS[idx]
+
+
+_RENDERERS = {
+    ColorMode.BREATH: _breath_rgb,
+    ColorMode.RAINBOW: _rainbow_rgb,
+}
+
+
+def supports_frame_table(mode: ColorMode) -> bool:
+    """Check if a mode is rendered from a precomputed frame table."""
+    return mode in _RENDERERS
+
+
+@dataclass
+class FrameTable:
+    """One precomputed effect cycle."""
+    mode: ColorMode
+    brightness: float
+    speed: int
+    period: float                  # Seconds per cycle
+    colors: Tuple[Color, ...]      # Final colors (brightness applied)
+    # Encoded packets per (driver class, driver speed); filled by packets_for()
+    _packets: Dict[tuple, List[bytes]] = field(default_factory=dict, repr=False)
+
+    @property
+    def frames(self) -> int:
+        """Number of frames in one cycle."""
+        return len(self.colors)
+
+    @property
+    def frame_interval(self) -> float:
+        """Effect time between consecutive frames (seconds)."""
+        return self.period / len(self.colors)
+
+    def index_at(self, t: float) -> int:
+        """Frame index for effect time t (seconds)."""
+        return int((t % self.period) / self.frame_interval) % len(self.colors)
+
+    def packets_for(self, driver: AbstractLedDevice) -> Optional[List[bytes]]:
+        """Encoded driver packets for every frame, built on first use (None if the driver cannot encode)."""
+        if not driver.encodes_frames:
+            return None
+        key = (driver.__class__, getattr(driver, "current_speed", None))
+        if key not in self._packets:
+            packets: List[bytes] = []
+            encoded: Dict[Tuple[int, int, int], bytes] = {}
+            for color in self.colors:
+                rgb = (color.r, color.g, color.b)
+                packet = encoded.get(rgb)
+                if packet is None:
+                    packet = encoded[rgb] = bytes(driver.encode_color(*rgb))
+                packets.append(packet)
+            self._packets[key] = packets
+        return self._packets[key]
+
+
+def build_frame_table(
+    mode: ColorMode,
+    brightness: float,
+    speed: int,
+    frame_rate: float = TABLE_FRAME_RATE
+) -> FrameTable:
+    """Render one cycle of a periodic effect into a frame table."""
+    render = _RENDERERS[mode]
+    brightness = max(0.0, min(1.0, float(brightness)))
+    period = effect_period(mode, speed)
+    count = max(1, int(round(period * frame_rate)))
+
+    colors: List[Color] = []
+    shared: Dict[Tuple[int, int, int], Color] = {}
+    for i in range(count):
+        r, g, b = render(i / count)
+        rgb = (int(r * brightness), int(g * brightness), int(b * brightness))
+        # Repeated colors share one Color instance
+        color = shared.get(rgb)
+        if color is None:
+            color = shared[rgb] = Color(*rgb)
+        colors.append(color)
+
+    return FrameTable(
+        mode=mode,
+        brightness=brightness,
+        speed=speed,
+        period=period,
+        colors=tuple(colors)
+    )
+
+
+class EffectFrameCache:
+    """LRU cache of frame tables keyed by (effect, brightness, speed)."""
+
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max(1, int(max_entries))
+        self._tables: "OrderedDict[tuple, FrameTable]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, mode: ColorMode, brightness: float, speed: int) -> FrameTable:
+        """Return the frame table for the given parameters, building it on a miss."""
+        key = (mode, round(float(brightness), 3), int(speed))
+        table = self._tables.get(key)
+        if table is not None:
+            self.hits += 1
+            self._tables.move_to_end(key)
+            return table
+
+        self.misses += 1
+        table = build_frame_table(mode, key[1], key[2])
+        self._tables[key] = table
+        if len(self._tables) > self.max_entries:
+            self._tables.popitem(last=False)
+        return table
+
+    def invalidate(self) -> None:
+        """Drop all tables (brightness or speed changed)."""
+        self._tables.clear()
+
+    def __len__(self) -> int:
+        return len(self._tables)
+
+
+class EffectScheduler:
+    """
+    Paces effect frames to absolute deadlines on the monotonic clock.
+    
+    Effects are evaluated as a function of elapsed time, so write latency
+    never stretches the cycle: frames whose deadline has already passed
+    by a full interval are skipped (counted as dropped) instead of queued.
+    """
+
+    def __init__(self, frame_interval: float = 1.0 / TABLE_FRAME_RATE, jitter_alpha: float = 0.1):
+        self.frame_interval: float = max(0.001, float(frame_interval))
+        self.jitter_alpha: float = jitter_alpha
+        self.start_time: Optional[float] = None
+        self._next_deadline: float = 0.0
+
+        # Counters
+        self.frames_rendered: int = 0
+        self.frames_dropped: int = 0
+        self.jitter_avg: float = 0.0  # EMA of lateness vs. deadline, seconds
+        self.jitter_max: float = 0.0
+
+    @property
+    def started(self) -> bool:
+        """Check if the clock is running."""
+        return self.start_time is not None
+
+    def reset(self) -> None:
+        """Restart the effect clock (e.g. on mode change); counters are kept."""
+        self.start_time = time.monotonic()
+        self._next_deadline = self.start_time
+
+    def elapsed(self) -> float:
+        """Effect time since reset, seconds."""
+        if self.start_time is None:
+            return 0.0
+        return time.monotonic() - self.start_time
+
+    async def wait_next_frame(self) -> float:
+        """
+        Sleep until the next frame deadline.
+        
+        Returns:
+            Effect time (seconds since reset) at which to evaluate this frame.
+        """
+        if self.start_time is None:
+            self.reset()
+
+        now = time.monotonic()
+        if now < self._next_deadline:
+            await asyncio.sleep(self._next_deadline - now)
+            now = time.monotonic()
+
+        lateness = now - self._next_deadline
+        self.jitter_avg += self.jitter_alpha * (lateness - self.jitter_avg)
+        self.jitter_max = max(self.jitter_max, lateness)
+
+        if lateness >= self.frame_interval:
+            # Skip missed frames rather than trying to catch up
+            skipped = int(lateness // self.frame_interval)
+            self.frames_dropped += skipped
+            self._next_deadline += skipped * self.frame_interval
+
+        self._next_deadline += self.frame_interval
+        self.frames_rendered += 1
+        return now - self.start_time
@@ -0,0 +1,148 @@
+"""
+Metric-to-color gradient engine.
+Maps a metric (e.g. CPU %) to a color through a precomputed 256-entry
+gradient lookup table, with EMA smoothing, hysteresis and an output
+change threshold so the display stays readable and writes stay rare.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from core.models import Color
+
+
+class GradientLUT:
+    """256-entry color lookup table interpolated from gradient stops."""
+
+    SIZE = 256
+
+    def __init__(self, stops: Sequence[Tuple[float, Color]]):
+        """
+        Build the lookup table.
+
+        Args:
+            stops: (position 0.0-1.0, color) pairs; at least one.
+        """
+        if not stops:
+            raise ValueError("Gradient needs at least one stop")
+        ordered = sorted(((max(0.0, min(1.0, float(p))), c) for p, c in stops), key=lambda s: s[0])
+        self.stops: List[Tuple[float, Color]] = ordered
+        self.colors: Tuple[Color, ...] = tuple(
+            self._interpolate(i / (self.SIZE - 1)) for i in range(self.SIZE)
+        )
+
+    def _interpolate(self, position: float) -> Color:
+        """Linear interpolation between the surrounding stops."""
+        stops = self.stops
+        if position <= stops[0][0]:
+            return stops[0][1]
+        for (p0, c0), (p1, c1) in zip(stops, stops[1:]):
+            if position <= p1:
+                t = 0.0 if p1 == p0 else (position - p0) / (p1 - p0)
+                return Color(
+                    r=round(c0.r + (c1.r - c0.r) * t),
+                    g=round(c0.g + (c1.g - c0.g) * t),
+                    b=round(c0.b + (c1.b - c0.b) * t)
+                )
+        return stops[-1][1]
+
+    def color_at(self, index: int) -> Color:
+        """Color for LUT index 0-255 (clamped)."""
+        return self.colors[max(0, min(self.SIZE - 1, index))]
+
+    @staticmethod
+    def from_config(stops_data: List[Dict[str, Any]]) -> 'GradientLUT':
+        """
+        Build from config stops: [{"at": 0.0-1.0, "color": "#RRGGBB" or {"r", "g", "b"}}].
+        """
+        stops = []
+        for stop in stops_data:
+            color = stop.get("color", "#000000")
+            color = Color.from_hex(color) if isinstance(color, str) else Color.from_dict(color)
+            stops.append((float(stop.get("at", 0.0)), color))
+        return GradientLUT(stops)
+
+
+class MetricColorMapper:
+    """
+    Maps a stream of metric readings to gradient colors.
+
+    - EMA smoothing removes sample noise.
+    - Hysteresis: the LUT index only moves when the smoothed value moved
+      more than `hysteresis` index steps away from the shown one.
+    - The output color only changes when it differs from the last emitted
+      color by more than `emit_threshold` on any channel.
+    """
+
+    def __init__(
+        self,
+        lut: GradientLUT,
+        *,
+        minimum: float = 0.0,
+        maximum: float = 100.0,
+        smoothing: float = 0.3,
+        hysteresis: float = 2.0,
+        emit_threshold: int = 6
+    ):
+        self.lut = lut
+        self.minimum = float(minimum)
+        self.maximum = float(maximum) if float(maximum) != float(minimum) else float(minimum) + 1.0
+        self.smoothing = max(0.01, min(1.0, float(smoothing)))
+        self.hysteresis = max(0.0, float(hysteresis))
+        self.emit_threshold = max(0, int(emit_threshold))
+
+        self.smoothed: Optional[float] = None  # EMA in LUT index units
+        self.index: Optional[int] = None       # LUT index currently shown
+        self.current: Optional[Color] = None   # Last emitted color
+
+    def reset(self) -> None:
+        """Forget smoothing state."""
+        self.smoothed = None
+        self.index = None
+        self.current = None
+
+    def update(self, value: float) -> Optional[Color]:
+        """
+        Feed a new reading.
+
+        Returns:
+            The new color if the output changed enough to be worth a write,
+            otherwise None (self.current keeps the color on display).
+        """
+        span = self.maximum - self.minimum
+        position = (float(value) - self.minimum) / span * (GradientLUT.SIZE - 1)
+        position = max(0.0, min(GradientLUT.SIZE - 1.0, position))
+
+        if self.smoothed is None:
+            self.smoothed = position
+        else:
+            self.smoothed += self.smoothing * (position - self.smoothed)
+
+        if self.index is not None and abs(self.smoothed - self.index) <= self.hysteresis:
+            return None
+        index = int(round(self.smoothed))
+
+        color = self.lut.color_at(index)
+        if self.current is not None:
+            delta = max(
+                abs(color.r - self.current.r),
+                abs(color.g - self.current.g),
+                abs(color.b - self.current.b)
+            )
+            if delta <= self.emit_threshold:
+                return None
+        # Only an emitted color moves the hysteresis anchor
+        self.index = index
+        self.current = color
+        return color
+
+    @staticmethod
+    def from_config(config: Dict[str, Any]) -> 'MetricColorMapper':
+        """Build from a gradient config entry (see ConfigService.DEFAULT_CONFIG["gradients"])."""
+        return MetricColorMapper(
+            GradientLUT.from_config(config.get("stops", [])),
+            minimum=config.get("min", 0.0),
+            maximum=config.get("max", 100.0),
+            smoothing=config.get("smoothing", 0.3),
+            hysteresis=config.get("hysteresis", 2.0),
+            emit_threshold=config.get("emit_threshold", 6)
+        )
@@ -0,0 +1,348 @@
+"""
+Device groups for synchronized multi-device effects.
+A group renders one effect from a shared clock and fans every frame out
+to all members concurrently, delaying fast links by their latency
+difference so all strips change color on the same frame.
+"""
+
+import asyncio
+import concurrent.futures
+import statistics
+import time
+from typing import Dict, List, Optional
+
+from core.models import Color, ColorMode
+from core.services import LoggerService as logger
+from core.commands import Command, CommandType
+from core.effects import EffectFrameCache, EffectScheduler, TABLE_FRAME_RATE, supports_frame_table
+from core.gradient import MetricColorMapper
+from core.sampling import METRIC_MODE_SOURCES, MetricSampler
+from core.controller import BleDeviceController
+
+
+class DeviceGroup:
+    """
+    Devices that show one effect in lockstep.
+
+    Members keep their own connection supervision (reconnect, RSSI, device
+    mode sync); while grouped, their own effects and color writes pause
+    and the group writes frames through each member's write path.
+    """
+
+    # Bound on a member's learned skew; beyond it the latency estimate is off, not the link
+    MAX_MEMBER_SKEW_MS = 250.0
+
+    def __init__(
+        self,
+        group_id: str,
+        members: Dict[str, BleDeviceController],
+        loop: asyncio.AbstractEventLoop,
+        *,
+        metric_sampler: Optional[MetricSampler] = None,
+        skew_alpha: float = 0.1
+    ):
+        self.group_id = group_id
+        self.members: Dict[str, BleDeviceController] = dict(members)
+        self.loop = loop
+        self.metric_sampler = metric_sampler
+        self.skew_alpha = skew_alpha
+
+        # Target state (shared by all members)
+        self.mode = ColorMode.MANUAL
+        self.color = Color()
+        self.brightness = 1.0
+        self.speed = 0x10
+
+        # Shared effect clock and frame tables
+        self.scheduler = EffectScheduler()
+        self.effect_cache = EffectFrameCache()
+        self.metric_mapper: Optional[MetricColorMapper] = None
+        self._metric_spec: Optional[str] = None
+        self._last_metric_sample: Optional[float] = None
+
+        # Sync metrics: spread of write completion times within a frame
+        self.frames_broadcast = 0
+        self.skew_ms: Optional[float] = None      # Last frame
+        self.skew_avg_ms: Optional[float] = None  # EMA
+        self.skew_max_ms: float = 0.0
+        # Per member: EMA of completion minus the frame's median completion,
+        # as it would be without compensation, and the delay last applied
+        self.member_skew_ms: Dict[str, float] = {}
+        self.member_delay_ms: Dict[str, float] = {}
+
+        self.is_running = False
+        self._wake_event: Optional[asyncio.Event] = None
+        self._future: Optional[concurrent.futures.Future] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def member_ids(self) -> List[str]:
+        """Ids of the group members."""
+        return list(self.members)
+
+    # ---- lifecycle (any thread) ----
+
+    def start(self) -> None:
+        """Take over the members and start rendering on the shared loop."""
+        if self.is_running:
+            return
+        self.is_running = True
+        for controller in self.members.values():
+            controller.group = self
+            controller.set_mode(self.mode)
+            controller._request_wake()
+        self._future = asyncio.run_coroutine_threadsafe(self._run(), self.loop)
+
+    def stop(self) -> None:
+        """Stop rendering and hand the members back to their own loops."""
+        self.is_running = False
+        task = self._task
+        if task is not None and not task.done() and not self.loop.is_closed():
+            try:
+                self.loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                pass
+        future = self._future
+        self._future = None
+        if future is not None:
+            try:
+                on_loop = asyncio.get_running_loop() is self.loop
+            except RuntimeError:
+                on_loop = False
+            if not on_loop:
+                concurrent.futures.wait([future], timeout=5.0)
+        for controller in self.members.values():
+            if controller.group is self:
+                controller.group = None
+                controller._request_wake()
+
+    def remove_member(self, member_id: str) -> None:
+        """Drop a member (safe to call from any thread); it renders on its own again."""
+        # Swapped, not mutated: the render loop may be iterating the old dict
+        members = dict(self.members)
+        controller = members.pop(member_id, None)
+        if controller is None:
+            return
+        self.members = members
+        if controller.group is self:
+            controller.group = None
+            controller._request_wake()
+
+    # ---- commands (any thread) ----
+
+    def submit(self, command: Command) -> None:
+        """Apply a command to the whole group (safe to call from any thread)."""
+        if command.type in (CommandType.DISCONNECT, CommandType.CONNECT):
+            for controller in self.members.values():
+                controller.submit(command)
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._apply_command, command)
+        except RuntimeError:
+            # Loop not running (yet/anymore): apply directly
+            self._apply_command(command)
+
+    def _apply_command(self, command: Command):
+        """Update group target state and mirror mode/speed to the members."""
+        if command.type == CommandType.MODE:
+            if command.value != self.mode:
+                self.mode = command.value
+                self.scheduler.reset()
+                for controller in self.members.values():
+                    controller.set_mode(command.value)
+        elif command.type == CommandType.SPEED:
+            speed = max(0, min(255, int(command.value)))
+            if speed != self.speed:
+                self.speed = speed
+                self.effect_cache.invalidate()
+                for controller in self.members.values():
+                    controller.set_speed(speed)
+        elif command.type == CommandType.BRIGHTNESS:
+            brightness = max(0.0, min(1.0, float(command.value)))
+            if brightness != self.brightness:
+                self.brightness = brightness
+                self.effect_cache.invalidate()
+        elif command.type == CommandType.COLOR:
+            self.color = command.value
+        if self._wake_event is not None:
+            self._wake_event.set()
+
+    # ---- rendering (loop thread) ----
+
+    async def broadcast(self, final_color: Color, frame_for=None) -> None:
+        """
+        Write one frame to all connected members concurrently.
+
+        Every member's rate governor slot is reserved first, then each
+        member is delayed by (slowest average latency - its own) minus its
+        learned skew, so completions line up. The remaining spread is
+        recorded as group skew and feeds each member's skew average.
+
+        Args:
+            final_color: Brightness-applied color for this frame
+            frame_for: Optional callable(controller) -> pre-encoded packet or None
+        """
+        members = [
+            (member_id, c) for member_id, c in self.members.items()
+            if c.device_driver is not None and c.status.is_connected
+        ]
+        if not members:
+            return
+        # Unchanged members are skipped before they take a write slot
+        members = [(member_id, c) for member_id, c in members if c._color_write_due(final_color)]
+        # Waiting on each governor after the compensation delay would skew the writes again
+        await asyncio.gather(*(c.rate_governor.acquire() for _, c in members))
+        latencies = [c.rate_governor.avg_latency or 0.0 for _, c in members]
+        slowest = max(latencies, default=0.0)
+        offsets = [
+            slowest - latency - self.member_skew_ms.get(member_id, 0.0) / 1000
+            for (member_id, _), latency in zip(members, latencies)
+        ]
+        # Shift so the earliest member starts right away
+        earliest = min(offsets, default=0.0)
+        delays = [offset - earliest for offset in offsets]
+        self.member_delay_ms = {member_id: round(delay * 1000, 2) for (member_id, _), delay in zip(members, delays)}
+        results = await asyncio.gather(
+            *(
+                self._write_member(c, final_color, frame_for(c) if frame_for else None, delay)
+                for (_, c), delay in zip(members, delays)
+            ),
+            return_exceptions=True
+        )
+        written = {member_id: r for (member_id, _), r in zip(members, results) if isinstance(r, float)}
+        completions = list(written.values())
+        self.frames_broadcast += 1
+        if len(completions) > 1:
+            median = statistics.median(completions)
+            for member_id, completed in written.items():
+                # This frame ran with the learned skew compensated: add it back
+                # to get the member's uncompensated skew, then average that
+                skew = self.member_skew_ms.get(member_id, 0.0)
+                measured = (completed - median) * 1000 + skew
+                skew += self.skew_alpha * (measured - skew)
+                self.member_skew_ms[member_id] = round(
+                    max(-self.MAX_MEMBER_SKEW_MS, min(self.MAX_MEMBER_SKEW_MS, skew)), 2
+                )
+            skew_ms = (max(completions) - min(completions)) * 1000
+            self.skew_ms = round(skew_ms, 2)
+            if self.skew_avg_ms is None:
+                self.skew_avg_ms = self.skew_ms
+            else:
+                self.skew_avg_ms = round(self.skew_avg_ms + self.skew_alpha * (skew_ms - self.skew_avg_ms), 2)
+            self.skew_max_ms = max(self.skew_max_ms, self.skew_ms)
+
+    async def _write_member(
+        self,
+        controller: BleDeviceController,
+        final_color: Color,
+        frame: Optional[bytes],
+        delay: float
+    ) -> Optional[float]:
+        """Write one member after its compensation delay; returns completion time if written."""
+        if delay > 0:
+            await asyncio.sleep(delay)
+        last_write = controller.shadow.last_write
+        await controller._write_color(final_color, frame)
+        if controller.shadow.last_write == last_write:
+            return None  # Unchanged (deduped) or failed
+        return time.monotonic()
+
+    async def _run(self):
+        """Group render loop: one frame per iteration for the current mode."""
+        self._task = asyncio.current_task()
+        self._wake_event = asyncio.Event()
+        try:
+            while self.is_running:
+                mode = self.mode
+                try:
+                    if mode in METRIC_MODE_SOURCES:
+                        await self._render_metric_frame(mode)
+                    else:
+                        self._release_metric()
+                        if supports_frame_table(mode):
+                            await self._render_table_frame(mode)
+                        else:
+                            await self.broadcast(self.color.apply_brightness(self.brightness))
+                            # Wake on changes; poll for reconnected members and keepalive
+                            await self._wait_for_change(1.0)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # One bad frame must not stop the group
+                    logger.error(f"Group {self.group_id} render error: {e}")
+                    await self._wait_for_change(1.0)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._release_metric()
+
+    async def _wait_for_change(self, timeout: float):
+        """Sleep until the group state changes or timeout expires."""
+        try:
+            await asyncio.wait_for(self._wake_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wake_event.clear()
+
+    def _frame_interval(self) -> float:
+        """Shared frame interval: paced to the slowest member's write rate."""
+        intervals = [c.rate_governor.interval for c in self.members.values()]
+        return max([1.0 / TABLE_FRAME_RATE] + intervals)
+
+    async def _render_table_frame(self, mode: ColorMode):
+        """One frame of a precomputed effect, evaluated on the shared clock."""
+        self.scheduler.frame_interval = self._frame_interval()
+        t = await self.scheduler.wait_next_frame()
+        if self.mode != mode:
+            return
+        table = self.effect_cache.get(mode, self.brightness, self.speed)
+        i = table.index_at(t)
+
+        def frame_for(controller: BleDeviceController) -> Optional[bytes]:
+            if controller.device_driver is None:
+                return None
+            packets = table.packets_for(controller.device_driver)
+            return packets[i] if packets else None
+
+        await self.broadcast(table.colors[i], frame_for)
+
+    async def _render_metric_frame(self, mode: ColorMode):
+        """One frame of a metric mode, using the first member's gradient settings."""
+        first = next(iter(self.members.values()), None)
+        if first is None or self.metric_sampler is None:
+            await self._wait_for_change(1.0)
+            return
+        spec = first._metric_source_spec(mode)
+        if spec != self._metric_spec:
+            self._release_metric()
+            try:
+                self.metric_sampler.subscribe(spec)
+            except ValueError as e:
+                logger.warning(f"Metric mode {mode.value} unavailable: {e}")
+                await self._wait_for_change(1.0)
+                return
+            self._metric_spec = spec
+            # Own mapper: the member's smoothing/hysteresis state stays its own
+            gradient = first.gradients.get(mode.value)
+            self.metric_mapper = MetricColorMapper.from_config(gradient) if gradient is not None else None
+
+        self.scheduler.frame_interval = self._frame_interval()
+        await self.scheduler.wait_next_frame()
+        buffer = self.metric_sampler.buffer(spec)
+        sample = buffer.latest() if buffer else None
+        if sample is None or self.metric_mapper is None:
+            return
+        timestamp, value = sample
+        if timestamp != self._last_metric_sample:
+            self._last_metric_sample = timestamp
+            self.metric_mapper.update(value)
+        if self.metric_mapper.current is not None:
+            await self.broadcast(self.metric_mapper.current.apply_brightness(self.brightness))
+
+    def _release_metric(self):
+        """Drop the metric subscription (mode left a metric mode)."""
+        if self._metric_spec is not None and self.metric_sampler is not None:
+            self.metric_sampler.unsubscribe(self._metric_spec)
+        self._metric_spec = None
+        self.metric_mapper = None
+        self._last_metric_sample = None
@@ -3,9 +3,40 @@ Abstract interface for LED device drivers.
 Defines the contract that all protocol-specific drivers must implement.
 """
 
+import time
 from abc import ABC, abstractmethod
-from typing import Optional, Tuple
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple, Union
 from bleak import BleakClient
+from bleak.backends.characteristic import BleakGATTCharacteristic
+
+
+def clamp_byte(value) -> int:
+    """Clamp a numeric value to a single byte (0-255)."""
+    return max(0, min(255, int(value)))
+
+
+@dataclass(frozen=True)
+class AdvertisementFingerprint:
+    """
+    Vendor evidence in an advertisement that identifies a protocol.
+    
+    Matches manufacturer data under manufacturer_id or service data under
+    service_data_uuid16 (exactly one is set), optionally only if the
+    payload starts with data_prefix (e.g. a model byte).
+    """
+    manufacturer_id: Optional[int] = None
+    service_data_uuid16: Optional[int] = None
+    data_prefix: bytes = b""
+    confidence: float = 0.95
+    
+    def __post_init__(self):
+        if (self.manufacturer_id is None) == (self.service_data_uuid16 is None):
+            raise ValueError("Fingerprint needs exactly one of manufacturer_id or service_data_uuid16")
+    
+    def matches(self, payload: bytes) -> bool:
+        """Check the payload found under this fingerprint's key."""
+        return bytes(payload).startswith(self.data_prefix)
 
 
 class AbstractLedDevice(ABC):
@@ -16,6 +47,28 @@ class AbstractLedDevice(ABC):
     must inherit from this class and implement all abstract methods.
     """
     
+    # Upper bound for frame writes per second; the controller's rate
+    # governor learns the actual sustainable rate below this ceiling.
+    MAX_FRAME_RATE: float = 20.0
+    
+    # Service UUIDs this protocol's devices advertise (used by the scanner
+    # to pick LED controllers out of the advertisement stream)
+    ADVERTISED_SERVICE_UUIDS: Tuple[str, ...] = ()
+    
+    # DeviceFactory detection index: name fragments (upper case, matched
+    # anywhere in the advertised name) and 16-bit service/characteristic
+    # UUIDs. Drivers declaring neither are probed via can_handle_device().
+    NAME_KEYWORDS: Tuple[str, ...] = ()
+    SERVICE_UUID16: Tuple[int, ...] = ()
+    
+    # Manufacturer/service data fingerprints: pick this driver from the
+    # advertisement alone (no connect, no probing)
+    ADVERTISEMENT_FINGERPRINTS: Tuple[AdvertisementFingerprint, ...] = ()
+    
+    # Write characteristic UUIDs to try on connect, preferred first
+    # (empty = get_write_characteristic_uuid() only)
+    WRITE_CHAR_CANDIDATES: Tuple[str, ...] = ()
+    
     def __init__(self, client: Optional[BleakClient] = None):
         """
         Initialize device driver.
@@ -25,6 +78,19 @@ class AbstractLedDevice(ABC):
         """
         self.client: Optional[BleakClient] = client
         self.is_connected: bool = False
+        # Write characteristic known from a device profile; when set,
+        # connect() looks it up directly instead of walking client.services
+        self.known_write_uuid: Optional[str] = None
+        # Resolved once per connect; writes go through the cached object
+        # so bleak does not look the UUID up on every write
+        self.write_char: Optional[BleakGATTCharacteristic] = None
+        self.actual_uuid: Optional[str] = None
+        # Packet capture (core/capture.py); None = recording off, no cost
+        self.recorder = None
+        # Packet write metrics (core/metrics.PacketMetrics); None = not measured
+        self.packet_metrics = None
+        # Color packet template patched in place by encode_color() (set by drivers)
+        self._color_frame: Optional[bytearray] = None
     
     @abstractmethod
     async def connect(self, client: BleakClient) -> bool:
@@ -39,6 +105,77 @@ class AbstractLedDevice(ABC):
         """
         pass
     
+    def resolve_write_characteristic(self, client: BleakClient) -> str:
+        """
+        Pick the write characteristic once, at connect time, and cache it.
+        
+        The profiled UUID is tried first, then WRITE_CHAR_CANDIDATES in
+        order. If none is present in the GATT table, writes fall back to
+        the driver's default UUID string.
+        
+        Args:
+            client: Connected BleakClient
+            
+        Returns:
+            UUID of the characteristic writes will use (also stored in actual_uuid).
+        """
+        self.write_char = None
+        candidates = list(self.WRITE_CHAR_CANDIDATES) or [self.get_write_characteristic_uuid()]
+        if self.known_write_uuid:
+            try:
+                self.write_char = client.services.get_characteristic(self.known_write_uuid)
+            except Exception:
+                self.write_char = None
+        if self.write_char is None:
+            available = {}
+            try:
+                for service in client.services:
+                    for char in service.characteristics:
+                        available.setdefault(str(char.uuid).lower(), char)
+            except Exception:
+                pass
+            for uuid in candidates:
+                if uuid.lower() in available:
+                    self.write_char = available[uuid.lower()]
+                    break
+        self.actual_uuid = str(self.write_char.uuid) if self.write_char is not None else candidates[0]
+        return self.actual_uuid
+    
+    def release_write_characteristic(self) -> None:
+        """Drop the cached characteristic (it belongs to the old connection)."""
+        self.write_char = None
+        self.actual_uuid = None
+    
+    async def write_packet(self, payload: Union[bytes, bytearray]) -> None:
+        """
+        Write a packet through the cached characteristic (raises on failure).
+        
+        Only the encode_color() template is copied: the write awaits, and
+        another encode_color() may patch it before the backend has sent
+        it. Pre-encoded frames (bytes) and one-off packets go out as-is.
+        """
+        if payload is self._color_frame:
+            payload = bytearray(payload)
+        if self.recorder is not None:
+            self.recorder.record(
+                getattr(self.client, "address", ""),
+                self.actual_uuid or self.get_write_characteristic_uuid(),
+                payload
+            )
+        char = self.write_char or self.actual_uuid or self.get_write_characteristic_uuid()
+        metrics = self.packet_metrics
+        if metrics is None:
+            await self.client.write_gatt_char(char, payload, response=False)
+            return
+        started = time.monotonic()
+        try:
+            await self.client.write_gatt_char(char, payload, response=False)
+        except Exception:
+            metrics.failed.inc()
+            raise
+        metrics.written.inc()
+        metrics.latency.observe(time.monotonic() - started)
+    
     @abstractmethod
     async def disconnect(self) -> None:
         """
@@ -61,6 +198,54 @@ class AbstractLedDevice(ABC):
         """
         pass
     
+    def encode_color(self, r: int, g: int, b: int) -> bytearray:
+        """
+        Encode a color command into a protocol packet without sending it.
+        
+        Optional: drivers that implement it get pre-encoded effect frames
+        (see encodes_frames); the others receive every color through
+        set_color().
+        
+        Drivers patch a preallocated packet template in place, so the
+        returned buffer is only valid until the next encode_color() call
+        and must not be held across an await. Copy it (bytes(...)) to keep
+        it, e.g. for precomputed frame tables; write_packet() copies it
+        itself when handed the template.
+        
+        Args:
+            r: Red component (0-255, clamped)
+            g: Green component (0-255, clamped)
+            b: Blue component (0-255, clamped)
+            
+        Returns:
+            Encoded packet ready for write_frame().
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not encode color packets")
+    
+    @property
+    def encodes_frames(self) -> bool:
+        """True if the driver implements encode_color()."""
+        return type(self).encode_color is not AbstractLedDevice.encode_color
+    
+    async def write_frame(self, frame: Union[bytes, bytearray]) -> bool:
+        """
+        Write an already-encoded packet to the device as-is.
+        
+        Args:
+            frame: Packet produced by encode_color() (or a copy of one).
+            
+        Returns:
+            True if command sent successfully, False otherwise.
+        """
+        if not self.client or not self.client.is_connected:
+            return False
+        
+        try:
+            await self.write_packet(frame)
+            return True
+        except Exception:
+            return False
+    
     @abstractmethod
     async def set_brightness(self, brightness: int) -> bool:
         """
@@ -135,4 +320,21 @@ class AbstractLedDevice(ABC):
             Example: {"MANUAL": 0x01, "RAINBOW": 0x04}
         """
         pass
+    
+    @classmethod
+    def decode_packet(cls, packet: Union[bytes, bytearray]) -> Optional[Dict[str, Any]]:
+        """
+        Decode a packet this driver writes (the inverse of its encoders).
+        
+        Used by the virtual device backend and packet capture tools.
+        
+        Args:
+            packet: Raw bytes as written to the write characteristic
+            
+        Returns:
+            {"command": "color", "r", "g", "b"}, {"command": "mode", "mode_id",
+            "speed"} or {"command": "brightness", "value"} (byte values), or
+            None if the packet is not recognized.
+        """
+        return None
 
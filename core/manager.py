@@ -0,0 +1,263 @@
+"""
+Multi-device management on one shared event loop.
+Every configured device gets its own BleDeviceController (state, status,
+command queue), but all of them run as tasks on a single asyncio loop
+thread and share one metric sampler. Devices can be grouped for
+synchronized effects.
+"""
+
+import asyncio
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from core.models import Color, DeviceConfig, DeviceStatus
+from core.services import LoggerService as logger
+from core.commands import Command
+from core.sampling import MetricSampler
+from core.scanner import Advertisement, BleScanner
+from core.profiles import ProfileStore
+from core.virtual import VirtualBleBackend
+from core.capture import PacketRecorder
+from core.metrics import REGISTRY, MetricsRegistry
+from core.controller import BleDeviceController
+from core.groups import DeviceGroup
+
+
+class DeviceManager:
+    """
+    Runs N devices as tasks on one event loop.
+
+    Controllers are created with the manager's loop, so adding a device
+    costs a task, not a thread. Status callbacks receive the device id.
+    """
+
+    def __init__(
+        self,
+        on_status_change: Optional[Callable[[str, DeviceStatus], None]] = None,
+        on_color_received: Optional[Callable[[str, Color], None]] = None,
+        *,
+        metric_sample_interval: float = 0.5,
+        scanner: Optional[BleScanner] = None,
+        profile_store: Optional[ProfileStore] = None,
+        virtual_backend: Optional[VirtualBleBackend] = None,
+        packet_recorder: Optional[PacketRecorder] = None,
+        metrics_registry: Optional[MetricsRegistry] = None
+    ):
+        self.on_status_change = on_status_change
+        self.on_color_received = on_color_received
+        self.loop = asyncio.new_event_loop()
+        self.thread: Optional[threading.Thread] = None
+        self.is_running = False
+        # One sampler for all devices: a metric is read once per tick
+        self.metric_sampler = MetricSampler(interval=metric_sample_interval)
+        # Virtual devices instead of the adapter (None = real hardware)
+        self.virtual_backend = virtual_backend
+        # One scanner for all devices: lookups read its advertisement index
+        if scanner is None:
+            scanner = BleScanner() if virtual_backend is None else BleScanner(scanner_factory=virtual_backend.create_scanner)
+        self.scanner = scanner
+        # Device profiles, loaded once for all devices (virtual runs keep them in memory)
+        if profile_store is None:
+            profile_store = ProfileStore().load() if virtual_backend is None else ProfileStore(None)
+        self.profile_store = profile_store
+        # One packet capture for all devices (None = off)
+        self.packet_recorder = packet_recorder
+        # Metrics of all devices, labelled by device id
+        self.metrics_registry = metrics_registry or REGISTRY
+        # Insertion-ordered: the first device is the primary one
+        self.controllers: Dict[str, BleDeviceController] = {}
+        # Synchronized device groups, addressable like devices
+        self.groups: Dict[str, DeviceGroup] = {}
+
+    @property
+    def device_ids(self) -> List[str]:
+        """Ids of all managed devices, in insertion order."""
+        return list(self.controllers)
+
+    def add_device(self, config: DeviceConfig, **controller_kwargs: Any) -> BleDeviceController:
+        """
+        Create a controller for config on the shared loop.
+
+        Args:
+            config: Device configuration; config.device_id must be unique
+            **controller_kwargs: Passed to BleDeviceController (reconnect, speed, ...)
+
+        Returns:
+            The new controller (already started if the manager is running).
+        """
+        device_id = config.device_id or config.target_mac
+        if not device_id:
+            raise ValueError("Device needs a device_id or target_mac")
+        if device_id in self.controllers:
+            raise ValueError(f"Device {device_id} already managed")
+        config.device_id = device_id
+        if self.virtual_backend is not None:
+            controller_kwargs.setdefault("use_real_device", False)
+            controller_kwargs.setdefault("virtual_backend", self.virtual_backend)
+
+        controller = BleDeviceController(
+            config,
+            lambda status: self._emit_status(device_id, status),
+            lambda color: self._emit_color(device_id, color),
+            metric_sampler=self.metric_sampler,
+            loop=self.loop,
+            scanner=self.scanner,
+            profile_store=self.profile_store,
+            packet_recorder=self.packet_recorder,
+            metrics_registry=self.metrics_registry,
+            **controller_kwargs
+        )
+        self.scanner.watch(config.target_mac)
+        self.controllers[device_id] = controller
+        if self.is_running:
+            controller.start()
+        return controller
+
+    def remove_device(self, device_id: str) -> None:
+        """Stop and forget a device."""
+        controller = self.controllers.pop(device_id, None)
+        if controller is None:
+            return
+        for group in self.groups.values():
+            group.remove_member(device_id)
+        self.scanner.unwatch(controller.device_config.target_mac)
+        controller.stop()
+
+    def add_group(self, group_id: str, device_ids: List[str]) -> DeviceGroup:
+        """
+        Group devices so they render one effect in lockstep.
+
+        Args:
+            group_id: Unique id, must not clash with a device id
+            device_ids: Member devices; a device can be in one group only
+
+        Returns:
+            The new group (already started if the manager is running).
+        """
+        if group_id in self.groups or group_id in self.controllers:
+            raise ValueError(f"Id {group_id} already in use")
+        members = {}
+        for device_id in device_ids:
+            controller = self.controllers.get(device_id)
+            if controller is None:
+                raise ValueError(f"Unknown device: {device_id}")
+            if any(device_id in g.members for g in self.groups.values()):
+                raise ValueError(f"Device {device_id} already grouped")
+            members[device_id] = controller
+
+        group = DeviceGroup(group_id, members, self.loop, metric_sampler=self.metric_sampler)
+        self.groups[group_id] = group
+        if self.is_running:
+            group.start()
+        return group
+
+    def remove_group(self, group_id: str) -> None:
+        """Dissolve a group; members go back to their own state."""
+        group = self.groups.pop(group_id, None)
+        if group is not None:
+            group.stop()
+
+    def discovered_devices(self) -> List[Advertisement]:
+        """Supported devices currently advertising, strongest signal first."""
+        return self.scanner.index.entries()
+
+    def get(self, device_id: Optional[str] = None) -> Optional[BleDeviceController]:
+        """Controller for device_id (default: the primary device)."""
+        if device_id is None:
+            return next(iter(self.controllers.values()), None)
+        return self.controllers.get(device_id)
+
+    def statuses(self) -> Dict[str, DeviceStatus]:
+        """Current status of every device."""
+        return {device_id: c.status for device_id, c in self.controllers.items()}
+
+    def submit(self, command: Command, target: Optional[str] = None) -> None:
+        """
+        Queue command for a device or group id, or for everything if target is None.
+
+        Grouped devices take commands through their group only.
+        """
+        if target is None:
+            grouped = set()
+            for group in self.groups.values():
+                group.submit(command)
+                grouped.update(group.members)
+            for device_id, controller in self.controllers.items():
+                if device_id not in grouped:
+                    controller.submit(command)
+        elif target in self.groups:
+            self.groups[target].submit(command)
+        elif target in self.controllers:
+            self.controllers[target].submit(command)
+        else:
+            logger.warning(f"Unknown device or group: {target}")
+
+    def start(self) -> None:
+        """Start the shared loop thread and every device task."""
+        if self.is_running:
+            logger.warning("Device manager already running")
+            return
+
+        self.is_running = True
+        self.thread = threading.Thread(
+            target=self._run_event_loop,
+            daemon=True,
+            name="BLE-Manager"
+        )
+        self.thread.start()
+        # Scanner first so the device tasks find it running
+        try:
+            asyncio.run_coroutine_threadsafe(self.scanner.start(), self.loop).result(timeout=10.0)
+        except Exception as e:
+            logger.error(f"Scanner start failed: {e}")
+        for controller in self.controllers.values():
+            controller.start()
+        for group in self.groups.values():
+            group.start()
+        logger.info(f"Device manager started ({len(self.controllers)} devices, {len(self.groups)} groups)")
+
+    def stop(self) -> None:
+        """Stop all device tasks, then the shared loop."""
+        self.is_running = False
+        for group in self.groups.values():
+            group.stop()
+        for controller in self.controllers.values():
+            controller.stop()
+        if self.loop.is_running():
+            try:
+                asyncio.run_coroutine_threadsafe(self.scanner.stop(), self.loop).result(timeout=5.0)
+            except Exception as e:
+                logger.debug(f"Scanner stop failed: {e}")
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread:
+            self.thread.join(timeout=5.0)
+        self.metric_sampler.stop()
+        self.profile_store.flush()
+        logger.info("Device manager stopped")
+
+    def _run_event_loop(self):
+        """Run the shared asyncio event loop."""
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        except Exception as e:
+            logger.error(f"Event loop error: {e}")
+        finally:
+            self.loop.close()
+
+    def _emit_status(self, device_id: str, status: DeviceStatus):
+        """Forward a device status change with its id."""
+        if self.on_status_change:
+            try:
+                self.on_status_change(device_id, status)
+            except Exception as e:
+                logger.debug(f"Status callback failed for {device_id}: {e}")
+
+    def _emit_color(self, device_id: str, color: Color):
+        """Forward a confirmed color with its device id."""
+        if self.on_color_received:
+            try:
+                self.on_color_received(device_id, color)
+            except Exception as e:
+                logger.debug(f"Color callback failed for {device_id}: {e}")
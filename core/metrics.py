@@ -0,0 +1,367 @@
+"""
+Lightweight metrics for the BLE hot paths.
+Counters, gauges and fixed-bucket histograms are created once (per device
+and driver) and then updated with plain attribute arithmetic, so recording
+a write costs a bisect and two additions. Snapshots are readable
+in-process (UI), as Prometheus text, and optionally over a localhost HTTP
+endpoint.
+"""
+
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from core.services import LoggerService as logger
+
+# Bucket upper bounds in seconds
+WRITE_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+CONNECT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+SCAN_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.0, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Counter:
+    """Monotonically increasing value."""
+    __slots__ = ("value",)
+    kind = "counter"
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: Union[int, float] = 1) -> None:
+        self.value += amount
+
+
+class Gauge:
+    """Value that is set, e.g. queue depth or RSSI."""
+    __slots__ = ("value",)
+    kind = "gauge"
+
+    def __init__(self):
+        self.value: Optional[float] = None
+
+    def set(self, value: Optional[float]) -> None:
+        self.value = value
+
+
+class Histogram:
+    """Observation counts in fixed buckets (plus sum and count)."""
+    __slots__ = ("bounds", "counts", "sum", "count")
+    kind = "histogram"
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = tuple(sorted(bounds))
+        # One slot per bound plus the overflow (+Inf) slot
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None if empty or in +Inf)."""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+
+Metric = Union[Counter, Gauge, Histogram]
+
+
+class MetricsRegistry:
+    """
+    Named metric families with label sets.
+
+    Lookups (counter()/gauge()/histogram()) lock and are meant for setup;
+    the returned objects are then updated lock-free from the thread that
+    owns them (the controller loop). Readers may see a value one update
+    old, never a torn one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # name -> (kind, help, {labels: metric})
+        self._families: Dict[str, Tuple[str, str, Dict[Labels, Metric]]] = {}
+
+    def _get(self, name: str, kind: str, help_text: str, labels: Optional[Dict[str, str]], factory) -> Metric:
+        key: Labels = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = (kind, help_text, {})
+                self._families[name] = family
+            elif family[0] != kind:
+                raise ValueError(f"Metric {name} already registered as a {family[0]}")
+            metric = family[2].get(key)
+            if metric is None:
+                metric = factory()
+                family[2][key] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None) -> Counter:
+        return self._get(name, "counter", help_text, labels, Counter)
+
+    def gauge(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None) -> Gauge:
+        return self._get(name, "gauge", help_text, labels, Gauge)
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        buckets: Tuple[float, ...],
+        labels: Optional[Dict[str, str]] = None
+    ) -> Histogram:
+        return self._get(name, "histogram", help_text, labels, lambda: Histogram(buckets))
+
+    def snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        """name -> [{"labels": {...}, "value": ...}] (histograms: count, sum, buckets, p50, p99)."""
+        with self._lock:
+            families = {name: (kind, dict(metrics)) for name, (kind, _, metrics) in self._families.items()}
+        result: Dict[str, List[Dict[str, Any]]] = {}
+        for name, (kind, metrics) in families.items():
+            entries = []
+            for labels, metric in metrics.items():
+                entry: Dict[str, Any] = {"labels": dict(labels)}
+                if kind == "histogram":
+                    entry.update({
+                        "count": metric.count,
+                        "sum": metric.sum,
+                        "buckets": dict(zip(metric.bounds + (float("inf"),), list(metric.counts))),
+                        "p50": metric.quantile(0.5),
+                        "p99": metric.quantile(0.99)
+                    })
+                else:
+                    entry["value"] = metric.value
+                entries.append(entry)
+            result[name] = entries
+        return result
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            families = [(name, kind, help_text, dict(metrics))
+                        for name, (kind, help_text, metrics) in sorted(self._families.items())]
+        lines: List[str] = []
+        for name, kind, help_text, metrics in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in metrics.items():
+                if kind == "histogram":
+                    cumulative = 0
+                    for bound, count in zip(metric.bounds + (float("inf"),), list(metric.counts)):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else _format_value(bound)
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(metric.sum)}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {metric.count}")
+                elif metric.value is not None:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(metric.value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels:
+        escaped = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: Union[int, float]) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return repr(value)
+    return str(value)
+
+
+# Process-wide registry used by default
+REGISTRY = MetricsRegistry()
+
+
+class WriteMetrics:
+    """Write outcome counters and latency histogram for one device and driver."""
+    __slots__ = ("attempted", "succeeded", "failed", "latency")
+
+    def __init__(self, registry: MetricsRegistry, device: str, driver: str):
+        labels = {"device": device, "driver": driver}
+        self.attempted = registry.counter("led_writes_attempted_total", "Packet writes attempted", labels)
+        self.succeeded = registry.counter("led_writes_succeeded_total", "Packet writes that succeeded", labels)
+        self.failed = registry.counter("led_writes_failed_total", "Packet writes that failed", labels)
+        self.latency = registry.histogram(
+            "led_write_latency_seconds", "Duration of one packet write", WRITE_LATENCY_BUCKETS, labels
+        )
+
+    def record(self, success: bool, latency: float) -> None:
+        self.attempted.value += 1
+        if success:
+            self.succeeded.value += 1
+            self.latency.observe(latency)
+        else:
+            self.failed.value += 1
+
+
+class PacketMetrics:
+    """GATT packet writes as a driver issues them, for one device and driver."""
+    __slots__ = ("written", "failed", "latency")
+
+    def __init__(self, registry: MetricsRegistry, device: str, driver: str):
+        labels = {"device": device, "driver": driver}
+        self.written = registry.counter("led_packets_written_total", "Packets written to the device", labels)
+        self.failed = registry.counter("led_packets_failed_total", "Packet writes the BLE backend rejected", labels)
+        self.latency = registry.histogram(
+            "led_packet_write_seconds", "Duration of one GATT packet write", WRITE_LATENCY_BUCKETS, labels
+        )
+
+
+class DeviceMetrics:
+    """Preallocated metrics of one BleDeviceController."""
+
+    def __init__(self, registry: MetricsRegistry, device: str):
+        self.registry = registry
+        self.device = device
+        labels = {"device": device}
+        self.frames_dropped = registry.counter(
+            "led_frames_dropped_total", "Effect frames skipped because they were late", labels
+        )
+        self.commands_dropped = registry.counter(
+            "led_commands_dropped_total", "Commands dropped because the queue was full", labels
+        )
+        self.queue_depth = registry.gauge("led_command_queue_depth", "Commands waiting for the controller loop", labels)
+        self.reconnects = registry.counter("led_reconnects_total", "Reconnects after a lost link", labels)
+        self.connect_duration = registry.histogram(
+            "led_connect_duration_seconds", "Duration of a successful connect", CONNECT_BUCKETS, labels
+        )
+        self.reconnect_duration = registry.histogram(
+            "led_reconnect_duration_seconds", "Link loss to reconnected", CONNECT_BUCKETS, labels
+        )
+        self.scan_duration = registry.histogram(
+            "led_scan_duration_seconds", "Time to find the device (index lookup or scan)", SCAN_BUCKETS, labels
+        )
+        self.rssi = registry.gauge("led_rssi_dbm", "Last RSSI reading", labels)
+        self._writes: Dict[str, WriteMetrics] = {}
+        self._packets: Dict[str, PacketMetrics] = {}
+
+    def writes_for(self, driver: str) -> WriteMetrics:
+        """Write metrics for a driver (created on first use)."""
+        metrics = self._writes.get(driver)
+        if metrics is None:
+            metrics = WriteMetrics(self.registry, self.device, driver)
+            self._writes[driver] = metrics
+        return metrics
+
+    def packets_for(self, driver: str) -> PacketMetrics:
+        """Packet-level write metrics for a driver (created on first use)."""
+        metrics = self._packets.get(driver)
+        if metrics is None:
+            metrics = PacketMetrics(self.registry, self.device, driver)
+            self._packets[driver] = metrics
+        return metrics
+
+
+def summary_lines(registry: MetricsRegistry, device: Optional[str] = None) -> List[str]:
+    """Short human-readable digest of a snapshot (for the UI)."""
+    snapshot = registry.snapshot()
+
+    def entries(name: str) -> List[Dict[str, Any]]:
+        return [e for e in snapshot.get(name, []) if device is None or e["labels"].get("device") == device]
+
+    def total(name: str) -> Union[int, float]:
+        return sum(e["value"] or 0 for e in entries(name))
+
+    lines = []
+    for entry in entries("led_writes_attempted_total"):
+        driver = entry["labels"].get("driver", "?")
+        failed = sum(e["value"] for e in entries("led_writes_failed_total") if e["labels"] == entry["labels"])
+        lines.append(f"{driver}: {entry['value']} writes, {failed} failed")
+    for entry in entries("led_write_latency_seconds"):
+        if entry["count"]:
+            p50 = "--" if entry["p50"] is None else f"<{entry['p50'] * 1000:g} ms"
+            p99 = "--" if entry["p99"] is None else f"<{entry['p99'] * 1000:g} ms"
+            lines.append(f"Write latency p50 {p50}, p99 {p99}")
+    lines.append(f"Frames dropped: {total('led_frames_dropped_total')}")
+    lines.append(f"Queue depth: {total('led_command_queue_depth')}")
+    reconnects = entries("led_reconnect_duration_seconds")
+    count = sum(e["count"] for e in reconnects)
+    if count:
+        avg = sum(e["sum"] for e in reconnects) / count
+        lines.append(f"Reconnects: {count} (avg {avg * 1000:.0f} ms)")
+    else:
+        lines.append("Reconnects: 0")
+    scans = entries("led_scan_duration_seconds")
+    scan_count = sum(e["count"] for e in scans)
+    if scan_count:
+        lines.append(f"Device lookups: {scan_count} (avg {sum(e['sum'] for e in scans) / scan_count * 1000:.0f} ms)")
+    rssi = [e["value"] for e in entries("led_rssi_dbm") if e["value"] is not None]
+    if rssi:
+        lines.append(f"RSSI: {rssi[0]} dBm")
+    return lines
+
+
+class MetricsServer:
+    """Serves a registry at http://host:port/metrics in Prometheus text format."""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY, port: int = 9464, host: str = "127.0.0.1"):
+        """
+        Args:
+            registry: Registry to export
+            port: TCP port (0 = pick a free one, see .port after start())
+            host: Bind address; localhost by default so nothing is exposed on the network
+        """
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> bool:
+        """Start serving in a daemon thread. Returns False if the port is unavailable."""
+        if self._server is not None:
+            return True
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            logger.error(f"Metrics endpoint failed to start: {e}")
+            return False
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name="Metrics-HTTP")
+        self._thread.start()
+        logger.info(f"Metrics at http://{self.host}:{self.port}/metrics")
+        return True
+
+    def stop(self) -> None:
+        server, self._server = self._server, None
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
@@ -15,6 +15,12 @@ class ColorMode(str, Enum):
     CPU = "CPU"
     BREATH = "BREATH"
     RAINBOW = "RAINBOW"
+    # System-metric modes (rendered through a gradient, see core/sampling.py)
+    MEMORY = "MEMORY"
+    DISK = "DISK"
+    NETWORK = "NETWORK"
+    TEMPERATURE = "TEMPERATURE"
+    LOAD = "LOAD"
 
 
 class TransitionStyle(str, Enum):
@@ -87,6 +93,7 @@ class DeviceConfig:
     write_char_uuid: str = ""  # Optional: will be auto-filled from driver if empty
     device_name: str = "Unknown LED Device"
     protocol: Optional[str] = None  # Protocol type: "elk_bledom", "triones", etc. None = auto-detect
+    device_id: str = ""  # Unique key when several devices are configured
     
     def to_dict(self) -> Dict:
         """Serialize to dict."""
@@ -99,7 +106,8 @@ class DeviceConfig:
             target_mac=data.get("target_mac", ""),
             write_char_uuid=data.get("write_char_uuid", ""),
             device_name=data.get("device_name", "Unknown LED Device"),
-            protocol=data.get("protocol")  # Optional field
+            protocol=data.get("protocol"),  # Optional field
+            device_id=data.get("device_id", "")
         )
 
 
@@ -113,17 +121,28 @@ class AppPreferences:
     auto_reconnect: bool = True
     reconnect_interval: float = 5.0
     default_speed: int = 16  # 0..255, used for effect speed
+    keepalive_interval: float = 10.0  # seconds between unchanged-state refreshes, 0 = off
+    metric_sample_interval: float = 0.5  # seconds between background metric samples
+    use_real_device: bool = True  # False = virtual devices, no Bluetooth adapter needed
+    capture_file: str = ""  # packet capture path (core/capture.py), empty = off
+    metrics_port: int = 0  # localhost Prometheus endpoint (core/metrics.py), 0 = off
     last_updated: str = field(default_factory=lambda: datetime.now().isoformat())
     
     def __post_init__(self):
         """Validate preferences values."""
         self.brightness = max(0.0, min(1.0, float(self.brightness)))
         self.reconnect_interval = max(1.0, float(self.reconnect_interval))
+        self.keepalive_interval = max(0.0, float(self.keepalive_interval))
+        self.metric_sample_interval = max(0.05, float(self.metric_sample_interval))
         # Clamp speed
         try:
             self.default_speed = max(0, min(255, int(self.default_speed)))
         except Exception:
             self.default_speed = 16
+        try:
+            self.metrics_port = max(0, min(65535, int(self.metrics_port)))
+        except Exception:
+            self.metrics_port = 0
     
     def to_dict(self) -> Dict:
         """Serialize to dict for JSON storage."""
@@ -135,6 +154,11 @@ class AppPreferences:
             "auto_reconnect": self.auto_reconnect,
             "reconnect_interval": self.reconnect_interval,
             "default_speed": int(self.default_speed),
+            "keepalive_interval": self.keepalive_interval,
+            "metric_sample_interval": self.metric_sample_interval,
+            "use_real_device": self.use_real_device,
+            "capture_file": self.capture_file,
+            "metrics_port": self.metrics_port,
             "last_updated": self.last_updated
         }
     
@@ -149,6 +173,12 @@ class AppPreferences:
             auto_reconnect=data.get("auto_reconnect", True),
             reconnect_interval=data.get("reconnect_interval", 5.0),
             default_speed=data.get("default_speed", 16),
+            keepalive_interval=data.get("keepalive_interval", 10.0),
+            # "cpu_sample_interval" is the pre-metric-sources name
+            metric_sample_interval=data.get("metric_sample_interval", data.get("cpu_sample_interval", 0.5)),
+            use_real_device=bool(data.get("use_real_device", True)),
+            capture_file=str(data.get("capture_file") or ""),
+            metrics_port=data.get("metrics_port", 0),
             last_updated=data.get("last_updated", datetime.now().isoformat())
         )
 
@@ -213,8 +243,44 @@ class DeviceStatus:
     last_sync: Optional[datetime] = None
     error_message: Optional[str] = None
     cpu_usage: Optional[float] = None  # For CPU monitor mode
+    metric_value: Optional[float] = None  # Latest reading of the active metric mode
+    frame_rate_limit: Optional[float] = None  # Current learned write rate (frames/sec)
+    frames_dropped: int = 0  # Effect frames skipped because they were late
+    frame_jitter_ms: Optional[float] = None  # Average lateness vs. frame deadline
+    connect_time_ms: Optional[float] = None  # Duration of the last connect
+    reconnect_time_ms: Optional[float] = None  # Link loss to reconnected, last time
+    reconnect_count: int = 0
     
     def is_healthy(self) -> bool:
         """Check if device connection is healthy."""
         return self.is_connected and (self.error_message is None)
 
+
+
+@dataclass
+class DeviceShadow:
+    """
+    Last state actually written to the device.
+    
+    Used for dirty-tracking: the controller only emits a write when the
+    target state differs from the shadow (or a keepalive refresh is due).
+    """
+    color: Optional[Color] = None       # Final color on the wire (brightness applied)
+    mode: Optional[ColorMode] = None
+    speed: Optional[int] = None
+    last_write: float = 0.0             # Monotonic time of the last successful write
+    
+    def invalidate(self):
+        """Forget everything, e.g. after (re)connect when device state is unknown."""
+        self.color = None
+        self.mode = None
+        self.speed = None
+        self.last_write = 0.0
+    
+    def is_color_dirty(self, color: Color) -> bool:
+        """Check if color differs from the last written one."""
+        return self.color != color
+    
+    def is_mode_dirty(self, mode: ColorMode, speed: int) -> bool:
+        """Check if mode/speed pair differs from the last written one."""
+        return self.mode != mode or self.speed != speed
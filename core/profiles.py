@@ -0,0 +1,261 @@
+"""
+Persistent per-device profiles keyed by MAC address.
+Remembers what a previous connect learned (protocol, working write
+characteristic, GATT layout, typical connect time) so known devices skip
+fingerprinting and service walking. A profile drops what it learned once
+writes through it keep failing; its connect history is kept for ranking.
+"""
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from core.services import LoggerService as logger
+
+
+@dataclass
+class DeviceProfile:
+    """What is known about one device from previous connects."""
+    address: str
+    protocol: Optional[str] = None  # DeviceFactory protocol key, e.g. "magichome"
+    write_char_uuid: Optional[str] = None
+    services: Dict[str, List[str]] = field(default_factory=dict)  # service UUID -> characteristic UUIDs
+    connect_time_ms: Optional[float] = None  # Average connect duration
+    connect_count: int = 0
+    connect_failures: int = 0
+    last_connected: Optional[str] = None  # ISO timestamp
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary for serialization."""
+        return {
+            "protocol": self.protocol,
+            "write_char_uuid": self.write_char_uuid,
+            "services": self.services,
+            "connect_time_ms": self.connect_time_ms,
+            "connect_count": self.connect_count,
+            "connect_failures": self.connect_failures,
+            "last_connected": self.last_connected
+        }
+
+    @classmethod
+    def from_dict(cls, address: str, data: Dict[str, Any]) -> "DeviceProfile":
+        """Create from dictionary."""
+        return cls(
+            address=address.upper(),
+            protocol=data.get("protocol"),
+            write_char_uuid=data.get("write_char_uuid"),
+            services={str(k): list(v) for k, v in (data.get("services") or {}).items()},
+            connect_time_ms=data.get("connect_time_ms"),
+            connect_count=int(data.get("connect_count", 0)),
+            connect_failures=int(data.get("connect_failures", 0)),
+            last_connected=data.get("last_connected")
+        )
+
+    def forget_learned(self) -> None:
+        """Drop protocol, characteristic and GATT layout; keep the connect history."""
+        self.protocol = None
+        self.write_char_uuid = None
+        self.services = {}
+        self.connect_time_ms = None
+
+
+class ProfileStore:
+    """
+    MAC -> DeviceProfile map backed by one JSON file.
+
+    The file is read once on load(); lookups are dict hits. Changes on
+    connect, connect failure and invalidation are saved at most once per
+    save_interval (flush() writes pending changes, e.g. on shutdown),
+    never per frame. Shared by all controllers of a DeviceManager.
+    """
+
+    PROFILE_FILE = "device_profiles.json"
+
+    def __init__(
+        self,
+        path: Optional[str] = PROFILE_FILE,
+        *,
+        max_write_failures: int = 5,
+        save_interval: float = 30.0
+    ):
+        """
+        Args:
+            path: JSON file to persist to (None = in memory only)
+            max_write_failures: Consecutive failed writes that invalidate a profile
+            save_interval: Minimum seconds between saves triggered by changes
+        """
+        self.path = path
+        self.max_write_failures = max(1, int(max_write_failures))
+        self.save_interval = max(0.0, float(save_interval))
+        self._lock = threading.Lock()
+        self._profiles: Dict[str, DeviceProfile] = {}
+        # Consecutive write failures per address (not persisted)
+        self._write_failures: Dict[str, int] = {}
+        # Connect failures of devices without a profile (not persisted)
+        self._unprofiled_failures: Dict[str, int] = {}
+        self._dirty = False
+        self._last_save: Optional[float] = None
+
+    def load(self) -> "ProfileStore":
+        """Read the profile file (missing or corrupt file = no profiles)."""
+        profiles: Dict[str, DeviceProfile] = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                for address, entry in data.items():
+                    profiles[address.upper()] = DeviceProfile.from_dict(address, entry)
+            except Exception as e:
+                logger.error(f"Failed to load device profiles: {e}")
+        with self._lock:
+            self._profiles = profiles
+        return self
+
+    def save(self) -> bool:
+        """Write all profiles (atomically replaces the file)."""
+        self._last_save = time.monotonic()
+        with self._lock:
+            self._dirty = False
+            data = {address: profile.to_dict() for address, profile in self._profiles.items()}
+        if not self.path:
+            return True
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to save device profiles: {e}")
+            return False
+
+    def _changed(self) -> None:
+        """Save now, or leave it to a later change or flush() if the last save was recent."""
+        self._dirty = True
+        if self._last_save is None or time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    def flush(self) -> bool:
+        """Save pending changes."""
+        if not self._dirty:
+            return True
+        return self.save()
+
+    def get(self, address: Optional[str]) -> Optional[DeviceProfile]:
+        """Profile for address, or None if the device is unknown."""
+        if not address:
+            return None
+        with self._lock:
+            return self._profiles.get(address.upper())
+
+    def record_connect(
+        self,
+        address: str,
+        *,
+        protocol: Optional[str],
+        write_char_uuid: Optional[str],
+        connect_time_ms: Optional[float],
+        services: Optional[Dict[str, List[str]]] = None
+    ) -> DeviceProfile:
+        """
+        Create or refresh the profile after a successful connect and save it.
+
+        Args:
+            address: Device MAC address
+            protocol: Protocol key of the driver in use
+            write_char_uuid: Characteristic the driver writes to
+            connect_time_ms: Duration of this connect
+            services: GATT summary (kept from before if None)
+        """
+        key = address.upper()
+        with self._lock:
+            profile = self._profiles.get(key)
+            if profile is None:
+                profile = DeviceProfile(address=key)
+                profile.connect_failures = self._unprofiled_failures.pop(key, 0)
+                self._profiles[key] = profile
+            elif profile.protocol is not None and profile.protocol != protocol:
+                profile.forget_learned()
+            profile.protocol = protocol
+            profile.write_char_uuid = write_char_uuid
+            if services is not None:
+                profile.services = services
+            if connect_time_ms is not None:
+                if profile.connect_time_ms is None:
+                    profile.connect_time_ms = round(connect_time_ms, 1)
+                else:
+                    profile.connect_time_ms = round(profile.connect_time_ms + 0.3 * (connect_time_ms - profile.connect_time_ms), 1)
+            profile.connect_count += 1
+            profile.last_connected = datetime.now().isoformat(timespec="seconds")
+            self._write_failures.pop(key, None)
+        self._changed()
+        return profile
+
+    def record_connect_failure(self, address: str) -> None:
+        """
+        Count a failed connect attempt (feeds candidate ranking).
+
+        Devices that never connected get no profile: their failures are
+        kept in memory only, so a busy scan does not fill the file.
+        """
+        key = address.upper()
+        with self._lock:
+            profile = self._profiles.get(key)
+            if profile is None:
+                self._unprofiled_failures[key] = self._unprofiled_failures.get(key, 0) + 1
+                return
+            profile.connect_failures += 1
+        self._changed()
+
+    def success_rate(self, address: str) -> float:
+        """Connect success rate, smoothed towards 0.5 for devices with little history."""
+        profile = self.get(address)
+        if profile is None:
+            with self._lock:
+                failures = self._unprofiled_failures.get(address.upper(), 0)
+            return 1 / (failures + 2)
+        return (profile.connect_count + 1) / (profile.connect_count + profile.connect_failures + 2)
+
+    def record_write(self, address: Optional[str], success: bool) -> bool:
+        """
+        Track write outcomes for a profiled device.
+
+        Returns:
+            True if this failure invalidated the profile.
+        """
+        if not address:
+            return False
+        key = address.upper()
+        with self._lock:
+            profile = self._profiles.get(key)
+            if profile is None or profile.protocol is None:
+                return False
+            if success:
+                self._write_failures.pop(key, None)
+                return False
+            failures = self._write_failures.get(key, 0) + 1
+            self._write_failures[key] = failures
+            if failures < self.max_write_failures:
+                return False
+        logger.warning(f"Device profile for {key} invalidated after {failures} failed writes")
+        self.invalidate(key)
+        return True
+
+    def invalidate(self, address: str) -> None:
+        """Forget what a profile learned (next connect fingerprints the device again)."""
+        key = address.upper()
+        with self._lock:
+            profile = self._profiles.get(key)
+            if profile is not None:
+                profile.forget_learned()
+            self._write_failures.pop(key, None)
+        if profile is not None:
+            self._changed()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._profiles)
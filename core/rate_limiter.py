@@ -0,0 +1,104 @@
+"""
+Adaptive frame-rate limiter for BLE writes.
+Learns a sustainable frames/sec per device from write completion times
+and failures: slow start until the first failure, then AIMD (additive
+increase, multiplicative decrease).
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+
+class RateGovernor:
+    """
+    Paces frame writes to a learned, sustainable rate.
+
+    - Slow start: until the first failure, the rate doubles every
+      slow_start_period seconds of clean traffic.
+    - After that, every successful write adds increase_step / rate to
+      the rate, i.e. roughly +increase_step frames/sec per second.
+    - Every failed write multiplies the rate by decrease_factor.
+    - The rate never exceeds max_rate nor what the measured write
+      latency allows (1 / average latency).
+    """
+
+    def __init__(
+        self,
+        max_rate: float = 20.0,
+        *,
+        min_rate: float = 2.0,
+        initial_rate: Optional[float] = None,
+        increase_step: float = 1.0,
+        decrease_factor: float = 0.5,
+        latency_alpha: float = 0.2,
+        slow_start_period: float = 1.0
+    ):
+        self.min_rate: float = max(0.1, float(min_rate))
+        self.max_rate: float = max(self.min_rate, float(max_rate))
+        start = self.max_rate / 2 if initial_rate is None else float(initial_rate)
+        self.rate: float = max(self.min_rate, min(self.max_rate, start))
+        self.increase_step: float = float(increase_step)
+        self.decrease_factor: float = max(0.05, min(0.95, float(decrease_factor)))
+        self.latency_alpha: float = max(0.01, min(1.0, float(latency_alpha)))
+        self.slow_start_period: float = max(0.01, float(slow_start_period))
+        self.slow_start: bool = True  # ends at the first failure
+
+        self.avg_latency: Optional[float] = None  # EMA of write duration, seconds
+        self.successes: int = 0
+        self.failures: int = 0
+        self._next_slot: float = 0.0  # monotonic time of the next allowed write
+
+    @property
+    def interval(self) -> float:
+        """Minimum spacing between frames at the current rate (seconds)."""
+        return 1.0 / self.rate
+
+    def set_max_rate(self, max_rate: float) -> None:
+        """Change the ceiling (e.g. when the driver changes), keeping learned state."""
+        self.max_rate = max(self.min_rate, float(max_rate))
+        self.rate = min(self.rate, self.max_rate)
+
+    def delay(self) -> float:
+        """Seconds until the next write slot (0 if a write may go out now)."""
+        return max(0.0, self._next_slot - time.monotonic())
+
+    async def acquire(self) -> None:
+        """
+        Reserve the next write slot, then wait for it.
+
+        The slot is taken before sleeping, so concurrent callers (e.g. a
+        mode command and an effect frame) queue up one interval apart.
+        """
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def record_success(self, latency: float) -> None:
+        """Account a completed write that took latency seconds."""
+        self.successes += 1
+        latency = max(0.0, float(latency))
+        if self.avg_latency is None:
+            self.avg_latency = latency
+        else:
+            self.avg_latency += self.latency_alpha * (latency - self.avg_latency)
+
+        ceiling = self.max_rate
+        if self.avg_latency > 0:
+            ceiling = min(ceiling, 1.0 / self.avg_latency)
+        if self.slow_start:
+            # One write spans 1/rate seconds: x2 per slow_start_period of traffic
+            rate = self.rate * 2.0 ** (1.0 / (self.rate * self.slow_start_period))
+        else:
+            rate = self.rate + self.increase_step / self.rate
+        self.rate = max(self.min_rate, min(ceiling, rate))
+
+    def record_failure(self) -> None:
+        """Account a failed or dropped write: back off multiplicatively."""
+        self.failures += 1
+        self.slow_start = False
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        # Give the link a full (new) interval to recover
+        self._next_slot = max(self._next_slot, time.monotonic() + self.interval)
@@ -0,0 +1,375 @@
+"""
+Background system-metric sampling.
+One sampler thread reads every subscribed metric source per tick and
+publishes readings into ring buffers, so the BLE event loop only ever
+reads the latest value and never blocks on psutil.
+"""
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple, Type
+
+import psutil
+
+from core.models import ColorMode
+from core.services import LoggerService as logger
+
+
+class RingBuffer:
+    """Fixed-capacity buffer of (monotonic timestamp, value) samples."""
+
+    def __init__(self, capacity: int = 120):
+        self.capacity = max(1, int(capacity))
+        # deque append/index are atomic under the GIL: one writer, many readers
+        self._samples: Deque[Tuple[float, float]] = deque(maxlen=self.capacity)
+
+    def append(self, value: float, timestamp: Optional[float] = None) -> None:
+        """Publish a new sample (oldest one falls out when full)."""
+        self._samples.append((time.monotonic() if timestamp is None else timestamp, value))
+
+    def latest(self) -> Optional[Tuple[float, float]]:
+        """Most recent (timestamp, value) or None if empty."""
+        try:
+            return self._samples[-1]
+        except IndexError:
+            return None
+
+    def values(self) -> List[float]:
+        """All buffered values, oldest first."""
+        return [value for _, value in list(self._samples)]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class MetricSnapshot:
+    """
+    Per-tick memo of psutil calls.
+
+    Sources sharing a syscall (e.g. two disks from disk_io_counters) get
+    the same result within one tick instead of calling psutil twice.
+    """
+
+    def __init__(self):
+        self._results: Dict[str, Any] = {}
+        self.calls = 0
+
+    def get(self, key: str, fetch: Callable[[], Any]) -> Any:
+        """Return the cached result for key, calling fetch on first use."""
+        if key not in self._results:
+            self.calls += 1
+            self._results[key] = fetch()
+        return self._results[key]
+
+
+class MetricSource(ABC):
+    """
+    Base class for a sampled system metric.
+
+    Subclasses set name/unit and implement read(); the optional device
+    selects one disk, NIC or sensor chip (None = aggregate). Sources whose
+    first read is measured against nothing (deltas) set needs_priming, and
+    the sampler drops that read.
+    """
+
+    name: str = ""
+    unit: str = ""
+    needs_priming: bool = False
+
+    def __init__(self, device: Optional[str] = None):
+        self.device = device
+
+    @abstractmethod
+    def read(self, snapshot: MetricSnapshot) -> Optional[float]:
+        """Current value, or None if unavailable (yet)."""
+        pass
+
+
+class CpuSource(MetricSource):
+    """Overall CPU usage since the previous read."""
+
+    name = "cpu"
+    unit = "%"
+    needs_priming = True
+
+    def read(self, snapshot: MetricSnapshot) -> Optional[float]:
+        return snapshot.get("cpu_percent", lambda: psutil.cpu_percent(interval=None))
+
+
+class MemorySource(MetricSource):
+    """Memory pressure (used share of physical memory)."""
+
+    name = "memory"
+    unit = "%"
+
+    def read(self, snapshot: MetricSnapshot) -> Optional[float]:
+        return snapshot.get("virtual_memory", psutil.virtual_memory).percent
+
+
+class _RateSource(MetricSource):
+    """Throughput derived from monotonically increasing byte counters."""
+
+    unit = "MB/s"
+    needs_priming = True
+
+    def __init__(self, device: Optional[str] = None):
+        super().__init__(device)
+        self._last: Optional[Tuple[float, float]] = None  # (monotonic time, total bytes)
+
+    @abstractmethod
+    def _total_bytes(self, snapshot: MetricSnapshot) -> Optional[float]:
+        """Current counter total in bytes, or None if unavailable."""
+        pass
+
+    def read(self, snapshot: MetricSnapshot) -> Optional[float]:
+        total = self._total_bytes(snapshot)
+        if total is None:
+            return None
+        now = time.monotonic()
+        last, self._last = self._last, (now, total)
+        if last is None or now <= last[0]:
+            return None
+        # Counters can wrap or reset (e.g. NIC re-created)
+        return max(0.0, total - last[1]) / (now - last[0]) / 1_000_000
+
+
+class DiskIoSource(_RateSource):
+    """Read + write rate of one disk (or all disks)."""
+
+    name = "disk_io"
+
+    def _total_bytes(self, snapshot: MetricSnapshot) -> Optional[float]:
+        counters = snapshot.get("disk_io_counters", lambda: psutil.disk_io_counters(perdisk=True))
+        if not counters or (self.device and self.device not in counters):
+            return None
+        disks = [counters[self.device]] if self.device else counters.values()
+        return float(sum(d.read_bytes + d.write_bytes for d in disks))
+
+
+class NetworkSource(_RateSource):
+    """Sent + received rate of one NIC (or all NICs)."""
+
+    name = "net"
+
+    def _total_bytes(self, snapshot: MetricSnapshot) -> Optional[float]:
+        counters = snapshot.get("net_io_counters", lambda: psutil.net_io_counters(pernic=True))
+        if not counters or (self.device and self.device not in counters):
+            return None
+        nics = [counters[self.device]] if self.device else counters.values()
+        return float(sum(n.bytes_sent + n.bytes_recv for n in nics))
+
+
+class TemperatureSource(MetricSource):
+    """Hottest current reading of one sensor chip (or all chips)."""
+
+    name = "temperature"
+    unit = "°C"
+
+    def read(self, snapshot: MetricSnapshot) -> Optional[float]:
+        # Not available on every platform (e.g. Windows)
+        fetch = getattr(psutil, "sensors_temperatures", None)
+        if fetch is None:
+            return None
+        sensors = snapshot.get("sensors_temperatures", fetch) or {}
+        chips = [sensors.get(self.device, [])] if self.device else sensors.values()
+        readings = [entry.current for chip in chips for entry in chip if entry.current is not None]
+        return max(readings) if readings else None
+
+
+class LoadSource(MetricSource):
+    """1-minute load average as a share of the logical CPU count."""
+
+    name = "load"
+    unit = "%"
+
+    def read(self, snapshot: MetricSnapshot) -> Optional[float]:
+        load = snapshot.get("getloadavg", psutil.getloadavg)[0]
+        cpus = snapshot.get("cpu_count", psutil.cpu_count) or 1
+        return load / cpus * 100.0
+
+
+# Registry: source name -> class
+METRIC_SOURCES: Dict[str, Type[MetricSource]] = {}
+
+
+def register_metric_source(source_class: Type[MetricSource]) -> Type[MetricSource]:
+    """Register a metric source class under its name (usable as a decorator)."""
+    METRIC_SOURCES[source_class.name] = source_class
+    return source_class
+
+
+for _source_class in (CpuSource, MemorySource, DiskIoSource, NetworkSource, TemperatureSource, LoadSource):
+    register_metric_source(_source_class)
+
+
+def create_metric_source(spec: str) -> MetricSource:
+    """
+    Create a source from a spec: "name" or "name:device".
+
+    Examples: "cpu", "disk_io:sda", "net:eth0", "temperature:coretemp".
+    """
+    name, _, device = spec.partition(":")
+    source_class = METRIC_SOURCES.get(name)
+    if source_class is None:
+        raise ValueError(f"Unknown metric source: {name}")
+    return source_class(device or None)
+
+
+# Default metric source behind each metric-driven mode
+METRIC_MODE_SOURCES: Dict[ColorMode, str] = {
+    ColorMode.CPU: "cpu",
+    ColorMode.MEMORY: "memory",
+    ColorMode.DISK: "disk_io",
+    ColorMode.NETWORK: "net",
+    ColorMode.TEMPERATURE: "temperature",
+    ColorMode.LOAD: "load",
+}
+
+
+class MetricSampler:
+    """
+    Shared, reference-counted sampler for any number of metric sources.
+
+    Each subscribed source is read once per tick regardless of how many
+    modes or devices subscribed it, and psutil calls are shared between
+    sources within a tick. The thread runs while there are subscribers;
+    the last unsubscribe only signals it, so callers on the BLE loop never
+    wait for a psutil read to finish.
+    """
+
+    def __init__(self, interval: float = 0.5, capacity: int = 120):
+        self.interval: float = max(0.05, float(interval))
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._sources: Dict[str, MetricSource] = {}
+        self._buffers: Dict[str, RingBuffer] = {}
+        self._refs: Dict[str, int] = {}
+        self._primed: Set[str] = set()
+        # Each thread gets its own stop event: a stopping thread may still be
+        # finishing its tick while a new one starts
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self.ticks = 0
+
+    @property
+    def is_running(self) -> bool:
+        """Check if the sampling thread is alive."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def subscribe(self, spec: str, source: Optional[MetricSource] = None) -> RingBuffer:
+        """
+        Start sampling spec (or add a reference to it).
+
+        Args:
+            spec: Source spec, see create_metric_source()
+            source: Explicit source instance (default: created from spec)
+
+        Returns:
+            Ring buffer the readings are published into.
+        """
+        with self._lock:
+            if spec not in self._sources:
+                self._sources[spec] = source or create_metric_source(spec)
+                self._buffers[spec] = RingBuffer(self.capacity)
+                self._refs[spec] = 0
+            self._refs[spec] += 1
+            buffer = self._buffers[spec]
+        self.start()
+        return buffer
+
+    def unsubscribe(self, spec: str) -> None:
+        """Drop a reference; the source stops being sampled at zero."""
+        with self._lock:
+            if spec not in self._refs:
+                return
+            self._refs[spec] -= 1
+            if self._refs[spec] <= 0:
+                del self._refs[spec]
+                del self._sources[spec]
+                del self._buffers[spec]
+                self._primed.discard(spec)
+        self._stop_if_idle()
+
+    def buffer(self, spec: str) -> Optional[RingBuffer]:
+        """Ring buffer for a subscribed spec."""
+        with self._lock:
+            return self._buffers.get(spec)
+
+    def latest(self, spec: str) -> Optional[float]:
+        """Most recent value of spec, or None before the first sample."""
+        buffer = self.buffer(spec)
+        sample = buffer.latest() if buffer else None
+        return sample[1] if sample else None
+
+    def sample_once(self) -> MetricSnapshot:
+        """Read every subscribed source once (sampler thread body, one tick)."""
+        snapshot = MetricSnapshot()
+        with self._lock:
+            sources = list(self._sources.items())
+        for spec, source in sources:
+            try:
+                value = source.read(snapshot)
+            except Exception as e:
+                logger.debug(f"Metric sample {spec} failed: {e}")
+                continue
+            with self._lock:
+                if self._sources.get(spec) is not source:
+                    continue  # Unsubscribed while reading
+                if source.needs_priming and spec not in self._primed:
+                    # First read only primes delta-based sources (cpu %, rates)
+                    self._primed.add(spec)
+                    continue
+                buffer = self._buffers[spec]
+            if value is not None:
+                buffer.append(float(value))
+        self.ticks += 1
+        return snapshot
+
+    def start(self) -> None:
+        """Start sampling in a daemon thread (no-op if already running)."""
+        with self._thread_lock:
+            if self.is_running:
+                return
+            self._stop_event = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run,
+                args=(self._stop_event,),
+                daemon=True,
+                name="Metric-Sampler"
+            )
+            self._thread.start()
+
+    def stop(self, wait: bool = True) -> None:
+        """
+        Stop the sampling thread.
+
+        Args:
+            wait: Join the thread (up to 2 s); False only signals it to exit
+                after its current tick, for callers that must not block
+        """
+        with self._thread_lock:
+            self._stop_event.set()
+            thread, self._thread = self._thread, None
+        if wait and thread and thread is not threading.current_thread():
+            thread.join(timeout=2.0)
+
+    def _stop_if_idle(self) -> None:
+        """Signal the thread to exit unless a subscriber arrived meanwhile."""
+        # Decided under _thread_lock, which start() takes: a concurrent
+        # subscribe() either sees this stop and starts a new thread, or its
+        # reference is seen here and the thread keeps running
+        with self._thread_lock:
+            with self._lock:
+                if self._refs:
+                    return
+            self._stop_event.set()
+            self._thread = None
+
+    def _run(self, stop_event: threading.Event) -> None:
+        """Sampling thread body."""
+        self.sample_once()
+        while not stop_event.wait(self.interval):
+            self.sample_once()
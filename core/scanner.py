@@ -0,0 +1,279 @@
+"""
+Continuous BLE scanning with a live advertisement index.
+One long-running scanner feeds every advertisement from a supported LED
+controller into an in-memory index (MAC -> last advertisement), so
+(re)connects and the device list read it instantly instead of running
+a blocking discovery each time.
+"""
+
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Type
+
+from bleak import BleakScanner, BLEDevice
+from bleak.backends.scanner import AdvertisementData
+
+from core.services import LoggerService as logger
+from core.interfaces import AbstractLedDevice
+from core.drivers.device_factory import DeviceFactory
+from core.profiles import ProfileStore
+
+
+@dataclass
+class Advertisement:
+    """Last advertisement seen from one device."""
+    address: str
+    name: Optional[str]
+    rssi: int
+    service_uuids: Tuple[str, ...]
+    manufacturer_data: Dict[int, bytes] = field(default_factory=dict)
+    service_data: Dict[str, bytes] = field(default_factory=dict)
+    last_seen: float = 0.0  # Monotonic time
+    device: Optional[BLEDevice] = field(default=None, repr=False)
+    # Driver picked from the advertisement alone (None = unknown) and how sure
+    driver_class: Optional[Type[AbstractLedDevice]] = None
+    confidence: float = 0.0
+
+    @classmethod
+    def from_bleak(cls, device: BLEDevice, data: AdvertisementData) -> "Advertisement":
+        """Build from a bleak detection and classify it."""
+        name = data.local_name or device.name
+        service_uuids = tuple(u.lower() for u in data.service_uuids)
+        match = DeviceFactory.classify_advertisement(name, service_uuids, data.manufacturer_data, data.service_data)
+        return cls.from_classified(device, data, name, service_uuids, match)
+
+    @classmethod
+    def from_classified(
+        cls,
+        device: BLEDevice,
+        data: AdvertisementData,
+        name: Optional[str],
+        service_uuids: Tuple[str, ...],
+        match: Optional[Tuple[Type[AbstractLedDevice], float]]
+    ) -> "Advertisement":
+        """Build from a bleak detection already run through classify_advertisement()."""
+        return cls(
+            address=device.address.upper(),
+            name=name,
+            rssi=data.rssi,
+            service_uuids=service_uuids,
+            manufacturer_data=dict(data.manufacturer_data),
+            service_data=dict(data.service_data),
+            last_seen=time.monotonic(),
+            device=device,
+            driver_class=match[0] if match else None,
+            confidence=match[1] if match else 0.0
+        )
+
+    def age(self, now: Optional[float] = None) -> float:
+        """Seconds since the advertisement was seen."""
+        return (time.monotonic() if now is None else now) - self.last_seen
+
+
+class AdvertisementIndex:
+    """
+    Thread-safe MAC -> Advertisement map with TTL eviction.
+
+    Written from the scanner callback (event loop thread), read from the
+    controllers and the UI thread.
+    """
+
+    def __init__(self, ttl: float = 60.0):
+        self.ttl = max(1.0, float(ttl))
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Advertisement] = {}
+        self._last_eviction = time.monotonic()
+
+    def update(self, advertisement: Advertisement) -> None:
+        """Insert or replace the entry for advertisement.address."""
+        with self._lock:
+            self._entries[advertisement.address.upper()] = advertisement
+            if advertisement.last_seen - self._last_eviction >= self.ttl / 2:
+                self._evict_locked(advertisement.last_seen)
+
+    def get(self, address: str) -> Optional[Advertisement]:
+        """Fresh entry for address, or None if unknown or expired."""
+        with self._lock:
+            entry = self._entries.get(address.upper())
+            if entry is None:
+                return None
+            if entry.age() > self.ttl:
+                del self._entries[address.upper()]
+                return None
+            return entry
+
+    def entries(self) -> List[Advertisement]:
+        """All fresh entries, strongest signal first."""
+        with self._lock:
+            self._evict_locked(time.monotonic())
+            return sorted(self._entries.values(), key=lambda e: e.rssi, reverse=True)
+
+    def evict(self) -> int:
+        """Drop expired entries; returns how many were removed."""
+        with self._lock:
+            return self._evict_locked(time.monotonic())
+
+    def _evict_locked(self, now: float) -> int:
+        stale = [address for address, entry in self._entries.items() if now - entry.last_seen > self.ttl]
+        for address in stale:
+            del self._entries[address]
+        self._last_eviction = now
+        return len(stale)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class BleScanner:
+    """
+    Long-running scanner filling an AdvertisementIndex.
+
+    Only advertisements of supported LED controllers are indexed: those
+    carrying a service UUID a registered driver declares, whose name a
+    driver recognizes, or whose address is watched (configured devices).
+    Filtering happens in the callback because many strips advertise a
+    name but no service UUIDs.
+    """
+
+    def __init__(
+        self,
+        index: Optional[AdvertisementIndex] = None,
+        *,
+        ttl: float = 60.0,
+        service_uuids: Optional[Iterable[str]] = None,
+        scanning_mode: str = "active",
+        scanner_factory: Callable[..., BleakScanner] = BleakScanner
+    ):
+        self.index = index or AdvertisementIndex(ttl)
+        if service_uuids is None:
+            service_uuids = DeviceFactory.get_advertised_service_uuids()
+        self.service_uuids: Set[str] = {u.lower() for u in service_uuids}
+        self.scanning_mode = scanning_mode
+        self._scanner_factory = scanner_factory
+        self._scanner: Optional[BleakScanner] = None
+        self._watched: Set[str] = set()
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+
+    @property
+    def is_running(self) -> bool:
+        """Check if the scanner is active."""
+        return self._scanner is not None
+
+    def watch(self, address: str) -> None:
+        """Always index this address (e.g. a configured device)."""
+        if address:
+            self._watched.add(address.upper())
+
+    def unwatch(self, address: str) -> None:
+        """Stop force-indexing this address."""
+        self._watched.discard(address.upper())
+
+    async def start(self) -> bool:
+        """Start scanning on the running loop. Returns False if no adapter is usable."""
+        if self._scanner is not None:
+            return True
+        try:
+            scanner = self._scanner_factory(
+                detection_callback=self._on_detection,
+                scanning_mode=self.scanning_mode
+            )
+            await scanner.start()
+        except Exception as e:
+            logger.error(f"BLE scanner failed to start: {e}")
+            return False
+        self._scanner = scanner
+        logger.info("BLE scanner started")
+        return True
+
+    async def stop(self) -> None:
+        """Stop scanning and release pending waiters."""
+        scanner, self._scanner = self._scanner, None
+        if scanner is not None:
+            try:
+                await scanner.stop()
+            except Exception as e:
+                logger.debug(f"BLE scanner stop failed: {e}")
+        for waiters in self._waiters.values():
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+        self._waiters.clear()
+
+    async def wait_for(self, address: str, timeout: float = 5.0) -> Optional[Advertisement]:
+        """
+        Advertisement for address: instantly from the index, otherwise the
+        next one seen within timeout seconds (None if it never shows up).
+        """
+        key = address.upper()
+        entry = self.index.get(key)
+        if entry is not None:
+            return entry
+        self.watch(key)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, []).append(waiter)
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            waiters = self._waiters.get(key, [])
+            if waiter in waiters:
+                waiters.remove(waiter)
+            if not waiters:
+                self._waiters.pop(key, None)
+
+    def _on_detection(self, device: BLEDevice, data: AdvertisementData) -> None:
+        """
+        Scanner callback: index supported devices and wake waiters.
+
+        Runs for every advertisement in range, so a reject costs two set
+        lookups and one classification over bleak's own mappings; the
+        Advertisement (and its payload copies) is only built for hits.
+        """
+        address = device.address.upper()
+        name = data.local_name or device.name
+        service_uuids = tuple(u.lower() for u in data.service_uuids)
+        listed = address in self._watched or not self.service_uuids.isdisjoint(service_uuids)
+        match = DeviceFactory.classify_advertisement(name, service_uuids, data.manufacturer_data, data.service_data)
+        # Classified advertisements are supported; the rest only if watched/UUID-listed
+        if match is None and not listed:
+            return
+        advertisement = Advertisement.from_classified(device, data, name, service_uuids, match)
+        self.index.update(advertisement)
+        for waiter in self._waiters.pop(advertisement.address, []):
+            if not waiter.done():
+                waiter.set_result(advertisement)
+
+
+# Candidate score weights (sum to 1.0)
+RSSI_WEIGHT = 0.4
+CONFIDENCE_WEIGHT = 0.35
+HISTORY_WEIGHT = 0.25
+
+
+def candidate_score(advertisement: Advertisement, profile_store: Optional[ProfileStore] = None) -> float:
+    """
+    Score 0-1 for connecting to an advertised device.
+
+    Combines signal strength (-100 dBm = 0, -40 dBm and up = 1), protocol
+    fingerprint confidence and the device's past connect success rate.
+    """
+    signal = max(0.0, min(1.0, (advertisement.rssi + 100) / 60.0))
+    history = profile_store.success_rate(advertisement.address) if profile_store is not None else 0.5
+    return (
+        RSSI_WEIGHT * signal
+        + CONFIDENCE_WEIGHT * advertisement.confidence
+        + HISTORY_WEIGHT * history
+    )
+
+
+def rank_candidates(
+    advertisements: Iterable[Advertisement],
+    profile_store: Optional[ProfileStore] = None
+) -> List[Advertisement]:
+    """Supported (classified) advertisements, best connect candidate first."""
+    candidates = [a for a in advertisements if a.driver_class is not None and a.device is not None]
+    return sorted(candidates, key=lambda a: candidate_score(a, profile_store), reverse=True)
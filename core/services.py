@@ -5,10 +5,9 @@ Implements repository pattern and provides abstraction over storage and I/O.
 
 import json
 import os
-from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Dict, Any, List
 from datetime import datetime
-from core.models import DeviceConfig, AppPreferences, ColorPreset, Color
+from core.models import DeviceConfig, AppPreferences, ColorPreset
 
 
 class ConfigService:
@@ -32,9 +31,83 @@ class ConfigService:
             "theme": "dark",
             "auto_reconnect": True,
             "reconnect_interval": 5.0,
-            "default_speed": 16
+            "default_speed": 16,
+            "keepalive_interval": 10.0,
+            "metric_sample_interval": 0.5,
+            "use_real_device": True,
+            "capture_file": "",
+            "metrics_port": 0
         },
-        "custom_presets": []
+        # Additional devices: list of "device"-shaped entries with a unique "device_id".
+        # Empty = single-device setup using "device" above.
+        "devices": [],
+        # Synchronized groups: {"group_id": ["device_id", ...]}
+        "groups": {},
+        "custom_presets": [],
+        # Metric-to-color gradients, keyed by mode name; stops at 0.0-1.0 of [min, max]
+        "gradients": {
+            "CPU": {
+                "source": "cpu",
+                "min": 0.0,
+                "max": 100.0,
+                "stops": [
+                    {"at": 0.0, "color": "#00C8FF"},
+                    {"at": 0.55, "color": "#8A2BE2"},
+                    {"at": 1.0, "color": "#FF0000"}
+                ],
+                "smoothing": 0.3,
+                "hysteresis": 2.0,
+                "emit_threshold": 6
+            },
+            "MEMORY": {
+                "source": "memory",
+                "min": 0.0,
+                "max": 100.0,
+                "stops": [
+                    {"at": 0.0, "color": "#00FF7F"},
+                    {"at": 0.6, "color": "#FFD700"},
+                    {"at": 1.0, "color": "#FF0000"}
+                ]
+            },
+            "DISK": {
+                "source": "disk_io",  # "disk_io:<disk>" for a single disk
+                "min": 0.0,
+                "max": 200.0,  # MB/s
+                "stops": [
+                    {"at": 0.0, "color": "#0040FF"},
+                    {"at": 1.0, "color": "#FF8C00"}
+                ]
+            },
+            "NETWORK": {
+                "source": "net",  # "net:<nic>" for a single interface
+                "min": 0.0,
+                "max": 12.5,  # MB/s (100 Mbit/s)
+                "stops": [
+                    {"at": 0.0, "color": "#00C8FF"},
+                    {"at": 1.0, "color": "#FF00FF"}
+                ]
+            },
+            "TEMPERATURE": {
+                "source": "temperature",  # "temperature:<chip>" for a single sensor chip
+                "min": 30.0,
+                "max": 90.0,  # °C
+                "stops": [
+                    {"at": 0.0, "color": "#0080FF"},
+                    {"at": 0.5, "color": "#FFA500"},
+                    {"at": 1.0, "color": "#FF0000"}
+                ]
+            },
+            "LOAD": {
+                "source": "load",
+                "min": 0.0,
+                "max": 100.0,  # % of logical CPUs
+                "stops": [
+                    {"at": 0.0, "color": "#00FF00"},
+                    {"at": 0.7, "color": "#FFFF00"},
+                    {"at": 1.0, "color": "#FF0000"}
+                ]
+            }
+        }
     }
     
     @classmethod
@@ -70,6 +143,30 @@ class ConfigService:
         device_data = config.get("device", {})
         return DeviceConfig.from_dict(device_data)
     
+    @classmethod
+    def get_device_configs(cls) -> List[DeviceConfig]:
+        """Get all configured devices (falls back to the single "device" entry)."""
+        config = cls.load_config()
+        entries = config.get("devices") or [config.get("device", {})]
+        configs = []
+        seen = set()
+        for index, entry in enumerate(entries):
+            device_config = DeviceConfig.from_dict(entry)
+            if not device_config.device_id:
+                device_config.device_id = device_config.target_mac or f"device-{index}"
+            if device_config.device_id in seen:
+                LoggerService.warning(f"Duplicate device_id {device_config.device_id} skipped")
+                continue
+            seen.add(device_config.device_id)
+            configs.append(device_config)
+        return configs
+    
+    @classmethod
+    def get_groups(cls) -> Dict[str, List[str]]:
+        """Get device groups (group id -> member device ids)."""
+        config = cls.load_config()
+        return config.get("groups", {})
+    
     @classmethod
     def get_preferences(cls) -> AppPreferences:
         """Get application preferences."""
@@ -84,6 +181,12 @@ class ConfigService:
         config["preferences"] = preferences.to_dict()
         return cls.save_config(config)
     
+    @classmethod
+    def get_gradients(cls) -> Dict[str, Dict[str, Any]]:
+        """Get metric gradient definitions keyed by mode name."""
+        config = cls.load_config()
+        return config.get("gradients", {})
+    
     @classmethod
     def get_custom_presets(cls) -> list:
         """Get saved custom color presets."""
@@ -0,0 +1,456 @@
+"""
+Virtual BLE LED devices for hardware-free runs.
+An in-process stand-in for BleakScanner/BleakClient: configured devices
+advertise like real controllers, expose the write characteristic their
+driver looks for and decode every written packet into LED state. Write
+latency, packet loss and link drops are simulated, so the controller can
+be exercised and load-tested on machines without a Bluetooth radio.
+Selected with use_real_device=False.
+"""
+
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Type, Union
+
+from bleak import BLEDevice
+from bleak.backends.scanner import AdvertisementData
+from bleak.exc import BleakError
+
+from core.services import LoggerService as logger
+from core.models import DeviceConfig
+from core.interfaces import AbstractLedDevice
+from core.drivers.device_factory import DeviceFactory
+
+
+@dataclass
+class VirtualDeviceSpec:
+    """How one virtual device advertises and behaves on the link."""
+    address: str
+    name: str = "ELK-BLEDOM"
+    protocol: str = "elk_bledom"  # DeviceFactory protocol key
+    rssi: int = -55
+    write_char_uuid: Optional[str] = None  # None = the driver's preferred characteristic
+    manufacturer_data: Dict[int, bytes] = field(default_factory=dict)
+    service_data: Dict[str, bytes] = field(default_factory=dict)
+    connect_delay: float = 0.05  # Seconds per connect
+    connect_failure_rate: float = 0.0  # Chance a connect attempt fails
+    write_latency: float = 0.002  # Seconds per write
+    write_jitter: float = 0.0  # Extra uniform random latency, seconds
+    loss_rate: float = 0.0  # Chance a write is dropped on the air
+    disconnect_rate: float = 0.0  # Chance per write that the link drops
+
+    @classmethod
+    def from_config(cls, config: DeviceConfig, **overrides: Any) -> "VirtualDeviceSpec":
+        """Virtual twin of a configured device (protocol defaults to ELK-BLEDOM)."""
+        values: Dict[str, Any] = {
+            "address": (config.target_mac or config.device_id or "00:00:00:00:00:00").upper(),
+            "protocol": config.protocol or "elk_bledom"
+        }
+        if config.device_name and config.device_name != "Unknown LED Device":
+            values["name"] = config.device_name
+        values.update(overrides)
+        return cls(**values)
+
+
+class VirtualCharacteristic:
+    """GATT characteristic of a virtual device (the attributes drivers read)."""
+
+    def __init__(self, uuid: str, handle: int, service_uuid: str):
+        self.uuid = uuid.lower()
+        self.handle = handle
+        self.service_uuid = service_uuid
+        self.properties = ["write-without-response", "write"]
+        self.descriptors: List[Any] = []
+
+    def __repr__(self) -> str:
+        return f"VirtualCharacteristic({self.uuid}, handle={self.handle})"
+
+
+class VirtualService:
+    """GATT service of a virtual device."""
+
+    def __init__(self, uuid: str, characteristics: List[VirtualCharacteristic]):
+        self.uuid = uuid.lower()
+        self.characteristics = characteristics
+
+    def get_characteristic(self, uuid: str) -> Optional[VirtualCharacteristic]:
+        for char in self.characteristics:
+            if char.uuid == str(uuid).lower():
+                return char
+        return None
+
+
+class VirtualServiceCollection:
+    """client.services of a virtual device: iterable, with characteristic lookup."""
+
+    def __init__(self, services: List[VirtualService]):
+        self.services = {service.uuid: service for service in services}
+        self.characteristics = {char.handle: char for service in services for char in service.characteristics}
+
+    def __iter__(self) -> Iterator[VirtualService]:
+        return iter(self.services.values())
+
+    def get_characteristic(self, specifier: Union[int, str]) -> Optional[VirtualCharacteristic]:
+        """Characteristic by handle or UUID (None if absent)."""
+        if isinstance(specifier, int):
+            return self.characteristics.get(specifier)
+        for service in self.services.values():
+            char = service.get_characteristic(specifier)
+            if char is not None:
+                return char
+        return None
+
+
+class VirtualLedDevice:
+    """
+    One simulated LED controller: advertisement, GATT table and the LED
+    state decoded from the packets it received.
+    """
+
+    def __init__(self, spec: VirtualDeviceSpec):
+        self.spec = spec
+        self.driver_class: Type[AbstractLedDevice] = type(DeviceFactory.create_driver(spec.protocol))
+        self.ble_device = BLEDevice(spec.address, spec.name, None)
+        self.services = self._build_services()
+
+        # Decoded LED state
+        self.color: Tuple[int, int, int] = (0, 0, 0)
+        self.brightness: Optional[int] = None  # Byte value, None until a brightness packet arrives
+        self.mode_id: Optional[int] = None
+        self.speed: Optional[int] = None
+
+        # Link and traffic counters
+        self.client: Optional["VirtualBleakClient"] = None
+        self.packets_received = 0
+        self.packets_unknown = 0
+        self.packets_lost = 0
+        self.connects = 0
+        self.disconnects = 0
+        self.last_packet: Optional[bytes] = None
+        self.last_packet_at: Optional[float] = None  # perf_counter time
+        # Called with (device, packet, decoded) for every packet that arrives
+        self.on_packet: Optional[Callable[["VirtualLedDevice", bytes, Optional[Dict[str, Any]]], None]] = None
+
+    def _build_services(self) -> VirtualServiceCollection:
+        """One vendor service holding the write characteristic the driver prefers."""
+        candidates = [u.lower() for u in self.driver_class.WRITE_CHAR_CANDIDATES]
+        if not candidates:
+            candidates = [self.driver_class().get_write_characteristic_uuid().lower()]
+        char_uuid = (self.spec.write_char_uuid or candidates[0]).lower()
+        advertised = [u.lower() for u in self.driver_class.ADVERTISED_SERVICE_UUIDS]
+        service_uuid = next((u for u in advertised if u not in candidates), advertised[0] if advertised else char_uuid)
+        return VirtualServiceCollection([
+            VirtualService(service_uuid, [VirtualCharacteristic(char_uuid, 0x0010, service_uuid)])
+        ])
+
+    @property
+    def address(self) -> str:
+        return self.spec.address
+
+    @property
+    def is_connected(self) -> bool:
+        return self.client is not None
+
+    def advertisement_data(self) -> AdvertisementData:
+        """What a scan currently sees from this device."""
+        return AdvertisementData(
+            local_name=self.spec.name,
+            manufacturer_data=dict(self.spec.manufacturer_data),
+            service_data=dict(self.spec.service_data),
+            service_uuids=[u.lower() for u in self.driver_class.ADVERTISED_SERVICE_UUIDS],
+            tx_power=None,
+            rssi=self.spec.rssi,
+            platform_data=()
+        )
+
+    def receive(self, packet: bytes) -> Optional[Dict[str, Any]]:
+        """Apply one packet that made it over the air; returns the decoded command."""
+        self.packets_received += 1
+        self.last_packet = packet
+        self.last_packet_at = time.perf_counter()
+        decoded = self.driver_class.decode_packet(packet)
+        if decoded is None:
+            self.packets_unknown += 1
+        else:
+            command = decoded["command"]
+            if command == "color":
+                self.color = (decoded["r"], decoded["g"], decoded["b"])
+            elif command == "mode":
+                self.mode_id = decoded["mode_id"]
+                self.speed = decoded["speed"]
+            elif command == "brightness":
+                self.brightness = decoded["value"]
+        if self.on_packet is not None:
+            self.on_packet(self, packet, decoded)
+        return decoded
+
+    def drop_link(self) -> None:
+        """Simulate the device going away mid-connection."""
+        client = self.client
+        if client is not None:
+            client._on_link_lost()
+
+    def state(self) -> Dict[str, Any]:
+        """Snapshot of the decoded LED state and counters."""
+        return {
+            "address": self.address,
+            "protocol": self.spec.protocol,
+            "connected": self.is_connected,
+            "color": self.color,
+            "brightness": self.brightness,
+            "mode_id": self.mode_id,
+            "speed": self.speed,
+            "packets_received": self.packets_received,
+            "packets_unknown": self.packets_unknown,
+            "packets_lost": self.packets_lost,
+            "connects": self.connects,
+            "disconnects": self.disconnects
+        }
+
+
+class VirtualBleakClient:
+    """BleakClient stand-in connected to a VirtualLedDevice."""
+
+    def __init__(
+        self,
+        backend: "VirtualBleBackend",
+        address_or_device: Union[BLEDevice, str],
+        disconnected_callback: Optional[Callable[["VirtualBleakClient"], None]] = None,
+        *,
+        timeout: float = 10.0,
+        **kwargs: Any
+    ):
+        self._backend = backend
+        self.address = getattr(address_or_device, "address", address_or_device).upper()
+        self._disconnected_callback = disconnected_callback
+        self._timeout = timeout
+        self._device: Optional[VirtualLedDevice] = None
+
+    @property
+    def is_connected(self) -> bool:
+        return self._device is not None
+
+    @property
+    def services(self) -> VirtualServiceCollection:
+        if self._device is None:
+            raise BleakError("Service discovery has not been performed")
+        return self._device.services
+
+    async def connect(self, **kwargs: Any) -> bool:
+        device = self._backend.get(self.address)
+        if device is None:
+            await asyncio.sleep(min(self._timeout, self._backend.advertise_interval))
+            raise BleakError(f"Device with address {self.address} was not found")
+        if device.spec.connect_delay > self._timeout:
+            await asyncio.sleep(self._timeout)
+            raise TimeoutError(f"Connect to {self.address} timed out")
+        await asyncio.sleep(device.spec.connect_delay)
+        if self._backend.roll(device.spec.connect_failure_rate):
+            raise BleakError(f"Simulated connect failure for {self.address}")
+        if device.client is not None and device.client is not self:
+            raise BleakError(f"Device {self.address} is already connected")
+        device.client = self
+        device.connects += 1
+        self._device = device
+        return True
+
+    async def disconnect(self) -> bool:
+        device, self._device = self._device, None
+        if device is not None and device.client is self:
+            device.client = None
+            self._notify_disconnected()
+        return True
+
+    async def __aenter__(self) -> "VirtualBleakClient":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.disconnect()
+
+    async def write_gatt_char(
+        self,
+        char_specifier: Union[VirtualCharacteristic, int, str],
+        data: Union[bytes, bytearray],
+        response: Optional[bool] = None
+    ) -> None:
+        """Deliver a packet after the simulated latency (unless it is lost)."""
+        device = self._device
+        if device is None:
+            raise BleakError("Not connected")
+        if not isinstance(char_specifier, (int, str)):
+            char_specifier = char_specifier.uuid
+        if device.services.get_characteristic(char_specifier) is None:
+            raise BleakError(f"Characteristic {char_specifier} was not found")
+        # Copy now: drivers reuse their packet buffers
+        packet = bytes(data)
+        spec = device.spec
+        delay = spec.write_latency
+        if spec.write_jitter > 0:
+            delay += self._backend.rng.uniform(0.0, spec.write_jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self._device is not device:
+            raise BleakError("Disconnected during write")
+        if self._backend.roll(spec.disconnect_rate):
+            self._on_link_lost()
+            raise BleakError("Simulated link loss")
+        if self._backend.roll(spec.loss_rate):
+            device.packets_lost += 1
+            if response:
+                raise BleakError("Simulated write timeout")
+            # Write without response: the sender never learns about the loss
+            return
+        device.receive(packet)
+
+    async def get_rssi(self) -> int:
+        if self._device is None:
+            raise BleakError("Not connected")
+        return self._device.spec.rssi
+
+    def _on_link_lost(self) -> None:
+        device, self._device = self._device, None
+        if device is None:
+            return
+        if device.client is self:
+            device.client = None
+        device.disconnects += 1
+        logger.debug(f"Virtual device {device.address} dropped the link")
+        self._notify_disconnected()
+
+    def _notify_disconnected(self) -> None:
+        if self._disconnected_callback is not None:
+            try:
+                self._disconnected_callback(self)
+            except Exception as e:
+                logger.debug(f"Disconnect callback failed: {e}")
+
+
+class VirtualBleakScanner:
+    """BleakScanner stand-in: reports every virtual device once per advertise interval."""
+
+    def __init__(
+        self,
+        backend: "VirtualBleBackend",
+        detection_callback: Optional[Callable[[BLEDevice, AdvertisementData], None]] = None,
+        **kwargs: Any
+    ):
+        self._backend = backend
+        self._detection_callback = detection_callback
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._advertise())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _advertise(self) -> None:
+        while True:
+            if self._detection_callback is not None:
+                for device, data in self._backend.advertisements():
+                    self._detection_callback(device, data)
+            await asyncio.sleep(self._backend.advertise_interval)
+
+
+class VirtualBleBackend:
+    """
+    A set of virtual devices plus the bleak-shaped entry points the app
+    uses: create_client (BleakClient), create_scanner (BleakScanner for
+    BleScanner's scanner_factory), find_device_by_address and discover.
+
+    Devices that are not connected keep advertising; a connected device
+    stops advertising like most single-link controllers do.
+    """
+
+    def __init__(
+        self,
+        specs: Iterable[VirtualDeviceSpec] = (),
+        *,
+        advertise_interval: float = 0.1,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            specs: Devices to create
+            advertise_interval: Seconds between advertisements (also the simulated scan time)
+            seed: Seed for loss/latency/disconnect randomness (None = nondeterministic)
+        """
+        self.advertise_interval = max(0.001, float(advertise_interval))
+        self.rng = random.Random(seed)
+        self.devices: Dict[str, VirtualLedDevice] = {}
+        for spec in specs:
+            self.add_device(spec)
+
+    @classmethod
+    def from_configs(cls, configs: Iterable[DeviceConfig], **spec_overrides: Any) -> "VirtualBleBackend":
+        """Backend with one virtual twin per configured device."""
+        return cls(VirtualDeviceSpec.from_config(config, **spec_overrides) for config in configs)
+
+    def add_device(self, spec: VirtualDeviceSpec) -> VirtualLedDevice:
+        """Power a virtual device on (replaces one with the same address)."""
+        self.remove_device(spec.address)
+        device = VirtualLedDevice(spec)
+        self.devices[device.address.upper()] = device
+        return device
+
+    def remove_device(self, address: str) -> None:
+        """Take a device out of range (drops its link)."""
+        device = self.devices.pop(address.upper(), None)
+        if device is not None:
+            device.drop_link()
+
+    def get(self, address: str) -> Optional[VirtualLedDevice]:
+        """Device in range with this address."""
+        return self.devices.get(address.upper())
+
+    def roll(self, probability: float) -> bool:
+        """Random event with the given probability."""
+        return probability > 0 and self.rng.random() < probability
+
+    def advertisements(self) -> List[Tuple[BLEDevice, AdvertisementData]]:
+        """What a scan currently sees."""
+        return [
+            (device.ble_device, device.advertisement_data())
+            for device in list(self.devices.values())
+            if not device.is_connected
+        ]
+
+    def create_client(
+        self,
+        address_or_device: Union[BLEDevice, str],
+        disconnected_callback: Optional[Callable[[VirtualBleakClient], None]] = None,
+        **kwargs: Any
+    ) -> VirtualBleakClient:
+        """Client for a virtual device (BleakClient signature)."""
+        return VirtualBleakClient(self, address_or_device, disconnected_callback, **kwargs)
+
+    def create_scanner(self, detection_callback=None, **kwargs: Any) -> VirtualBleakScanner:
+        """Scanner over the virtual devices (BleakScanner signature)."""
+        return VirtualBleakScanner(self, detection_callback, **kwargs)
+
+    async def find_device_by_address(self, address: str, timeout: float = 10.0, **kwargs: Any) -> Optional[BLEDevice]:
+        """BleakScanner.find_device_by_address over the virtual devices."""
+        device = self.get(address)
+        if device is None or device.is_connected:
+            await asyncio.sleep(timeout)
+            return None
+        await asyncio.sleep(min(timeout, self.advertise_interval))
+        return device.ble_device
+
+    async def discover(self, timeout: float = 5.0, return_adv: bool = False, **kwargs: Any):
+        """BleakScanner.discover over the virtual devices."""
+        await asyncio.sleep(min(timeout, self.advertise_interval))
+        seen = self.advertisements()
+        if return_adv:
+            return {device.address: (device, data) for device, data in seen}
+        return [device for device, _ in seen]
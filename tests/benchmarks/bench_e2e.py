@@ -0,0 +1,267 @@
+"""
+End-to-end throughput and latency benchmark.
+
+Drives BleApplicationBridge against a virtual device (use_real_device off,
+see core/virtual.py) with a stream of unique colors and measures, per
+scenario:
+    fps               colors that reached the device per second
+    p50_ms / p99_ms   set_color() to packet arrival at the device
+    superseded        colors coalesced away by the controller (newer color won)
+    lost              packets dropped on the simulated air
+    cpu_us_per_frame  process CPU time per delivered frame (reported, not gated)
+    reconnects        link drops the controller recovered from
+
+Scenarios inject write latency, packet loss and link drops. They start
+with the rate governor at its ceiling, so they measure the write path
+rather than the governor's ramp-up; the ramp is its own scenario:
+    ramp              ramp_s: seconds from connect until the governor
+                      reaches the driver's frame-rate ceiling
+
+Every scenario runs --runs times and the median of each metric is
+reported and gated. Not collected by pytest; run it directly:
+
+    python tests/benchmarks/bench_e2e.py [--duration 3] [--update-baseline]
+
+Exits 1 if a gated metric regressed beyond --threshold against the stored
+baseline (tests/benchmarks/baselines/bench_e2e.json), and 2 if the
+baseline was taken with different options.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+import common  # noqa: F401  (puts the repo root on sys.path)
+from common import add_common_arguments, build_report, finish, median_results, percentile
+
+from core.controller import BleApplicationBridge
+from core.models import Color
+from core.services import ConfigService, LoggerService
+
+DEVICE_MAC = "BE:EF:00:00:00:01"
+
+# Virtual device behavior per scenario (VirtualDeviceSpec fields)
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "clean": {"write_latency": 0.002},
+    "latency_20ms": {"write_latency": 0.020, "write_jitter": 0.010},
+    "loss_5pct": {"write_latency": 0.002, "loss_rate": 0.05},
+    "flaky_link": {"write_latency": 0.002, "disconnect_rate": 0.03},
+}
+
+RAMP_SCENARIO = "ramp"
+
+# Gated metrics and which direction is better
+DIRECTIONS = {
+    "fps": "higher",
+    "p50_ms": "lower",
+    "p99_ms": "lower",
+    "ramp_s": "lower",
+}
+
+# Tail latency moves with scheduler noise more than the medians do
+THRESHOLDS = {"p99_ms": 0.35}
+
+
+def _frame_color(frame: int) -> Color:
+    """Unique color per frame id, recognizable in the decoded packet."""
+    return Color((frame >> 8) & 0xFF, frame & 0xFF, 0x80)
+
+
+def _write_config(protocol: str) -> None:
+    ConfigService.save_config({
+        "device": {
+            "target_mac": DEVICE_MAC,
+            "device_name": "Bench LED",
+            "protocol": protocol
+        },
+        "preferences": {
+            "brightness": 1.0,
+            "last_color": {"r": 0, "g": 0, "b": 0},
+            "use_real_device": False,
+            "keepalive_interval": 0.0
+        }
+    })
+
+
+def _offer_load(bridge: BleApplicationBridge, first: int, frames: int, interval: float,
+                sent_at: Dict[tuple, float]) -> None:
+    """Submit frames unique colors at a fixed rate, recording when each was set."""
+    start = time.perf_counter()
+    for index in range(frames):
+        color = _frame_color(first + index)
+        sent_at[color.to_tuple()] = time.perf_counter()
+        bridge.set_color(color)
+        # Absolute schedule: a late frame does not delay the next one
+        sleep_for = start + (index + 1) * interval - time.perf_counter()
+        if sleep_for > 0:
+            time.sleep(sleep_for)
+
+
+def _start_bridge(name: str, seed: int):
+    """Fresh bridge on a virtual device, returned once the first packet arrived."""
+    bridge = BleApplicationBridge()
+    backend = bridge.device_manager.virtual_backend
+    backend.rng.seed(seed)
+    backend.advertise_interval = 0.02
+    device = backend.get(DEVICE_MAC)
+    device.spec.connect_delay = 0.02
+    return bridge, device
+
+
+def _wait_for_first_packet(name: str, device) -> None:
+    deadline = time.monotonic() + 10.0
+    while device.packets_received == 0:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"{name}: virtual device never received a packet")
+        time.sleep(0.01)
+
+
+def run_ramp(*, rate: float, seed: int, timeout: float = 30.0) -> Dict[str, Any]:
+    """Time from connect until the rate governor reaches its ceiling on a clean link."""
+    bridge, device = _start_bridge(RAMP_SCENARIO, seed)
+    device.spec.write_latency = 0.002
+    bridge.initialize()
+    try:
+        _wait_for_first_packet(RAMP_SCENARIO, device)
+        governor = bridge.controller.rate_governor
+        start = time.perf_counter()
+        interval = 1.0 / rate
+        frame = 1
+        ramp_s = None
+        while time.perf_counter() - start < timeout:
+            bridge.set_color(_frame_color(frame))
+            frame += 1
+            if governor.rate >= governor.max_rate * 0.99:
+                ramp_s = time.perf_counter() - start
+                break
+            time.sleep(interval)
+        return {
+            "ramp_s": round(ramp_s, 3) if ramp_s is not None else None,
+            "max_rate": governor.max_rate,
+            "reached": ramp_s is not None,
+        }
+    finally:
+        bridge.shutdown()
+
+
+def run_scenario(
+    name: str,
+    spec: Dict[str, Any],
+    *,
+    duration: float,
+    warmup: float,
+    rate: float,
+    seed: int
+) -> Dict[str, Any]:
+    """Run one scenario on a fresh bridge and return its metrics."""
+    bridge, device = _start_bridge(name, seed)
+
+    sent_at: Dict[tuple, float] = {}
+    latencies = []
+
+    def on_packet(_device, _packet, decoded):
+        if decoded and decoded["command"] == "color":
+            started = sent_at.pop((decoded["r"], decoded["g"], decoded["b"]), None)
+            if started is not None:
+                latencies.append(time.perf_counter() - started)
+
+    device.on_packet = on_packet
+    bridge.initialize()
+    try:
+        _wait_for_first_packet(name, device)
+
+        # Apply the scenario only once connected so setup is not measured
+        for field_name, value in spec.items():
+            setattr(device.spec, field_name, value)
+        # Start at the ceiling: the ramp is measured by its own scenario.
+        # Failures (loss, link drops) still back the governor off.
+        governor = bridge.controller.rate_governor
+        governor.rate = governor.max_rate
+        interval = 1.0 / rate
+        # Unmeasured load first (caches, latency averages)
+        _offer_load(bridge, 1, int(warmup * rate), interval, {})
+        time.sleep(0.1)
+        latencies.clear()
+        sent_at.clear()
+        disconnects_before = device.disconnects
+        lost_before = device.packets_lost
+
+        first = int(warmup * rate) + 1
+        frames = int(duration * rate)
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        _offer_load(bridge, first, frames, interval, sent_at)
+        # Let the last writes land
+        time.sleep(max(0.1, spec.get("write_latency", 0) + spec.get("write_jitter", 0)) * 3)
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+    finally:
+        bridge.shutdown()
+        device.on_packet = None
+
+    delivered = len(latencies)
+    lost = device.packets_lost - lost_before
+    return {
+        "frames_submitted": frames,
+        "frames_delivered": delivered,
+        "fps": round(delivered / wall, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+        "superseded": max(0, frames - delivered - lost),
+        "lost": lost,
+        "cpu_us_per_frame": round(cpu / delivered * 1e6, 1) if delivered else None,
+        "reconnects": device.disconnects - disconnects_before,
+    }
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds of load per scenario")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Seconds of unmeasured load first")
+    parser.add_argument("--rate", type=float, default=100.0, help="Colors submitted per second")
+    parser.add_argument("--protocol", default="elk_bledom", help="Driver of the virtual device")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS) + [RAMP_SCENARIO],
+                        help="Run only this scenario (repeatable)")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per scenario (medians are reported)")
+    parser.add_argument("--seed", type=int, default=1234, help="Seed for simulated loss/latency")
+    add_common_arguments(parser, "bench_e2e")
+    args = parser.parse_args(argv)
+    scenarios = args.scenario or list(SCENARIOS) + [RAMP_SCENARIO]
+
+    results: Dict[str, Dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        ConfigService.CONFIG_FILE = os.path.join(workdir, "led_config.json")
+        LoggerService.LOG_FILE = os.path.join(workdir, "led_control.log")
+        for name in scenarios:
+            runs = []
+            for _ in range(max(1, args.runs)):
+                # The app logs to stdout; keep the report readable
+                with contextlib.redirect_stdout(io.StringIO()):
+                    _write_config(args.protocol)
+                    if name == RAMP_SCENARIO:
+                        runs.append(run_ramp(rate=args.rate, seed=args.seed))
+                    else:
+                        runs.append(run_scenario(name, SCENARIOS[name], duration=args.duration,
+                                                 warmup=args.warmup, rate=args.rate, seed=args.seed))
+            results[name] = row = median_results(runs)
+            if name == RAMP_SCENARIO:
+                print(f"{name:>14}: {row['ramp_s']} s to {row['max_rate']} fps")
+                continue
+            print(f"{name:>14}: {row['fps']:7.1f} fps  p50 {row['p50_ms']} ms  p99 {row['p99_ms']} ms  "
+                  f"superseded {row['superseded']}  lost {row['lost']}  "
+                  f"cpu {row['cpu_us_per_frame']} us/frame  reconnects {row['reconnects']}")
+
+    report = build_report("bench_e2e", results, config={
+        "duration": args.duration, "warmup": args.warmup, "rate": args.rate, "protocol": args.protocol,
+        "seed": args.seed, "runs": args.runs, "scenarios": scenarios
+    })
+    return finish(args, report, DIRECTIONS, THRESHOLDS)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
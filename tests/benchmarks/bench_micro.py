@@ -0,0 +1,149 @@
+"""
+Micro-benchmarks for code that runs per frame or per event.
+
+Cases:
+    driver.encode.<protocol>     encode_color() of each driver
+    models.color                 Color construction (with clamping)
+    models.apply_brightness      Color.apply_brightness()
+    ui.hsv_to_rgb                ColorWheelPicker._hsv_to_rgb (needs customtkinter)
+    factory.detect_driver        DeviceFactory._detect_driver over a synthetic scan
+    factory.classify             DeviceFactory.classify_advertisement over the same scan
+    config.load_config           ConfigService.load_config from a file
+    logger.write                 LoggerService.info (console + file)
+
+Each case reports ops/sec (best of --repeat timed runs). Not collected by
+pytest; run it directly:
+
+    python tests/benchmarks/bench_micro.py [--case factory] [--update-baseline]
+
+Exits 1 if a case got slower than --threshold against the stored baseline
+(tests/benchmarks/baselines/bench_micro.json).
+"""
+
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import timeit
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import common  # noqa: F401  (puts the repo root on sys.path)
+from common import add_common_arguments, build_report, finish
+
+from bleak import BLEDevice
+
+from core.drivers.device_factory import DeviceFactory
+from core.models import Color
+from core.services import ConfigService, LoggerService
+
+DIRECTIONS = {"ops_per_sec": "higher"}
+
+# Synthetic scan: supported controllers of every protocol mixed with the
+# phones, headsets and TVs a real scan is full of
+_SCAN_NAMES = [
+    "ELK-BLEDOM", "ELK-BLEDOM0A", "Triones-2C51", "MH-Strip", "Magic Home",
+    "TY-LED", "Smart Life Bulb", "LED Strip", "RGB CTRL", None,
+    "Galaxy Buds", "iPhone", "Mi Band 7", "[TV] Living Room", "JBL Flip 5",
+    "Tile", "Fitbit", "Unknown", "Keyboard K380", "Pixel 8",
+]
+
+
+def _scan_set(size: int = 100) -> List[Tuple[BLEDevice, List[str]]]:
+    devices = []
+    for i in range(size):
+        name = _SCAN_NAMES[i % len(_SCAN_NAMES)]
+        uuids = ["0000ffe0-0000-1000-8000-00805f9b34fb"] if i % 7 == 0 else []
+        devices.append((BLEDevice(f"AA:BB:CC:00:{i // 256:02X}:{i % 256:02X}", name, None), uuids))
+    return devices
+
+
+def build_cases(workdir: str) -> Dict[str, Tuple[Optional[Callable[[], Any]], int]]:
+    """case name -> (callable, ops per call); callable is None if unavailable."""
+    cases: Dict[str, Tuple[Optional[Callable[[], Any]], int]] = {}
+
+    for protocol in ("elk_bledom", "triones", "magichome", "tuya"):
+        driver = DeviceFactory.create_driver(protocol)
+        cases[f"driver.encode.{protocol}"] = (lambda d=driver: d.encode_color(12, 200, 255), 1)
+
+    color = Color(200, 100, 50)
+    cases["models.color"] = (lambda: Color(200, 100, 50), 1)
+    cases["models.apply_brightness"] = (lambda: color.apply_brightness(0.5), 1)
+
+    try:
+        from ui.components import ColorWheelPicker
+    except Exception:
+        cases["ui.hsv_to_rgb"] = (None, 1)
+    else:
+        # _hsv_to_rgb does not touch the widget, so no Tk root is needed
+        hsv_to_rgb = ColorWheelPicker._hsv_to_rgb
+        cases["ui.hsv_to_rgb"] = (lambda: hsv_to_rgb(None, 217.0, 0.8, 0.9), 1)
+
+    scan = _scan_set()
+
+    def detect_all():
+        for device, _ in scan:
+            try:
+                DeviceFactory._detect_driver(device)
+            except ValueError:
+                pass
+
+    def classify_all():
+        for device, uuids in scan:
+            DeviceFactory.classify_advertisement(device.name, uuids)
+
+    cases["factory.detect_driver"] = (detect_all, len(scan))
+    cases["factory.classify"] = (classify_all, len(scan))
+
+    LoggerService.LOG_FILE = os.path.join(workdir, "led_control.log")
+    ConfigService.CONFIG_FILE = os.path.join(workdir, "led_config.json")
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        ConfigService.save_config(ConfigService.DEFAULT_CONFIG)
+    cases["config.load_config"] = (ConfigService.load_config, 1)
+
+    cases["logger.write"] = (lambda: LoggerService.info("Frame written to AA:BB:CC:DD:EE:FF"), 1)
+    return cases
+
+
+def measure(func: Callable[[], Any], ops_per_call: int, *, repeat: int, min_time: float) -> Dict[str, float]:
+    """Best-of-repeat throughput of func."""
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time:
+            break
+        number *= 2
+    best = min(timer.repeat(repeat=repeat, number=number))
+    ops_per_sec = number * ops_per_call / best
+    return {"ops_per_sec": round(ops_per_sec, 1), "ns_per_op": round(1e9 / ops_per_sec, 1)}
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--case", action="append",
+                        help="Run only cases starting with this prefix (repeatable)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case (best counts)")
+    parser.add_argument("--min-time", type=float, default=0.1, help="Minimum seconds per timed run")
+    add_common_arguments(parser, "bench_micro")
+    args = parser.parse_args(argv)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, (func, ops_per_call) in build_cases(workdir).items():
+            if args.case and not any(name.startswith(prefix) for prefix in args.case):
+                continue
+            if func is None:
+                print(f"{name:>28}: skipped (dependency not installed)")
+                continue
+            # LoggerService echoes to the console
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                results[name] = measure(func, ops_per_call, repeat=args.repeat, min_time=args.min_time)
+            row = results[name]
+            print(f"{name:>28}: {row['ops_per_sec']:>14,.0f} ops/s  {row['ns_per_op']:>10,.1f} ns/op")
+
+    report = build_report("bench_micro", results, config={"repeat": args.repeat, "min_time": args.min_time})
+    return finish(args, report, DIRECTIONS)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""
+Shared helpers for the benchmark scripts: percentiles, JSON results,
+stored baselines and the regression check.
+
+Result files look like
+    {"benchmark": "...", "timestamp": "...", "environment": {...},
+     "results": {case: {metric: value}}, "config": {...}}
+and a baseline is simply a saved result file. Runs are only compared
+against a baseline taken with the same config.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(os.path.dirname(BENCH_DIR))
+BASELINE_DIR = os.path.join(BENCH_DIR, "baselines")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+# Scripts are run directly (python tests/benchmarks/bench_*.py)
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+DEFAULT_THRESHOLD = 0.20  # Relative change that counts as a regression
+
+
+def percentile(values: Sequence[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile (None for no values)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100.0 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+def median_results(runs: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """Per-metric median over repeated runs of one case (None values ignored)."""
+    merged: Dict[str, Any] = {}
+    for metric in runs[0]:
+        values = [run[metric] for run in runs if run.get(metric) is not None]
+        if not values:
+            merged[metric] = None
+        elif all(isinstance(v, (int, float)) for v in values):
+            median = statistics.median(values)
+            merged[metric] = round(median, 3) if isinstance(median, float) else median
+        else:
+            merged[metric] = values[0]
+    return merged
+
+
+def environment() -> Dict[str, Any]:
+    """Where the numbers were taken (baselines only compare on similar machines)."""
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+def build_report(benchmark: str, results: Dict[str, Dict[str, Any]], **extra: Any) -> Dict[str, Any]:
+    """Result document for one run."""
+    report = {
+        "benchmark": benchmark,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "results": results
+    }
+    report.update(extra)
+    return report
+
+
+def save_json(path: str, data: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+
+
+def load_json(path: str) -> Optional[Dict[str, Any]]:
+    """Saved report, or None if the file is missing or unreadable."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def find_regressions(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    directions: Dict[str, str],
+    threshold: float = DEFAULT_THRESHOLD,
+    thresholds: Optional[Dict[str, float]] = None
+) -> List[str]:
+    """
+    Compare results against a baseline.
+
+    Args:
+        results: case -> metric -> value of this run
+        baseline: Same shape, from the stored baseline
+        directions: Gated metrics: "higher" or "lower" is better
+        threshold: Allowed relative change in the bad direction
+        thresholds: Per-metric overrides of threshold (for noisier metrics)
+
+    Returns:
+        One line per metric that got worse by more than threshold.
+    """
+    regressions = []
+    for case, metrics in results.items():
+        base_metrics = baseline.get(case)
+        if not base_metrics:
+            continue
+        for metric, direction in directions.items():
+            value, base = metrics.get(metric), base_metrics.get(metric)
+            if value is None or not base:
+                continue
+            change = (value - base) / abs(base)
+            worse = -change if direction == "higher" else change
+            if worse > (thresholds or {}).get(metric, threshold):
+                regressions.append(
+                    f"{case}.{metric}: {value:.4g} vs baseline {base:.4g} ({change:+.1%})"
+                )
+    return regressions
+
+
+def add_common_arguments(parser: argparse.ArgumentParser, name: str) -> None:
+    """--output/--baseline/--update-baseline/--threshold for a benchmark named name."""
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, f"{name}.json"),
+                        help="Where to write this run's JSON results")
+    parser.add_argument("--baseline", default=os.path.join(BASELINE_DIR, f"{name}.json"),
+                        help="Stored baseline to compare against")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Store this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative slowdown that fails the run (default %(default)s)")
+
+
+def finish(
+    args: argparse.Namespace,
+    report: Dict[str, Any],
+    directions: Dict[str, str],
+    thresholds: Optional[Dict[str, float]] = None
+) -> int:
+    """Write results, update or check the baseline; returns the exit code (2 = not comparable)."""
+    save_json(args.output, report)
+    print(f"Results written to {args.output}")
+    if args.update_baseline:
+        save_json(args.baseline, report)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+    baseline = load_json(args.baseline)
+    if baseline is None:
+        print(f"No baseline at {args.baseline} (run with --update-baseline to store one)")
+        return 0
+    if baseline.get("config") != report.get("config"):
+        print(f"Not comparing: baseline config {baseline.get('config')} differs from this run's "
+              f"{report.get('config')} (rerun with the baseline's options or --update-baseline)")
+        return 2
+    regressions = find_regressions(
+        report["results"], baseline.get("results", {}), directions, args.threshold, thresholds
+    )
+    if regressions:
+        print(f"Regressions beyond {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
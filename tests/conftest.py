@@ -0,0 +1,45 @@
+"""
+Shared pytest fixtures.
+"""
+
+import time
+from typing import Callable
+
+import pytest
+
+from core.scanner import BleScanner
+from core.services import LoggerService
+
+
+@pytest.fixture(autouse=True)
+def _isolated_log_file(tmp_path, monkeypatch):
+    """Keep test-run logging out of the working tree."""
+    monkeypatch.setattr(LoggerService, "LOG_FILE", str(tmp_path / "led_control.log"))
+
+
+class _IdleScanner(BleScanner):
+    """Scanner that never touches a real adapter."""
+    
+    async def start(self) -> bool:
+        return False
+
+
+@pytest.fixture
+def idle_scanner() -> BleScanner:
+    """Continuous scanner for DeviceManager tests that must not open an adapter."""
+    return _IdleScanner()
+
+
+def _wait_until(predicate: Callable[[], bool], timeout: float = 3.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+@pytest.fixture
+def wait_until() -> Callable[..., bool]:
+    """Polling helper: wait_until(predicate, timeout=3.0) returns the final predicate() result."""
+    return _wait_until
@@ -1,9 +1,18 @@
 import asyncio
+import threading
+import time
 import pytest
-from unittest.mock import AsyncMock, MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from bleak import BLEDevice
 
 from core.models import DeviceConfig, Color, ColorMode
 from core.controller import BleDeviceController
+from core.commands import Command, CommandType
+from core.drivers.elk_bledom import ElkBledomDriver
+from core.profiles import ProfileStore
+from core.rate_limiter import RateGovernor
+from core.scanner import Advertisement
 
 
 @pytest.mark.asyncio
@@ -85,3 +94,366 @@ async def test_read_rssi_prefers_get_rssi_then_backend():
     mock_client._backend = backend
     r2 = await ctrl._read_rssi()
     assert r2 == -55
+
+
+@pytest.mark.asyncio
+async def test_send_color_skips_unchanged_state_until_keepalive():
+    cfg = DeviceConfig(target_mac="", write_char_uuid="uuid")
+    ctrl = BleDeviceController(cfg, lambda s: None, lambda c: None, use_real_device=False, keepalive_interval=10.0)
+    driver = MagicMock()
+    driver.set_color = AsyncMock(return_value=True)
+    ctrl.device_driver = driver
+
+    await ctrl._send_color(Color(10, 20, 30))
+    await ctrl._send_color(Color(10, 20, 30))
+    assert driver.set_color.call_count == 1
+
+    # Brightness change alters the final color -> dirty
+    ctrl.set_brightness(0.5)
+    await ctrl._send_color(Color(10, 20, 30))
+    assert driver.set_color.call_count == 2
+    assert ctrl.shadow.color == Color(5, 10, 15)
+
+    # Keepalive refresh of unchanged state once the interval elapsed
+    ctrl.shadow.last_write -= 11.0
+    await ctrl._send_color(Color(10, 20, 30))
+    assert driver.set_color.call_count == 3
+
+    # Reconnect invalidates the shadow
+    ctrl.shadow.invalidate()
+    await ctrl._send_color(Color(10, 20, 30))
+    assert driver.set_color.call_count == 4
+
+
+@pytest.mark.asyncio
+async def test_send_mode_command_skips_unchanged_mode_and_speed():
+    cfg = DeviceConfig(target_mac="", write_char_uuid="uuid")
+    ctrl = BleDeviceController(cfg, lambda s: None, lambda c: None, use_real_device=False)
+    driver = MagicMock(spec=ElkBledomDriver)
+    driver.set_mode = AsyncMock(return_value=True)
+    ctrl.device_driver = driver
+
+    assert await ctrl._send_mode_command(ColorMode.RAINBOW) is True
+    assert await ctrl._send_mode_command(ColorMode.RAINBOW) is True
+    assert driver.set_mode.call_count == 1
+
+    ctrl.speed = 40
+    await ctrl._send_mode_command(ColorMode.RAINBOW)
+    assert driver.set_mode.call_count == 2
+
+
+class _FakeBleakClient:
+    """Minimal async-context BleakClient stand-in for loop-level tests."""
+
+    rssi_reads = 0
+
+    def __init__(self, device, disconnected_callback=None, **kwargs):
+        self.is_connected = True
+
+    async def get_rssi(self):
+        _FakeBleakClient.rssi_reads += 1
+        return -50
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.is_connected = False
+
+
+def test_setter_wakes_loop_without_polling_latency():
+    """set_color wakes the idle loop directly; nothing polls while the state is unchanged."""
+
+    cfg = DeviceConfig(target_mac="", write_char_uuid="uuid")
+    ctrl = BleDeviceController(cfg, lambda s: None, lambda c: None, keepalive_interval=0)
+    ctrl.rssi_interval = 3600.0
+    # Measure wake-ups only, not frame pacing
+    ctrl.rate_governor = RateGovernor(max_rate=10000.0, initial_rate=10000.0)
+
+    written = threading.Event()
+
+    async def record_write(r, g, b):
+        written.set()
+        return True
+
+    driver = MagicMock()
+    driver.set_color = AsyncMock(side_effect=record_write)
+    driver.set_mode = AsyncMock(return_value=True)
+    driver.connect = AsyncMock(return_value=True)
+    driver.disconnect = AsyncMock()
+    driver.__class__.get_supported_modes = MagicMock(return_value={"MANUAL": 1})
+
+    async def fake_find_device():
+        ctrl.device_driver = driver
+        device = MagicMock()
+        device.name = "Fake"
+        return device
+
+    wait_timeouts = []
+    wait_for_wake = ctrl._wait_for_wake
+
+    async def record_wait(timeout):
+        wait_timeouts.append(timeout)
+        await wait_for_wake(timeout)
+
+    with patch("core.controller.BleakClient", _FakeBleakClient), \
+            patch.object(ctrl, "_find_device", side_effect=fake_find_device), \
+            patch.object(ctrl, "_wait_for_wake", side_effect=record_wait):
+        ctrl.start()
+        try:
+            assert written.wait(2.0)  # initial color after connect
+            for i in range(20):
+                written.clear()
+                # Let the loop go idle before the next change
+                time.sleep(0.01)
+                ctrl.set_color(Color(i + 1, 0, 0))
+                assert written.wait(1.0)
+        finally:
+            ctrl.stop()
+
+    # The loop idles on the hour-long RSSI deadline, so every write came from a wake-up
+    assert wait_timeouts
+    assert all(t is None or t > 60 for t in wait_timeouts)
+    # No polling: a handful of wake-ups per change, not a tick every 100 ms
+    assert len(wait_timeouts) <= 3 * 21
+    assert driver.set_color.await_count == 21
+
+
+def test_submit_applies_discrete_commands_before_coalesced_values():
+    cfg = DeviceConfig(target_mac="", write_char_uuid="uuid")
+    ctrl = BleDeviceController(cfg, lambda s: None, lambda c: None, use_real_device=False)
+
+    for i in range(50):
+        ctrl.submit(Command(CommandType.COLOR, Color(i, 0, 0)))
+    ctrl.submit(Command(CommandType.MODE, ColorMode.BREATH))
+    ctrl.submit(Command(CommandType.DISCONNECT))
+    assert len(ctrl.commands) == 3
+
+    ctrl._drain_commands()
+    assert ctrl.current_mode == ColorMode.BREATH
+    assert ctrl.force_disconnect is True
+    assert ctrl.current_color == Color(49, 0, 0)
+    assert len(ctrl.commands) == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_writes_lower_published_frame_rate_limit():
+    cfg = DeviceConfig(target_mac="", write_char_uuid="uuid")
+    ctrl = BleDeviceController(cfg, lambda s: None, lambda c: None, use_real_device=False)
+    driver = MagicMock()
+    driver.set_color = AsyncMock(return_value=False)
+    ctrl.device_driver = driver
+
+    before = ctrl.rate_governor.rate
+    await ctrl._send_color(Color(1, 2, 3))
+    assert ctrl.status.frame_rate_limit is not None
+    assert ctrl.status.frame_rate_limit < before
+
+
+@pytest.mark.asyncio
+async def test_manual_write_sends_color_submitted_during_governor_wait():
+
+    cfg = DeviceConfig(target_mac="", write_char_uuid="uuid")
+    ctrl = BleDeviceController(cfg, lambda s: None, lambda c: None, use_real_device=False)
+    driver = MagicMock()
+    driver.set_color = AsyncMock(return_value=True)
+    ctrl.device_driver = driver
+    ctrl.set_color(Color(1, 1, 1))
+    ctrl.rate_governor._next_slot = time.monotonic() + 0.05
+
+    async def submit_newer():
+        await asyncio.sleep(0.02)
+        ctrl.submit(Command(CommandType.COLOR, Color(9, 9, 9)))
+
+    await asyncio.gather(ctrl._paced_write(ctrl._render_manual_color), submit_newer())
+    # Only the newest color goes out, in the slot the older one was waiting for
+    driver.set_color.assert_awaited_once_with(9, 9, 9)
+    assert len(ctrl.commands) == 0
+
+
+def test_mode_switch_cancels_effect_task_within_a_frame():
+    """Switching BREATH -> MANUAL replaces the effect at once; RSSI keeps polling meanwhile."""
+
+    cfg = DeviceConfig(target_mac="", write_char_uuid="uuid")
+    ctrl = BleDeviceController(cfg, lambda s: None, lambda c: None)
+    ctrl.rssi_interval = 0.05
+    ctrl.rate_governor = RateGovernor(max_rate=1000.0, initial_rate=1000.0)
+    ctrl.set_mode(ColorMode.BREATH)
+
+    frames = []
+    manual_written = threading.Event()
+    manual = Color(1, 2, 3)
+
+    frames_at_manual = []
+
+    async def record_frame(frame):
+        frames.append(frame)
+        return True
+
+    async def record_color(r, g, b):
+        if (r, g, b) == manual.to_tuple():
+            frames_at_manual.append(len(frames))
+            manual_written.set()
+        return True
+
+    driver = ElkBledomDriver()
+    driver.connect = AsyncMock(return_value=True)
+    driver.write_frame = AsyncMock(side_effect=record_frame)
+    driver.set_color = AsyncMock(side_effect=record_color)
+    driver.set_mode = AsyncMock(return_value=True)
+
+    async def fake_find_device():
+        ctrl.device_driver = driver
+        device = MagicMock()
+        device.name = "Fake"
+        return device
+
+    _FakeBleakClient.rssi_reads = 0
+    with patch("core.controller.BleakClient", _FakeBleakClient), \
+            patch.object(ctrl, "_find_device", side_effect=fake_find_device):
+        ctrl.start()
+        try:
+            deadline = time.monotonic() + 2.0
+            while len(frames) < 10 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert len(frames) >= 10
+            # Supervisor keeps polling RSSI while the effect task runs
+            assert _FakeBleakClient.rssi_reads >= 2
+
+            frames_at_switch = len(frames)
+            ctrl.set_color(manual)
+            ctrl.set_mode(ColorMode.MANUAL)
+            assert manual_written.wait(5.0)
+            time.sleep(0.1)
+        finally:
+            ctrl.stop()
+
+    # At most the frame already in flight goes out, and none after the switch
+    assert frames_at_manual[0] - frames_at_switch <= 1
+    assert len(frames) == frames_at_manual[0]
+
+
+def test_link_drop_reconnects_via_cached_device():
+    """After a drop the cached device and driver are reused, no rescan."""
+
+    cfg = DeviceConfig(target_mac="", write_char_uuid="uuid")
+    ctrl = BleDeviceController(cfg, lambda s: None, lambda c: None, keepalive_interval=0)
+    ctrl.rssi_interval = 3600.0
+    driver = MagicMock()
+    driver.connect = AsyncMock(return_value=True)
+    driver.disconnect = AsyncMock()
+    driver.set_color = AsyncMock(return_value=True)
+    driver.set_mode = AsyncMock(return_value=True)
+    device = MagicMock()
+    device.name = "Fake"
+    finds = []
+    clients = []
+    reconnected = threading.Event()
+
+    async def fake_find_device():
+        finds.append(time.monotonic())
+        ctrl.device_driver = driver
+        return device
+
+    class DroppingClient(_FakeBleakClient):
+        def __init__(self, device, disconnected_callback=None, **kwargs):
+            super().__init__(device, disconnected_callback)
+            self.kwargs = kwargs
+            clients.append(self)
+            if len(clients) == 2:
+                reconnected.set()
+
+    with patch("core.controller.BleakClient", DroppingClient), \
+            patch.object(ctrl, "_find_device", side_effect=fake_find_device):
+        ctrl.start()
+        try:
+            deadline = time.monotonic() + 2.0
+            while ctrl.status.connect_time_ms is None and time.monotonic() < deadline:
+                time.sleep(0.01)
+            # Drop the link
+            clients[0].is_connected = False
+            ctrl._request_wake()
+            assert reconnected.wait(2.0)
+            deadline = time.monotonic() + 2.0
+            while ctrl.status.reconnect_time_ms is None and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            ctrl.stop()
+
+    assert len(finds) == 1
+    assert ctrl.device_driver is driver
+    assert "timeout" in clients[1].kwargs
+    assert ctrl.fast_connect_min <= clients[1].kwargs["timeout"] <= ctrl.fast_connect_max
+    assert ctrl.status.reconnect_count == 1
+    assert ctrl.status.reconnect_time_ms < 1000
+
+
+def test_fast_reconnect_failure_falls_back_to_scan_without_backoff():
+    """A failed fast connect rescans immediately instead of sleeping."""
+
+    cfg = DeviceConfig(target_mac="", write_char_uuid="uuid")
+    ctrl = BleDeviceController(cfg, lambda s: None, lambda c: None)
+    ctrl.device_driver = MagicMock()
+    ctrl.device_driver.disconnect = AsyncMock()
+    ctrl._last_device = MagicMock()
+    finds = []
+
+    class FailingClient(_FakeBleakClient):
+        async def __aenter__(self):
+            raise TimeoutError("no answer")
+
+    async def fake_find_device():
+        finds.append(time.monotonic())
+        ctrl.is_running = False
+        return None
+
+    with patch("core.controller.BleakClient", FailingClient), \
+            patch.object(ctrl, "_find_device", side_effect=fake_find_device):
+        ctrl.is_running = True
+        start = time.monotonic()
+        ctrl.loop.run_until_complete(asyncio.wait_for(ctrl._main_loop(), 1.0))
+
+    assert len(finds) == 1
+    assert finds[0] - start < 0.5
+    assert ctrl._last_device is None
+
+
+def test_failed_candidate_tries_next_ranked_device_without_backoff():
+    """Without a MAC, candidates are tried best-first and a failure moves on at once."""
+
+    store = ProfileStore(None)
+    cfg = DeviceConfig(target_mac="", write_char_uuid="uuid")
+    ctrl = BleDeviceController(cfg, lambda s: None, lambda c: None, profile_store=store)
+    scanner = MagicMock()
+    scanner.is_running = True
+    scanner.index.entries.return_value = [
+        Advertisement("AA:00", "ELK-BLEDOM", -90, (), device=BLEDevice("AA:00", "ELK-BLEDOM", None),
+                      driver_class=ElkBledomDriver, confidence=0.6),
+        Advertisement("AA:01", "ELK-BLEDOM", -45, (), device=BLEDevice("AA:01", "ELK-BLEDOM", None),
+                      driver_class=ElkBledomDriver, confidence=0.6),
+    ]
+    ctrl.scanner = scanner
+    attempts = []
+
+    class FlakyClient(_FakeBleakClient):
+        def __init__(self, device, disconnected_callback=None, **kwargs):
+            super().__init__(device, disconnected_callback)
+            attempts.append((device.address, time.monotonic()))
+            self.device = device
+
+        async def __aenter__(self):
+            if len(attempts) == 1:
+                raise TimeoutError("no answer")
+            ctrl.is_running = False
+            return self
+
+    with patch("core.controller.BleakClient", FlakyClient):
+        ctrl.is_running = True
+        start = time.monotonic()
+        ctrl.loop.run_until_complete(asyncio.wait_for(ctrl._main_loop(), 2.0))
+
+    # Strongest first, then the weaker one right away
+    assert [address for address, _ in attempts] == ["AA:01", "AA:00"]
+    assert attempts[1][1] - start < 0.5
+    assert store.success_rate("AA:01") < store.success_rate("AA:00")
+    assert ctrl._candidates == []
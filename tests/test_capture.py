@@ -0,0 +1,174 @@
+"""
+Unit tests for packet capture, decoding and replay.
+"""
+
+import os
+import struct
+import time
+
+import pytest
+
+from core.capture import (
+    MAGIC, VERSION, CapturedPacket, CaptureReader, PacketRecorder, decode_packet, read_capture, replay, replay_to_client
+)
+from core.drivers.magichome import MagicHomeDriver
+from core.drivers.triones import TrionesDriver
+from core.virtual import VirtualBleBackend, VirtualDeviceSpec
+
+
+class TestCaptureFile:
+    """Tests for the binary capture format."""
+
+    def test_round_trip(self, tmp_path):
+        path = str(tmp_path / "capture.bin")
+        with PacketRecorder(path) as recorder:
+            recorder.record("AA:01", TrionesDriver.WRITE_CHAR_UUID, bytearray(b"\x56\xaa\x01\x01\x02\x03\xaa\xaa"))
+            recorder.record("AA:02", MagicHomeDriver.WRITE_CHAR_UUID, b"\x7e\x05\x03\x80\x00\x00\x00\xef")
+            recorder.record("AA:01", TrionesDriver.WRITE_CHAR_UUID, b"\x56\xaa\x01\x04\x05\x06\xaa\xaa")
+
+        packets = read_capture(path)
+        assert [p.device for p in packets] == ["AA:01", "AA:02", "AA:01"]
+        assert packets[2].payload == b"\x56\xaa\x01\x04\x05\x06\xaa\xaa"
+        assert packets[0].timestamp_ns <= packets[1].timestamp_ns <= packets[2].timestamp_ns
+
+    def test_appending_session_and_truncated_tail(self, tmp_path):
+        """A second recorder appends; a half-written record at the end is ignored."""
+        path = str(tmp_path / "capture.bin")
+        with PacketRecorder(path) as recorder:
+            recorder.record("AA:01", "ffd9", b"\x01")
+        with PacketRecorder(path) as recorder:
+            recorder.record("AA:02", "ffe5", b"\x02")
+        with open(path, "ab") as f:
+            f.write(b"\x01\x00\x00")
+
+        packets = read_capture(path)
+        assert [(p.device, p.characteristic, p.payload) for p in packets] == [
+            ("AA:01", "ffd9", b"\x01"), ("AA:02", "ffe5", b"\x02")
+        ]
+        assert [p.session for p in packets] == [0, 1]
+
+    def test_append_after_crash_mid_record(self, tmp_path):
+        """A recorder reopening a file cut off mid-record drops the partial record first."""
+        path = str(tmp_path / "capture.bin")
+        with PacketRecorder(path) as recorder:
+            for i in range(3):
+                recorder.record("AA:01", MagicHomeDriver.WRITE_CHAR_UUID, bytes(MagicHomeDriver().encode_color(i, 2, 3)))
+        with open(path, "r+b") as f:
+            f.truncate(os.path.getsize(path) - 4)
+        with PacketRecorder(path) as recorder:
+            for i in range(5):
+                recorder.record("AA:02", TrionesDriver.WRITE_CHAR_UUID, bytes([i]))
+
+        packets = read_capture(path)
+        assert [(p.device, p.session) for p in packets] == [("AA:01", 0)] * 2 + [("AA:02", 1)] * 5
+        assert [p.payload for p in packets[2:]] == [bytes([i]) for i in range(5)]
+
+    def test_reader_resyncs_at_next_session(self, tmp_path):
+        """A damaged record in the middle skips to the next session instead of ending the capture."""
+        damaged = tmp_path / "damaged.bin"
+        with PacketRecorder(str(damaged)) as recorder:
+            recorder.record("AA:01", "ffd9", b"\x01\x02\x03\x04")
+        damaged.write_bytes(damaged.read_bytes()[:-4] + b"\xc6\xc6")
+        other = tmp_path / "other.bin"
+        with PacketRecorder(str(other)) as recorder:
+            recorder.record("AA:02", "ffe5", b"\x05")
+        with open(damaged, "ab") as f:
+            f.write(other.read_bytes()[struct.calcsize("<6sHd"):])
+
+        packets = read_capture(str(damaged))
+        assert [(p.device, p.payload, p.session) for p in packets] == [("AA:02", b"\x05", 1)]
+
+    def test_flushes_without_close(self, tmp_path):
+        """Packets reach the file every flush_packets, so a crash loses at most that many."""
+        path = str(tmp_path / "capture.bin")
+        recorder = PacketRecorder(path, flush_packets=2, flush_interval=60.0)
+        try:
+            recorder.record("AA:01", "ffd9", b"\x01")
+            assert read_capture(path) == []
+            recorder.record("AA:01", "ffd9", b"\x02")
+            assert [p.payload for p in read_capture(path)] == [b"\x01", b"\x02"]
+        finally:
+            recorder.close()
+
+    def test_rejects_other_files(self, tmp_path):
+        path = tmp_path / "other.bin"
+        path.write_bytes(b"not a capture file at all")
+        with pytest.raises(ValueError):
+            CaptureReader(str(path))
+
+    def test_rejects_other_versions(self, tmp_path):
+        path = tmp_path / "capture.bin"
+        path.write_bytes(struct.pack("<6sHd", MAGIC, VERSION + 1, 0.0))
+        with pytest.raises(ValueError):
+            CaptureReader(str(path))
+
+
+def test_decode_guesses_protocol_from_characteristic():
+    packet = CapturedPacket(0, "AA:01", MagicHomeDriver.ALTERNATIVE_UUID, bytes(MagicHomeDriver().encode_color(1, 2, 3)))
+    assert decode_packet(packet) == {"command": "color", "r": 1, "g": 2, "b": 3, "protocol": "magichome"}
+    assert decode_packet(CapturedPacket(0, "AA:01", "0000abcd-0000-1000-8000-00805f9b34fb", b"\x00")) is None
+
+
+@pytest.mark.asyncio
+async def test_driver_writes_are_recorded(tmp_path):
+    """With a recorder attached, every packet the driver writes lands in the capture."""
+    path = str(tmp_path / "capture.bin")
+    backend = VirtualBleBackend([VirtualDeviceSpec("AA:03", protocol="triones", write_latency=0.0)])
+    driver = TrionesDriver()
+    with PacketRecorder(path) as recorder:
+        driver.recorder = recorder
+        async with backend.create_client("AA:03") as client:
+            await driver.connect(client)
+            await driver.set_color(10, 20, 30)
+            await driver.set_mode(TrionesDriver.MODE_FADE, 40)
+
+    commands = [decode_packet(p) for p in read_capture(path)]
+    assert [c["command"] for c in commands] == ["color", "mode"]
+    assert read_capture(path)[0].device == "AA:03"
+
+
+@pytest.mark.asyncio
+async def test_replay_keeps_spacing_scaled_by_speed():
+    packets = [CapturedPacket(i * 100_000_000, "AA:01", "ffd9", bytes([i])) for i in range(4)]
+    times = []
+
+    async def write(packet):
+        times.append(time.monotonic())
+
+    start = time.monotonic()
+    assert await replay(packets, write, speed=4.0) == 4
+    # 300 ms of capture at 4x speed
+    assert times[-1] - start == pytest.approx(0.075, abs=0.03)
+
+
+@pytest.mark.asyncio
+async def test_replay_skips_gap_between_sessions():
+    """A later session's timestamps are re-anchored instead of waited for."""
+    packets = [
+        CapturedPacket(0, "AA:01", "ffd9", b"\x00", session=0),
+        CapturedPacket(50_000_000, "AA:01", "ffd9", b"\x01", session=0),
+        # Next app run: unrelated monotonic clock, far away
+        CapturedPacket(3_600_000_000_000, "AA:01", "ffd9", b"\x02", session=1),
+        CapturedPacket(3_600_050_000_000, "AA:01", "ffd9", b"\x03", session=1),
+    ]
+    written = []
+
+    async def write(packet):
+        written.append(packet.payload)
+
+    start = time.monotonic()
+    assert await replay(packets, write) == 4
+    assert time.monotonic() - start == pytest.approx(0.1, abs=0.05)
+    assert written == [b"\x00", b"\x01", b"\x02", b"\x03"]
+
+
+@pytest.mark.asyncio
+async def test_replay_to_virtual_device_restores_state():
+    backend = VirtualBleBackend([VirtualDeviceSpec("AA:04", protocol="triones", write_latency=0.0)])
+    packets = [
+        CapturedPacket(0, "AA:04", TrionesDriver.WRITE_CHAR_UUID, bytes(TrionesDriver().encode_color(5, 6, 7))),
+        CapturedPacket(1, "BB:00", TrionesDriver.WRITE_CHAR_UUID, bytes(TrionesDriver().encode_color(9, 9, 9))),
+    ]
+    async with backend.create_client("AA:04") as client:
+        assert await replay_to_client(packets, client, speed=0, device="aa:04") == 1
+    assert backend.get("AA:04").color == (5, 6, 7)
@@ -0,0 +1,84 @@
+"""
+Unit tests for the coalescing command queue.
+"""
+
+import threading
+
+from core.commands import Command, CommandQueue, CommandType
+from core.models import Color, ColorMode
+
+
+class TestCommandQueue:
+    """Tests for CommandQueue."""
+    
+    def test_coalesces_continuous_commands(self):
+        """Only the newest color/brightness/speed survives."""
+        queue = CommandQueue()
+        for i in range(100):
+            queue.put(Command(CommandType.COLOR, Color(i, 0, 0)))
+        queue.put(Command(CommandType.BRIGHTNESS, 0.2))
+        queue.put(Command(CommandType.BRIGHTNESS, 0.7))
+        
+        assert len(queue) == 2
+        commands = queue.drain()
+        assert [c.type for c in commands] == [CommandType.BRIGHTNESS, CommandType.COLOR]
+        assert commands[0].value == 0.7
+        assert commands[1].value == Color(99, 0, 0)
+        assert queue.coalesced_count == 100
+        assert len(queue) == 0
+    
+    def test_discrete_commands_drain_first_in_order(self):
+        """Mode changes and disconnect jump ahead of color frames."""
+        queue = CommandQueue()
+        queue.put(Command(CommandType.COLOR, Color(1, 2, 3)))
+        queue.put(Command(CommandType.MODE, ColorMode.BREATH))
+        queue.put(Command(CommandType.SPEED, 40))
+        queue.put(Command(CommandType.MODE, ColorMode.MANUAL))
+        queue.put(Command(CommandType.DISCONNECT))
+        
+        types = [c.type for c in queue.drain()]
+        assert types == [
+            CommandType.MODE, CommandType.MODE, CommandType.DISCONNECT,
+            CommandType.SPEED, CommandType.COLOR
+        ]
+    
+    def test_priority_lane_is_bounded_and_spares_disconnect(self):
+        """Full lane drops the oldest mode change, never a disconnect."""
+        queue = CommandQueue(max_discrete=2)
+        queue.put(Command(CommandType.DISCONNECT))
+        queue.put(Command(CommandType.MODE, ColorMode.CPU))
+        queue.put(Command(CommandType.MODE, ColorMode.RAINBOW))
+        
+        commands = queue.drain()
+        assert [c.type for c in commands] == [CommandType.DISCONNECT, CommandType.MODE]
+        assert commands[1].value == ColorMode.RAINBOW
+        assert queue.dropped_count == 1
+    
+    def test_take_pops_only_requested_types(self):
+        """take() leaves the priority lane and other coalesced slots alone."""
+        queue = CommandQueue()
+        queue.put(Command(CommandType.MODE, ColorMode.BREATH))
+        queue.put(Command(CommandType.SPEED, 40))
+        queue.put(Command(CommandType.COLOR, Color(1, 2, 3)))
+        queue.put(Command(CommandType.COLOR, Color(4, 5, 6)))
+        
+        taken = queue.take(CommandType.BRIGHTNESS, CommandType.COLOR)
+        assert taken == [Command(CommandType.COLOR, Color(4, 5, 6))]
+        assert [c.type for c in queue.drain()] == [CommandType.MODE, CommandType.SPEED]
+    
+    def test_put_from_many_threads(self):
+        """Concurrent producers never grow the coalesced slot."""
+        queue = CommandQueue()
+        
+        def produce():
+            for i in range(500):
+                queue.put(Command(CommandType.COLOR, Color(i, i, i)))
+        
+        threads = [threading.Thread(target=produce) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        assert len(queue) == 1
+        assert queue.coalesced_count == 1999
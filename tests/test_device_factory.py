@@ -178,3 +178,76 @@ class TestDeviceFactory:
         # Should detect as Triones, not fallback to ELK-BLEDOM
         assert isinstance(driver, TrionesDriver)
 
+
+
+class TestDetectionIndex:
+    """Tests for the precomputed detection index."""
+    
+    def test_short_uuid_and_priority(self):
+        """16-bit UUIDs resolve directly; the earlier driver in detection order wins."""
+        assert DeviceFactory._match_driver_class(None, ["ffe9"]) is MagicHomeDriver
+        # Name says Tuya, UUID says Triones: Triones is checked first
+        assert DeviceFactory._match_driver_class("Tuya strip", ["0000ffd5-0000-1000-8000-00805f9b34fb"]) is TrionesDriver
+        # Non-base 128-bit UUIDs are not indexed
+        assert DeviceFactory._match_driver_class(None, ["12345678-ffd9-1000-8000-00805f9b34fb"]) is None
+    
+    def test_index_matches_legacy_can_handle_device(self):
+        """The index agrees with the drivers' own can_handle_device() checks."""
+        names = [None, "ELK-BLEDOM", "Triones LED", "MH-01", "Smart Life bulb", "PARTY-LIGHT", "Desk RGB", "Other"]
+        uuid_sets = [[], ["0000fff3-0000-1000-8000-00805f9b34fb"], ["0000fe40-0000-1000-8000-00805f9b34fb"]]
+        order = [TrionesDriver, MagicHomeDriver, TuyaDriver, ElkBledomDriver]
+        for name in names:
+            for uuids in uuid_sets:
+                expected = next((d for d in order if d.can_handle_device(name, uuids)), None)
+                if expected is None and name and any(k in name.upper() for k in ["LED", "RGB", "CTRL", "LIGHT"]):
+                    expected = ElkBledomDriver
+                assert DeviceFactory._match_driver_class(name, uuids) is expected, (name, uuids)
+    
+    def test_driver_without_index_entries_uses_can_handle_device(self, monkeypatch):
+        """Drivers declaring no keywords/UUIDs are still detected via can_handle_device()."""
+        from core.drivers import device_factory
+        
+        class LegacyDriver(ElkBledomDriver):
+            NAME_KEYWORDS = ()
+            SERVICE_UUID16 = ()
+            
+            @staticmethod
+            def can_handle_device(device_name, service_uuids):
+                return bool(device_name) and device_name.startswith("Legacy")
+        
+        monkeypatch.setattr(device_factory, "_DETECTION_ORDER", list(device_factory._DETECTION_ORDER))
+        monkeypatch.setattr(device_factory, "_DETECTION_INDEX", device_factory._DETECTION_INDEX)
+        monkeypatch.setattr(device_factory, "_DRIVER_REGISTRY", dict(device_factory._DRIVER_REGISTRY))
+        DeviceFactory.register_driver("legacy", LegacyDriver)
+        
+        assert DeviceFactory._match_driver_class("Legacy strip", []) is LegacyDriver
+        # Indexed drivers registered earlier still take precedence
+        assert DeviceFactory._match_driver_class("Legacy Triones", []) is TrionesDriver
+
+    def test_fingerprint_outranks_name_and_uuid(self):
+        """Manufacturer/service data fingerprints win and report their confidence."""
+        driver_class, confidence = DeviceFactory.classify_advertisement(
+            "ELK-BLEDOM", ["0000fff3-0000-1000-8000-00805f9b34fb"], manufacturer_data={0x07D0: b"\x00"}
+        )
+        assert driver_class is TuyaDriver
+        assert confidence > 0.9
+        
+        driver_class, _ = DeviceFactory.classify_advertisement(
+            None, [], service_data={"0000fd50-0000-1000-8000-00805f9b34fb": b"\x00"}
+        )
+        assert driver_class is TuyaDriver
+        
+        # Unknown company IDs fall back to name evidence
+        driver_class, confidence = DeviceFactory.classify_advertisement("ELK-BLEDOM", [], manufacturer_data={0x1234: b""})
+        assert driver_class is ElkBledomDriver
+        assert confidence < 0.9
+    
+    def test_fingerprint_data_prefix(self):
+        """A fingerprint with a data prefix only matches payloads starting with it."""
+        from core.interfaces import AdvertisementFingerprint
+        
+        fingerprint = AdvertisementFingerprint(manufacturer_id=0xFFFF, data_prefix=b"\x5a\x01")
+        assert fingerprint.matches(b"\x5a\x01\x09")
+        assert not fingerprint.matches(b"\x5a\x02")
+        with pytest.raises(ValueError):
+            AdvertisementFingerprint()
@@ -7,7 +7,9 @@ import pytest
 from unittest.mock import AsyncMock, MagicMock
 from bleak import BleakClient
 
+from core.effects import build_frame_table
 from core.interfaces import AbstractLedDevice
+from core.models import ColorMode
 from core.drivers.elk_bledom import ElkBledomDriver
 from core.drivers.triones import TrionesDriver
 from core.drivers.magichome import MagicHomeDriver
@@ -239,7 +241,41 @@ class TestMagicHomeDriver:
         assert payload[5] == 64   # B
         assert payload[6] == 0x00  # W (white channel)
         assert payload[-1] == 0xEF  # Packet end
-    
+
+    @pytest.mark.asyncio
+    async def test_alternative_characteristic_resolved_on_connect(self):
+        """Without ffe5, the ffe9 characteristic object is chosen once and written to."""
+        driver = MagicHomeDriver()
+        mock_client = MagicMock(spec=BleakClient)
+        mock_client.is_connected = True
+        mock_client.write_gatt_char = AsyncMock()
+        mock_char = MagicMock()
+        mock_char.uuid = MagicHomeDriver.ALTERNATIVE_UUID
+        mock_service = MagicMock()
+        mock_service.characteristics = [mock_char]
+        mock_client.services = [mock_service]
+
+        await driver.connect(mock_client)
+        assert driver.actual_uuid == MagicHomeDriver.ALTERNATIVE_UUID
+
+        await driver.set_color(1, 2, 3)
+        await driver.set_mode(MagicHomeDriver.MODE_FADE)
+        targets = [call.args[0] for call in mock_client.write_gatt_char.call_args_list]
+        assert targets == [mock_char, mock_char]
+
+    @pytest.mark.asyncio
+    async def test_failed_write_does_not_switch_characteristic(self):
+        """A failing write reports failure instead of retrying another UUID."""
+        driver = MagicHomeDriver()
+        mock_client = MagicMock(spec=BleakClient)
+        mock_client.is_connected = True
+        mock_client.write_gatt_char = AsyncMock(side_effect=Exception("write failed"))
+
+        await driver.connect(mock_client)
+        assert await driver.set_color(1, 2, 3) is False
+        assert mock_client.write_gatt_char.call_count == 1
+        assert driver.actual_uuid == MagicHomeDriver.WRITE_CHAR_UUID
+
     def test_can_handle_device(self):
         """Test device detection."""
         assert MagicHomeDriver.can_handle_device("MagicHome Controller", []) is True
@@ -299,6 +335,45 @@ class TestDriverInterface:
             assert hasattr(driver_class, 'can_handle_device')
             assert hasattr(driver_class, 'get_supported_modes')
     
+    def test_driver_without_encode_color_uses_set_color(self):
+        """Out-of-tree drivers need not encode frames; effect tables fall back to set_color()."""
+        class _MinimalDriver(AbstractLedDevice):
+            async def connect(self, client):
+                return True
+            
+            async def disconnect(self):
+                pass
+            
+            async def set_color(self, r, g, b):
+                return True
+            
+            async def set_brightness(self, brightness):
+                return True
+            
+            async def set_mode(self, mode_id, speed=0):
+                return True
+            
+            def get_write_characteristic_uuid(self):
+                return "0000ffd9-0000-1000-8000-00805f9b34fb"
+            
+            def get_protocol_name(self):
+                return "Minimal"
+            
+            @staticmethod
+            def can_handle_device(device_name, service_uuids):
+                return False
+            
+            @staticmethod
+            def get_supported_modes():
+                return {}
+        
+        driver = _MinimalDriver()
+        assert not driver.encodes_frames
+        assert all(d().encodes_frames for d in (ElkBledomDriver, TrionesDriver, MagicHomeDriver, TuyaDriver))
+        with pytest.raises(NotImplementedError):
+            driver.encode_color(1, 2, 3)
+        assert build_frame_table(ColorMode.RAINBOW, 1.0, 16).packets_for(driver) is None
+    
     @pytest.mark.asyncio
     async def test_driver_rgb_clamping(self):
         """Test that all drivers clamp RGB values."""
@@ -319,9 +394,81 @@ class TestDriverInterface:
             # Test values outside range
             await driver.set_color(300, -10, 500)
             
-            # Verify values were clamped (check payload)
+            # Verify values were clamped: every protocol carries R, G, B adjacently
             payload = mock_client.write_gatt_char.call_args[0][1]
-            # Extract RGB values from payload (varies by protocol)
-            # Just verify no exception was raised and write was called
-            mock_client.write_gatt_char.assert_called()
+            assert bytes([255, 0, 255]) in bytes(payload)
+
+
+
+class TestFrameEncoding:
+    """Tests for preallocated color packets and pre-encoded frame writes."""
+    
+    DRIVERS = [ElkBledomDriver, TrionesDriver, MagicHomeDriver, TuyaDriver]
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("driver_class", DRIVERS)
+    async def test_encode_color_matches_set_color_payload(self, driver_class):
+        """encode_color() produces exactly what set_color() writes."""
+        driver = driver_class()
+        mock_client = MagicMock(spec=BleakClient)
+        mock_client.is_connected = True
+        mock_client.write_gatt_char = AsyncMock()
+        await driver.connect(mock_client)
+        
+        expected = bytes(driver.encode_color(12, 34, 56))
+        await driver.set_color(12, 34, 56)
+        assert bytes(mock_client.write_gatt_char.call_args[0][1]) == expected
+    
+    @pytest.mark.parametrize("driver_class", DRIVERS)
+    def test_encode_color_reuses_template(self, driver_class):
+        """The color packet is patched in place, not reallocated."""
+        driver = driver_class()
+        first = driver.encode_color(1, 2, 3)
+        second = driver.encode_color(4, 5, 6)
+        assert first is second
+        assert bytes([4, 5, 6]) in bytes(second)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("driver_class", DRIVERS)
+    async def test_written_packet_is_not_the_template(self, driver_class):
+        """The backend gets a copy, so re-encoding cannot change a pending write."""
+        driver = driver_class()
+        mock_client = MagicMock(spec=BleakClient)
+        mock_client.is_connected = True
+        mock_client.write_gatt_char = AsyncMock()
+        await driver.connect(mock_client)
+
+        await driver.set_color(1, 2, 3)
+        sent = mock_client.write_gatt_char.call_args[0][1]
+        expected = bytes(driver._color_frame)
+        driver.encode_color(4, 5, 6)
+        assert sent is not driver._color_frame
+        assert sent == expected
 
+    @pytest.mark.parametrize("driver_class", DRIVERS)
+    def test_encode_color_clamps_out_of_range(self, driver_class):
+        """Out-of-range and float components are clamped."""
+        driver = driver_class()
+        frame = bytes(driver.encode_color(300, -10, 127.9))
+        assert bytes([255, 0, 127]) in frame
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("driver_class", DRIVERS)
+    async def test_write_frame_sends_pre_encoded_bytes(self, driver_class):
+        """Already-encoded frames are written unchanged."""
+        driver = driver_class()
+        mock_client = MagicMock(spec=BleakClient)
+        mock_client.is_connected = True
+        mock_client.write_gatt_char = AsyncMock()
+        await driver.connect(mock_client)
+        
+        frame = bytes(driver.encode_color(9, 8, 7))
+        assert await driver.write_frame(frame) is True
+        # Immutable frames are not copied again
+        assert mock_client.write_gatt_char.call_args[0][1] is frame
+    
+    def test_elk_color_frame_tracks_speed(self):
+        """ELK-BLEDOM color packet carries the current speed byte."""
+        driver = ElkBledomDriver()
+        driver.set_speed(0x42)
+        assert driver.encode_color(1, 2, 3)[7] == 0x42
@@ -0,0 +1,145 @@
+"""
+Unit tests for precomputed effect frame tables.
+"""
+
+import time
+
+import pytest
+from unittest.mock import AsyncMock
+
+from core.effects import (
+    EffectFrameCache, EffectScheduler, build_frame_table, effect_period, RAINBOW_COLORS
+)
+from core.drivers.elk_bledom import ElkBledomDriver
+from core.drivers.tuya import TuyaDriver
+from core.models import Color, ColorMode, DeviceConfig
+from core.controller import BleDeviceController
+
+
+class TestFrameTables:
+    """Tests for build_frame_table and effect_period."""
+    
+    def test_default_speed_keeps_legacy_timing(self):
+        """Speed 0x10 gives the original 314 x 20 ms breath cycle."""
+        table = build_frame_table(ColorMode.BREATH, 1.0, 0x10)
+        assert table.frames == 314
+        assert table.frame_interval == pytest.approx(0.02, rel=0.01)
+    
+    def test_speed_changes_period(self):
+        """Higher speed means a shorter cycle."""
+        assert effect_period(ColorMode.BREATH, 255) < effect_period(ColorMode.BREATH, 16)
+        assert effect_period(ColorMode.BREATH, 0) == pytest.approx(2 * effect_period(ColorMode.BREATH, 16))
+    
+    def test_brightness_is_baked_in(self):
+        """Table colors already have brightness applied."""
+        full = build_frame_table(ColorMode.RAINBOW, 1.0, 16)
+        half = build_frame_table(ColorMode.RAINBOW, 0.5, 16)
+        assert full.colors[0] == Color(*RAINBOW_COLORS[0])
+        assert half.colors[0] == Color(127, 0, 0)
+    
+    def test_rainbow_holds_each_color(self):
+        """Rainbow frames repeat shared Color instances."""
+        table = build_frame_table(ColorMode.RAINBOW, 1.0, 16)
+        assert len(set(map(id, table.colors))) == len(RAINBOW_COLORS)
+    
+    def test_packets_for_encodes_every_frame(self):
+        """Encoded packets match encode_color and are immutable copies."""
+        table = build_frame_table(ColorMode.RAINBOW, 1.0, 16)
+        driver = TuyaDriver()
+        packets = table.packets_for(driver)
+        assert len(packets) == table.frames
+        assert packets[0] == bytes([TuyaDriver.CMD_COLOR, 3, 255, 0, 0])
+        assert all(isinstance(p, bytes) for p in packets)
+        assert table.packets_for(driver) is packets
+
+
+class TestEffectFrameCache:
+    """Tests for EffectFrameCache."""
+    
+    def test_hit_and_miss(self):
+        """Same parameters reuse the table."""
+        cache = EffectFrameCache()
+        first = cache.get(ColorMode.BREATH, 1.0, 16)
+        second = cache.get(ColorMode.BREATH, 1.0, 16)
+        assert first is second
+        assert (cache.hits, cache.misses) == (1, 1)
+    
+    def test_lru_eviction(self):
+        """Least recently used table is evicted first."""
+        cache = EffectFrameCache(max_entries=2)
+        a = cache.get(ColorMode.BREATH, 1.0, 16)
+        cache.get(ColorMode.RAINBOW, 1.0, 16)
+        cache.get(ColorMode.BREATH, 1.0, 16)
+        cache.get(ColorMode.BREATH, 0.5, 16)
+        assert len(cache) == 2
+        assert cache.get(ColorMode.BREATH, 1.0, 16) is a
+    
+    def test_controller_invalidates_on_brightness_and_speed(self):
+        """Brightness or speed change drops cached tables."""
+        cfg = DeviceConfig(target_mac="")
+        ctrl = BleDeviceController(cfg, lambda s: None, lambda c: None, use_real_device=False)
+        ctrl.effect_cache.get(ColorMode.BREATH, 1.0, ctrl.speed)
+        ctrl.set_brightness(0.4)
+        assert len(ctrl.effect_cache) == 0
+        ctrl.effect_cache.get(ColorMode.BREATH, 0.4, ctrl.speed)
+        ctrl.set_speed(ctrl.speed + 1)
+        assert len(ctrl.effect_cache) == 0
+
+
+class TestEffectScheduler:
+    """Tests for the deadline-based EffectScheduler."""
+    
+    @pytest.mark.asyncio
+    async def test_frames_follow_absolute_deadlines(self):
+        """Per-frame work does not accumulate into drift."""
+        scheduler = EffectScheduler(frame_interval=0.01)
+        times = []
+        for _ in range(10):
+            times.append(await scheduler.wait_next_frame())
+            time.sleep(0.004)  # Simulated write latency below one interval
+        # 10 frames span 9 intervals, not 9 x (interval + latency)
+        assert times[-1] == pytest.approx(0.09, abs=0.02)
+        assert scheduler.frames_dropped == 0
+    
+    @pytest.mark.asyncio
+    async def test_late_frames_are_dropped(self):
+        """A stall longer than several intervals skips frames instead of queuing them."""
+        scheduler = EffectScheduler(frame_interval=0.01)
+        await scheduler.wait_next_frame()
+        time.sleep(0.055)
+        t = await scheduler.wait_next_frame()
+        assert scheduler.frames_dropped >= 4
+        assert scheduler.jitter_max >= 0.04
+        # Effect time tracks the wall clock, so the effect does not slow down
+        assert t >= 0.055
+        
+        # Next frame is back on the regular grid
+        start = time.monotonic()
+        await scheduler.wait_next_frame()
+        assert time.monotonic() - start < 0.02
+
+
+@pytest.mark.asyncio
+async def test_controller_plays_table_as_pre_encoded_frames():
+    """Playback writes cached packets through write_frame."""
+    cfg = DeviceConfig(target_mac="")
+    ctrl = BleDeviceController(cfg, lambda s: None, lambda c: None, use_real_device=False)
+    ctrl.is_running = True
+    ctrl.current_mode = ColorMode.RAINBOW
+    ctrl.speed = 255  # Shortest cycle
+    from core.rate_limiter import RateGovernor
+    ctrl.rate_governor = RateGovernor(max_rate=1000.0, initial_rate=1000.0)
+    
+    driver = ElkBledomDriver()
+    driver.write_frame = AsyncMock(return_value=True)
+    driver.set_color = AsyncMock(return_value=True)
+    ctrl.device_driver = driver
+    
+    await ctrl._execute_rainbow_mode()
+    
+    # Consecutive identical frames are deduplicated by the shadow
+    # (the cycle may wrap onto the first color once)
+    assert len(RAINBOW_COLORS) <= driver.write_frame.call_count <= len(RAINBOW_COLORS) + 1
+    driver.set_color.assert_not_called()
+    table = ctrl.effect_cache.get(ColorMode.RAINBOW, 1.0, 255)
+    assert driver.write_frame.call_args_list[0][0][0] == table.packets_for(driver)[0]
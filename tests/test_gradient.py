@@ -0,0 +1,134 @@
+"""
+Unit tests for the metric-to-color gradient engine.
+"""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from core.gradient import GradientLUT, MetricColorMapper
+from core.models import Color, ColorMode, DeviceConfig
+from core.services import ConfigService
+from core.controller import BleDeviceController
+
+
+def _cpu_mapper(**overrides) -> MetricColorMapper:
+    config = dict(ConfigService.DEFAULT_CONFIG["gradients"]["CPU"])
+    config.update(overrides)
+    return MetricColorMapper.from_config(config)
+
+
+class TestGradientLUT:
+    """Tests for GradientLUT."""
+    
+    def test_endpoints_match_stops(self):
+        """First and last entries are the outer stop colors."""
+        lut = GradientLUT([(0.0, Color(0, 0, 0)), (1.0, Color(255, 255, 255))])
+        assert len(lut.colors) == 256
+        assert lut.color_at(0) == Color(0, 0, 0)
+        assert lut.color_at(255) == Color(255, 255, 255)
+    
+    def test_interpolates_between_stops(self):
+        """Midpoint is halfway between the two stops."""
+        lut = GradientLUT([(0.0, Color(0, 0, 0)), (1.0, Color(254, 0, 100))])
+        mid = lut.color_at(128)
+        assert mid.r == pytest.approx(127, abs=1)
+        assert mid.b == pytest.approx(50, abs=1)
+    
+    def test_from_config_accepts_hex_and_dict(self):
+        """Stops may be given as hex strings or r/g/b dicts."""
+        lut = GradientLUT.from_config([
+            {"at": 1.0, "color": {"r": 0, "g": 0, "b": 255}},
+            {"at": 0.0, "color": "#FF0000"},
+        ])
+        assert lut.color_at(0) == Color(255, 0, 0)
+        assert lut.color_at(255) == Color(0, 0, 255)
+    
+    def test_requires_a_stop(self):
+        """Empty gradients are rejected."""
+        with pytest.raises(ValueError):
+            GradientLUT([])
+
+
+class TestMetricColorMapper:
+    """Tests for MetricColorMapper."""
+    
+    def test_first_reading_emits(self):
+        """The first reading always produces a color."""
+        mapper = _cpu_mapper()
+        assert mapper.update(0.0) == Color(0, 200, 255)
+    
+    def test_noise_does_not_emit(self):
+        """Small jitter around a value stays inside the hysteresis band."""
+        mapper = _cpu_mapper()
+        mapper.update(50.0)
+        emitted = [mapper.update(v) for v in (50.5, 49.5, 51.0, 49.0, 50.0)]
+        assert emitted == [None] * 5
+    
+    def test_threshold_crossing_is_smooth(self):
+        """Crossing the old 40 % threshold no longer snaps between colors."""
+        mapper = _cpu_mapper(smoothing=1.0)
+        below = mapper.update(39.0)
+        above = mapper.update(41.0) or mapper.current
+        assert max(abs(below.r - above.r), abs(below.g - above.g), abs(below.b - above.b)) < 20
+    
+    def test_smoothing_converges(self):
+        """A sustained change is eventually shown (within the emit threshold)."""
+        mapper = _cpu_mapper()
+        mapper.update(0.0)
+        for _ in range(50):
+            mapper.update(100.0)
+        red = Color(255, 0, 0)
+        current = mapper.current
+        assert max(abs(current.r - red.r), abs(current.g - red.g), abs(current.b - red.b)) <= mapper.emit_threshold
+    
+    def test_fewer_emissions_than_readings(self):
+        """Noisy input produces far fewer writes than samples."""
+        mapper = _cpu_mapper()
+        readings = [50 + (7 if i % 2 else -7) for i in range(100)]
+        emitted = sum(1 for v in readings if mapper.update(v) is not None)
+        assert emitted < 10
+
+
+@pytest.mark.asyncio
+async def test_cpu_mode_skips_redundant_writes():
+    """Repeated frames with an unchanged sample are not re-written."""
+    cfg = DeviceConfig(target_mac="")
+    ctrl = BleDeviceController(cfg, lambda s: None, lambda c: None, use_real_device=False)
+    buffer = ctrl.metric_sampler.subscribe("cpu")
+    buffer.append(30.0)
+    driver = MagicMock()
+    driver.set_color = AsyncMock(return_value=True)
+    ctrl.device_driver = driver
+    ctrl.current_mode = ColorMode.CPU
+    
+    try:
+        for _ in range(5):
+            await ctrl._execute_metric_mode(ColorMode.CPU)
+    finally:
+        ctrl.metric_sampler.unsubscribe("cpu")
+    
+    assert driver.set_color.await_count == 1
+
+
+def test_controller_uses_configured_gradients():
+    """Gradients passed from config replace the defaults."""
+    cfg = DeviceConfig(target_mac="")
+    gradients = {"CPU": {"stops": [{"at": 0.0, "color": "#010203"}]}}
+    ctrl = BleDeviceController(
+        cfg, lambda s: None, lambda c: None, use_real_device=False, gradients=gradients
+    )
+    assert ctrl.metric_mappers["CPU"].lut.color_at(200) == Color(1, 2, 3)
+
+
+def test_controller_skips_invalid_gradient():
+    """One broken gradient entry is skipped instead of aborting controller construction."""
+    cfg = DeviceConfig(target_mac="")
+    gradients = {
+        "CPU": {"stops": [{"at": 0.0, "color": "#010203"}], "source": "cpu"},
+        "MEMORY": {"stops": [{"at": 0.0, "color": "not-a-color"}], "source": "memory"},
+    }
+    ctrl = BleDeviceController(
+        cfg, lambda s: None, lambda c: None, use_real_device=False, gradients=gradients
+    )
+    assert set(ctrl.metric_mappers) == {"CPU"}
+    assert ctrl.metric_source_specs == {"CPU": "cpu"}
@@ -0,0 +1,249 @@
+"""
+Unit tests for synchronized device groups.
+"""
+
+import asyncio
+import time
+
+import pytest
+from unittest.mock import MagicMock
+
+from core.commands import Command, CommandType
+from core.controller import BleDeviceController
+from core.groups import DeviceGroup
+from core.manager import DeviceManager
+from core.models import Color, ColorMode, DeviceConfig
+from core.rate_limiter import RateGovernor
+from core.sampling import MetricSampler
+
+
+def _member(latency: float, completions: list) -> BleDeviceController:
+    """Connected controller whose driver takes `latency` seconds per write."""
+    ctrl = BleDeviceController(DeviceConfig(target_mac=""), lambda s: None, lambda c: None)
+    ctrl.rate_governor = RateGovernor()
+    ctrl.rate_governor.avg_latency = latency
+    
+    async def set_color(r, g, b):
+        await asyncio.sleep(latency)
+        completions.append(time.monotonic())
+        return True
+    
+    driver = MagicMock()
+    driver.set_color = set_color
+    ctrl.device_driver = driver
+    ctrl.status.is_connected = True
+    return ctrl
+
+
+class TestDeviceGroup:
+    """Tests for DeviceGroup."""
+    
+    @pytest.mark.asyncio
+    async def test_broadcast_compensates_latency(self):
+        """Members with different write latency finish the frame together."""
+        completions = []
+        members = {f"m{i}": _member(latency, completions) for i, latency in enumerate((0.0, 0.04, 0.08))}
+        group = DeviceGroup("g", members, asyncio.get_running_loop())
+        
+        start = time.monotonic()
+        await group.broadcast(Color(10, 20, 30))
+        
+        assert len(completions) == 3
+        # Fan-out is concurrent: one frame costs the slowest link, not the sum
+        assert time.monotonic() - start < 0.12
+        assert max(completions) - min(completions) < 0.03
+        assert group.skew_ms is not None and group.skew_ms < 30
+        assert all(m.shadow.color == Color(10, 20, 30) for m in members.values())
+    
+    @pytest.mark.asyncio
+    async def test_rate_governor_waits_do_not_skew_members(self):
+        """Members whose next write slot differs still finish the frame together."""
+        completions = []
+        members = {f"m{i}": _member(latency, completions) for i, latency in enumerate((0.0, 0.04))}
+        # m0 wrote recently at its own rate: its next slot is 100 ms away
+        members["m0"].rate_governor._next_slot = time.monotonic() + 0.1
+        group = DeviceGroup("g", members, asyncio.get_running_loop())
+        
+        await group.broadcast(Color(10, 20, 30))
+        
+        assert len(completions) == 2
+        assert group.skew_ms < 20
+    
+    @pytest.mark.asyncio
+    async def test_slow_member_skew_converges(self):
+        """A member slower than its latency estimate is compensated via its skew average."""
+        completions = []
+        members = {"fast": _member(0.0, completions), "slow": _member(0.03, completions)}
+        for member in members.values():
+            member.rate_governor.rate = member.rate_governor.max_rate = 1000.0
+        # The slow link's latency estimate never catches up with reality
+        members["slow"].rate_governor.avg_latency = 0.0
+        members["slow"].rate_governor.record_success = lambda latency: None
+        group = DeviceGroup("g", members, asyncio.get_running_loop(), skew_alpha=0.3)
+    
+        await group.broadcast(Color(1, 0, 0))
+        assert group.skew_ms >= 25
+        for i in range(2, 22):
+            await group.broadcast(Color(i, 0, 0))
+    
+        # Two members: each sits half the uncompensated 30 ms from the median
+        assert group.member_skew_ms["slow"] == pytest.approx(15, abs=5)
+        assert group.member_skew_ms["fast"] == pytest.approx(-15, abs=5)
+        assert group.member_delay_ms["fast"] == pytest.approx(30, abs=8)
+        assert group.member_delay_ms["slow"] == 0.0
+        assert group.skew_ms < 10
+    
+    @pytest.mark.asyncio
+    async def test_render_error_does_not_stop_group(self):
+        """A failing frame is logged and the render loop keeps going."""
+        members = {"m0": _member(0.0, [])}
+        group = DeviceGroup("g", members, asyncio.get_running_loop())
+        calls = []
+        
+        async def broadcast(color, frame_for=None):
+            calls.append(color)
+            if len(calls) == 1:
+                raise RuntimeError("render failed")
+        
+        group.broadcast = broadcast
+        group.is_running = True
+        task = asyncio.ensure_future(group._run())
+        await asyncio.sleep(0)
+        group._apply_command(Command(CommandType.COLOR, Color(1, 2, 3)))
+        for _ in range(100):
+            if len(calls) >= 2:
+                break
+            await asyncio.sleep(0.01)
+        group.is_running = False
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        
+        assert len(calls) >= 2
+    
+    @pytest.mark.asyncio
+    async def test_uncompensated_skew_is_measured(self):
+        """Skew reflects the spread of completion times."""
+        completions = []
+        members = {f"m{i}": _member(latency, completions) for i, latency in enumerate((0.0, 0.05))}
+        for member in members.values():
+            member.rate_governor.avg_latency = None  # nothing learned yet
+        group = DeviceGroup("g", members, asyncio.get_running_loop())
+        
+        await group.broadcast(Color(1, 1, 1))
+        
+        assert group.skew_ms >= 40
+    
+    @pytest.mark.asyncio
+    async def test_disconnected_members_are_skipped(self):
+        """Only connected members receive frames."""
+        completions = []
+        online = _member(0.0, completions)
+        offline = _member(0.0, completions)
+        offline.status.is_connected = False
+        group = DeviceGroup("g", {"a": online, "b": offline}, asyncio.get_running_loop())
+        
+        await group.broadcast(Color(5, 5, 5))
+        
+        assert online.shadow.color == Color(5, 5, 5)
+        assert offline.shadow.color is None
+    
+    @pytest.mark.asyncio
+    async def test_grouped_member_does_not_render_itself(self):
+        """A grouped controller only syncs the device mode."""
+        completions = []
+        member = _member(0.0, completions)
+        member.group = object()
+        member.current_mode = ColorMode.MANUAL
+        member.current_color = Color(9, 9, 9)
+        
+        await member._execute_mode()
+        
+        assert completions == []
+        assert member._effect_task is None
+
+    
+    @pytest.mark.asyncio
+    async def test_metric_frame_uses_own_mapper(self):
+        """The group maps metrics with its own state, not the first member's mapper."""
+        members = {"m0": _member(0.0, [])}
+        sampler = MetricSampler(interval=10.0)
+        sampler.start = lambda: None  # samples pushed by the test
+        buffer = sampler.subscribe("cpu", MagicMock())
+        buffer.append(80.0)
+        group = DeviceGroup("g", members, asyncio.get_running_loop(), metric_sampler=sampler)
+        
+        await group._render_metric_frame(ColorMode.CPU)
+        
+        member_mapper = members["m0"].metric_mappers["CPU"]
+        assert group.metric_mapper is not member_mapper
+        assert group.metric_mapper.current is not None
+        assert member_mapper.current is None
+        group._release_metric()
+        sampler.unsubscribe("cpu")
+
+class TestGroupCommands:
+    """Tests for group command routing."""
+    
+    def test_manager_routes_group_targets(self):
+        """A group id is targeted like a device id."""
+        manager = DeviceManager()
+        for i in range(3):
+            manager.add_device(DeviceConfig(target_mac="", device_id=f"d{i}"))
+        group = manager.add_group("desk", ["d0", "d1"])
+        group.submit = MagicMock()
+        
+        manager.submit(Command(CommandType.COLOR, Color(1, 2, 3)), "desk")
+        group.submit.assert_called_once()
+        assert all(len(c.commands) == 0 for c in manager.controllers.values())
+        
+        # Broadcast: group members only through the group
+        manager.submit(Command(CommandType.MODE, ColorMode.BREATH))
+        assert len(manager.controllers["d0"].commands) == 0
+        assert len(manager.controllers["d2"].commands) == 1
+    
+    def test_device_in_one_group_only(self):
+        """Groups cannot share members."""
+        manager = DeviceManager()
+        manager.add_device(DeviceConfig(target_mac="", device_id="d0"))
+        manager.add_group("a", ["d0"])
+        with pytest.raises(ValueError):
+            manager.add_group("b", ["d0"])
+    
+    def test_mode_is_mirrored_to_members(self):
+        """Group mode changes set the members' device mode."""
+        members = {f"m{i}": _member(0.0, []) for i in range(2)}
+        group = DeviceGroup("g", members, asyncio.new_event_loop())
+        group._apply_command(Command(CommandType.MODE, ColorMode.RAINBOW))
+        group._apply_command(Command(CommandType.SPEED, 40))
+        assert all(m.current_mode == ColorMode.RAINBOW for m in members.values())
+        assert all(m.speed == 40 for m in members.values())
+        group.loop.close()
+
+
+def test_group_effect_runs_on_shared_clock(monkeypatch, idle_scanner):
+    """A running group plays an effect to all members from one clock."""
+    # Only the group renders; member connection tasks are not needed here
+    monkeypatch.setattr(BleDeviceController, "start", lambda self: None)
+    manager = DeviceManager(scanner=idle_scanner)
+    completions = []
+    for i in range(2):
+        controller = manager.add_device(DeviceConfig(target_mac="", device_id=f"d{i}"))
+        member = _member(0.0, completions)
+        controller.rate_governor = member.rate_governor
+        controller.device_driver = member.device_driver
+        controller.status.is_connected = True
+    group = manager.add_group("all", ["d0", "d1"])
+    group.submit(Command(CommandType.MODE, ColorMode.RAINBOW))
+    
+    manager.start()
+    try:
+        deadline = time.monotonic() + 2.0
+        while group.frames_broadcast < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        manager.stop()
+    
+    assert group.frames_broadcast >= 1
+    assert all(c.group is None for c in manager.controllers.values())
+    colors = {c.shadow.color for c in manager.controllers.values()}
+    assert len(colors) == 1
@@ -0,0 +1,121 @@
+"""
+Unit tests for the multi-device manager.
+"""
+
+import threading
+import time
+
+import pytest
+
+from core.commands import Command, CommandType
+from core.controller import BleDeviceController
+from core.manager import DeviceManager
+from core.models import Color, DeviceConfig
+from core.services import ConfigService
+
+
+def _config(index: int) -> DeviceConfig:
+    return DeviceConfig(target_mac=f"AA:BB:CC:DD:EE:{index:02X}", device_id=f"strip-{index}")
+
+
+class TestDeviceManager:
+    """Tests for DeviceManager."""
+    
+    def test_devices_share_one_loop_without_extra_threads(self, monkeypatch, idle_scanner):
+        """N devices run as tasks on one loop thread."""
+        async def no_device(self):
+            return None
+        monkeypatch.setattr(BleDeviceController, "_find_device", no_device)
+        
+        manager = DeviceManager(scanner=idle_scanner)
+        controllers = [manager.add_device(_config(i)) for i in range(20)]
+        before = threading.active_count()
+        manager.start()
+        try:
+            deadline = time.monotonic() + 2.0
+            while any(c._main_task is None for c in controllers) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert all(c.loop is manager.loop for c in controllers)
+            assert all(c._main_task is not None for c in controllers)
+            assert threading.active_count() == before + 1
+            assert not any(t.name == "BLE-Controller" for t in threading.enumerate())
+        finally:
+            start = time.monotonic()
+            manager.stop()
+        # Cancelled out of their reconnect sleeps, not waited out
+        assert time.monotonic() - start < 2.0
+        assert all(c._main_task.done() for c in controllers)
+    
+    def test_submit_targets_one_or_all(self):
+        """Commands go to the given device or to every device."""
+        manager = DeviceManager()
+        first = manager.add_device(_config(1))
+        second = manager.add_device(_config(2))
+        
+        manager.submit(Command(CommandType.COLOR, Color(1, 2, 3)), "strip-2")
+        assert len(first.commands) == 0
+        assert len(second.commands) == 1
+        
+        manager.submit(Command(CommandType.MODE, None))
+        assert len(first.commands) == 1
+        assert len(second.commands) == 2
+    
+    def test_rejects_duplicate_ids(self):
+        """Device ids are unique."""
+        manager = DeviceManager()
+        manager.add_device(_config(1))
+        with pytest.raises(ValueError):
+            manager.add_device(_config(1))
+    
+    def test_remove_device_leaves_groups_and_scanner(self, idle_scanner):
+        """A removed device is no group member and no longer watched."""
+        manager = DeviceManager(scanner=idle_scanner)
+        manager.add_device(_config(1))
+        removed = manager.add_device(_config(2))
+        group = manager.add_group("pair", ["strip-1", "strip-2"])
+        removed.group = group
+        
+        manager.remove_device("strip-2")
+        
+        assert group.member_ids == ["strip-1"]
+        assert removed.group is None
+        assert "AA:BB:CC:DD:EE:02" not in idle_scanner._watched
+        assert "AA:BB:CC:DD:EE:01" in idle_scanner._watched
+    
+    def test_status_callback_carries_device_id(self):
+        """Per-device status reaches the callback with its id."""
+        seen = []
+        manager = DeviceManager(lambda device_id, status: seen.append(device_id))
+        controller = manager.add_device(_config(3))
+        controller._emit_status_change("Connected", "connected")
+        assert seen == ["strip-3"]
+        assert manager.statuses()["strip-3"] is controller.status
+    
+    def test_metric_sampler_is_shared(self):
+        """All devices read metrics through the manager's sampler."""
+        manager = DeviceManager()
+        first = manager.add_device(_config(1))
+        second = manager.add_device(_config(2))
+        assert first.metric_sampler is second.metric_sampler is manager.metric_sampler
+
+
+def test_device_configs_from_devices_list(monkeypatch):
+    """The "devices" list takes precedence over the single "device" entry."""
+    config = dict(ConfigService.DEFAULT_CONFIG)
+    config["devices"] = [
+        {"device_id": "desk", "target_mac": "AA:AA:AA:AA:AA:01"},
+        {"target_mac": "AA:AA:AA:AA:AA:02"},
+        {"device_id": "desk", "target_mac": "AA:AA:AA:AA:AA:03"},
+    ]
+    monkeypatch.setattr(ConfigService, "load_config", classmethod(lambda cls: config))
+    configs = ConfigService.get_device_configs()
+    assert [c.device_id for c in configs] == ["desk", "AA:AA:AA:AA:AA:02"]
+
+
+def test_device_configs_fall_back_to_single_device(monkeypatch):
+    """Without a devices list the legacy "device" entry is used."""
+    config = dict(ConfigService.DEFAULT_CONFIG)
+    monkeypatch.setattr(ConfigService, "load_config", classmethod(lambda cls: config))
+    configs = ConfigService.get_device_configs()
+    assert len(configs) == 1
+    assert configs[0].device_id == config["device"]["target_mac"]
@@ -0,0 +1,160 @@
+"""
+Unit tests for the metrics registry, Prometheus export and controller wiring.
+"""
+
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from core.commands import Command, CommandType
+from core.controller import BleDeviceController
+from core.drivers.triones import TrionesDriver
+from core.metrics import DeviceMetrics, Histogram, MetricsRegistry, MetricsServer, summary_lines
+from core.models import Color, DeviceConfig
+
+
+class TestHistogram:
+    """Tests for fixed-bucket histograms."""
+
+    def test_buckets_sum_and_count(self):
+        histogram = Histogram((0.01, 0.1, 1.0))
+        for value in (0.005, 0.01, 0.05, 0.5, 2.0):
+            histogram.observe(value)
+        # Upper bounds are inclusive; 2.0 lands in +Inf
+        assert histogram.counts == [2, 1, 1, 1]
+        assert histogram.count == 5
+        assert histogram.sum == pytest.approx(2.565)
+
+    def test_quantile_is_bucket_upper_bound(self):
+        histogram = Histogram((0.01, 0.1, 1.0))
+        assert histogram.quantile(0.5) is None
+        for _ in range(9):
+            histogram.observe(0.002)
+        histogram.observe(0.5)
+        assert histogram.quantile(0.5) == 0.01
+        assert histogram.quantile(0.99) == 1.0
+
+
+class TestRegistry:
+    """Tests for MetricsRegistry lookups and export."""
+
+    def test_same_name_and_labels_return_same_metric(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("hits_total", "Hits", {"device": "a"})
+        assert registry.counter("hits_total", "Hits", {"device": "a"}) is counter
+        assert registry.counter("hits_total", "Hits", {"device": "b"}) is not counter
+        with pytest.raises(ValueError):
+            registry.gauge("hits_total", "Hits")
+
+    def test_prometheus_text(self):
+        registry = MetricsRegistry()
+        registry.counter("led_writes_total", "Writes", {"device": "desk"}).inc(3)
+        registry.gauge("led_rssi_dbm", "RSSI", {"device": "desk"}).set(-61)
+        registry.gauge("led_unset", "Never set")
+        histogram = registry.histogram("led_latency_seconds", "Latency", (0.01, 0.1), {"device": "desk"})
+        histogram.observe(0.005)
+        histogram.observe(0.05)
+
+        lines = registry.to_prometheus().splitlines()
+        assert "# TYPE led_writes_total counter" in lines
+        assert 'led_writes_total{device="desk"} 3' in lines
+        assert 'led_rssi_dbm{device="desk"} -61' in lines
+        assert not any(line.startswith("led_unset") for line in lines)
+        # Buckets are cumulative
+        assert 'led_latency_seconds_bucket{device="desk",le="0.01"} 1' in lines
+        assert 'led_latency_seconds_bucket{device="desk",le="0.1"} 2' in lines
+        assert 'led_latency_seconds_bucket{device="desk",le="+Inf"} 2' in lines
+        assert 'led_latency_seconds_count{device="desk"} 2' in lines
+
+    def test_label_values_are_escaped(self):
+        registry = MetricsRegistry()
+        registry.counter("c_total", "C", {"device": 'a"b\\c'}).inc()
+        assert 'c_total{device="a\\"b\\\\c"} 1' in registry.to_prometheus()
+
+
+def test_http_endpoint_serves_registry():
+    registry = MetricsRegistry()
+    registry.counter("led_reconnects_total", "Reconnects", {"device": "desk"}).inc(2)
+    server = MetricsServer(registry, port=0)
+    assert server.start()
+    try:
+        url = f"http://127.0.0.1:{server.port}"
+        with urllib.request.urlopen(f"{url}/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert 'led_reconnects_total{device="desk"} 2' in response.read().decode("utf-8")
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{url}/other", timeout=5)
+    finally:
+        server.stop()
+
+
+def _controller(registry: MetricsRegistry) -> BleDeviceController:
+    config = DeviceConfig(target_mac="AA:00", device_id="desk")
+    return BleDeviceController(config, lambda s: None, lambda c: None,
+                               use_real_device=False, metrics_registry=registry)
+
+
+def test_controller_records_writes_per_driver():
+    registry = MetricsRegistry()
+    controller = _controller(registry)
+    controller.device_driver = TrionesDriver()
+    started = time.monotonic()
+    controller._record_write(True, started)
+    controller._record_write(True, started)
+    controller._record_write(False, started)
+
+    writes = controller.metrics.writes_for("triones")
+    assert (writes.attempted.value, writes.succeeded.value, writes.failed.value) == (3, 2, 1)
+    assert writes.latency.count == 2
+    assert summary_lines(registry, "desk")[0] == "triones: 3 writes, 1 failed"
+
+
+def test_controller_tracks_queue_depth_and_connects():
+    registry = MetricsRegistry()
+    controller = _controller(registry)
+    controller.submit(Command(CommandType.COLOR, Color(1, 2, 3)))
+    controller.submit(Command(CommandType.SPEED, 5))
+    assert controller.metrics.queue_depth.value == 2
+    controller._drain_commands()
+    assert controller.metrics.queue_depth.value == 0
+
+    controller._link_lost_at = time.monotonic() - 0.2
+    controller._record_connect(object(), time.monotonic() - 0.05)
+    metrics: DeviceMetrics = controller.metrics
+    assert metrics.reconnects.value == 1
+    assert metrics.connect_duration.count == 1
+    assert metrics.reconnect_duration.sum == pytest.approx(0.2, abs=0.05)
+    assert "Reconnects: 1" in " ".join(summary_lines(registry))
+
+
+def test_dropped_commands_increment_counter():
+    registry = MetricsRegistry()
+    controller = _controller(registry)
+    for _ in range(controller.commands.max_discrete + 3):
+        controller.submit(Command(CommandType.MODE, None))
+    controller._drain_commands()
+    assert controller.metrics.commands_dropped.value == 3
+    controller._drain_commands()
+    assert controller.metrics.commands_dropped.value == 3
+
+
+@pytest.mark.asyncio
+async def test_driver_times_packet_writes():
+    registry = MetricsRegistry()
+    metrics = DeviceMetrics(registry, "desk").packets_for("triones")
+    driver = TrionesDriver()
+    driver.client = MagicMock()
+    driver.client.write_gatt_char = AsyncMock(side_effect=[None, None, OSError("gatt")])
+    driver.packet_metrics = metrics
+
+    await driver.write_packet(b"\x01")
+    await driver.write_packet(b"\x02")
+    with pytest.raises(OSError):
+        await driver.write_packet(b"\x03")
+
+    assert (metrics.written.value, metrics.failed.value) == (2, 1)
+    assert metrics.latency.count == 2
+    assert "led_packets_written_total" in registry.to_prometheus()
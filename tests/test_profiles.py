@@ -0,0 +1,193 @@
+"""
+Unit tests for the per-MAC device profile store.
+"""
+
+import json
+import time
+
+import pytest
+from unittest.mock import MagicMock
+from bleak import BLEDevice
+
+from core.profiles import ProfileStore
+from core.controller import BleDeviceController
+from core.drivers.magichome import MagicHomeDriver
+from core.models import DeviceConfig
+from core.virtual import VirtualBleBackend
+
+
+def _client_with_chars(*char_uuids):
+    client = MagicMock()
+    client.is_connected = True
+    service = MagicMock()
+    service.uuid = "0000ffe0-0000-1000-8000-00805f9b34fb"
+    service.characteristics = [MagicMock(uuid=uuid) for uuid in char_uuids]
+    client.services = [service]
+    return client
+
+
+class TestProfileStore:
+    """Tests for ProfileStore."""
+
+    def test_round_trip_through_file(self, tmp_path):
+        """Profiles saved on connect are found again after reloading the file."""
+        path = tmp_path / "profiles.json"
+        store = ProfileStore(str(path))
+        store.record_connect(
+            "aa:bb:cc:dd:ee:ff",
+            protocol="magichome",
+            write_char_uuid="0000ffe9-0000-1000-8000-00805f9b34fb",
+            connect_time_ms=800.0,
+            services={"0000ffe0-0000-1000-8000-00805f9b34fb": ["0000ffe9-0000-1000-8000-00805f9b34fb"]}
+        )
+
+        profile = ProfileStore(str(path)).load().get("AA:BB:CC:DD:EE:FF")
+        assert profile.protocol == "magichome"
+        assert profile.write_char_uuid.startswith("0000ffe9")
+        assert profile.connect_time_ms == 800.0
+        assert profile.connect_count == 1
+        assert "AA:BB:CC:DD:EE:FF" in json.loads(path.read_text())
+
+    def test_corrupt_file_loads_empty(self, tmp_path):
+        """A broken profile file means no profiles, not a crash."""
+        path = tmp_path / "profiles.json"
+        path.write_text("{not json")
+        assert len(ProfileStore(str(path)).load()) == 0
+
+    def test_consecutive_write_failures_invalidate(self):
+        """The profile is dropped after max_write_failures failures in a row."""
+        store = ProfileStore(None, max_write_failures=3)
+        store.record_connect("AA:01", protocol="triones", write_char_uuid="ffd9", connect_time_ms=None)
+
+        assert store.record_write("AA:01", False) is False
+        assert store.record_write("AA:01", True) is False  # Success resets the count
+        assert store.record_write("AA:01", False) is False
+        assert store.record_write("AA:01", False) is False
+        assert store.record_write("AA:01", False) is True
+        profile = store.get("AA:01")
+        assert profile.protocol is None and profile.write_char_uuid is None
+        # Connect history survives for candidate ranking
+        assert profile.connect_count == 1
+        # Nothing left to invalidate
+        assert store.record_write("AA:01", False) is False
+
+    def test_protocol_change_replaces_profile(self):
+        """A different protocol drops the old GATT layout but keeps the connect history."""
+        store = ProfileStore(None)
+        store.record_connect("AA:01", protocol="triones", write_char_uuid="ffd9",
+                             connect_time_ms=500.0, services={"ffd5": ["ffd9"]})
+        profile = store.record_connect("AA:01", protocol="magichome", write_char_uuid="ffe9",
+                                       connect_time_ms=500.0)
+        assert profile.services == {}
+        assert profile.connect_count == 2
+
+    def test_connect_failures_of_unknown_devices_stay_in_memory(self, tmp_path):
+        """Failing devices that never connected get no persisted profile, but still rank lower."""
+        path = tmp_path / "profiles.json"
+        store = ProfileStore(str(path))
+        store.record_connect_failure("AA:01")
+        store.record_connect_failure("AA:01")
+        assert store.get("AA:01") is None
+        assert store.success_rate("AA:01") < store.success_rate("AA:02") == 0.5
+        assert not path.exists()
+
+        profile = store.record_connect("AA:01", protocol="triones", write_char_uuid="ffd9", connect_time_ms=None)
+        assert profile.connect_failures == 2
+
+    def test_saves_are_batched(self, tmp_path):
+        """Changes within save_interval of the last save wait for a later save or flush()."""
+        path = tmp_path / "profiles.json"
+        store = ProfileStore(str(path), save_interval=60.0)
+        store.record_connect("AA:01", protocol="triones", write_char_uuid="ffd9", connect_time_ms=None)
+        assert "AA:01" in json.loads(path.read_text())
+
+        store.record_connect("AA:02", protocol="triones", write_char_uuid="ffd9", connect_time_ms=None)
+        store.record_connect_failure("AA:01")
+        assert "AA:02" not in json.loads(path.read_text())
+
+        store.flush()
+        data = json.loads(path.read_text())
+        assert "AA:02" in data and data["AA:01"]["connect_failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_driver_uses_known_characteristic_without_walking_services():
+    """With a profiled characteristic, connect() looks it up instead of walking client.services."""
+    driver = MagicHomeDriver()
+    driver.known_write_uuid = "0000ffe9-0000-1000-8000-00805f9b34fb"
+    char = MagicMock(uuid=driver.known_write_uuid)
+    client = MagicMock()
+    client.is_connected = True
+    client.services.get_characteristic.return_value = char
+    client.services.__iter__.side_effect = AssertionError("services walked")
+
+    assert await driver.connect(client)
+    assert driver.write_char is char
+    assert driver.actual_uuid == driver.known_write_uuid
+
+
+@pytest.mark.asyncio
+async def test_controller_skips_fingerprinting_for_profiled_device():
+    """A profiled device gets its stored driver and characteristic directly."""
+    store = ProfileStore(None)
+    store.record_connect("AA:02", protocol="magichome",
+                         write_char_uuid="0000ffe9-0000-1000-8000-00805f9b34fb", connect_time_ms=1200.0)
+    controller = BleDeviceController(DeviceConfig(target_mac="AA:02"), lambda s: None, lambda c: None,
+                                     profile_store=store)
+
+    # Name and UUIDs would fingerprint as ELK-BLEDOM
+    await controller._initialize_driver(BLEDevice("AA:02", "ELK-BLEDOM", None))
+
+    assert isinstance(controller.device_driver, MagicHomeDriver)
+    assert controller.device_driver.known_write_uuid.startswith("0000ffe9")
+    assert controller.connect_time_avg == pytest.approx(1.2)
+
+
+def test_controller_records_profile_and_invalidates_on_failures():
+    """Connect stores the GATT layout; repeated failed writes clear the known characteristic."""
+    store = ProfileStore(None, max_write_failures=2)
+    controller = BleDeviceController(DeviceConfig(target_mac="AA:03"), lambda s: None, lambda c: None,
+                                     profile_store=store)
+    controller.device_driver = MagicHomeDriver()
+    controller.device_driver.actual_uuid = "0000ffe5-0000-1000-8000-00805f9b34fb"
+    controller._update_profile(BLEDevice("AA:03", "MH-1", None), _client_with_chars("0000ffe5-0000-1000-8000-00805f9b34fb"))
+
+    profile = store.get("AA:03")
+    assert profile.protocol == "magichome"
+    assert profile.services == {"0000ffe0-0000-1000-8000-00805f9b34fb": ["0000ffe5-0000-1000-8000-00805f9b34fb"]}
+
+    controller.device_driver.known_write_uuid = profile.write_char_uuid
+    controller._record_write(False, 0.0)
+    controller._record_write(False, 0.0)
+    assert store.get("AA:03").protocol is None
+    assert controller.device_driver.known_write_uuid is None
+
+
+def test_errors_after_connect_are_not_connect_failures():
+    """An exception on an established link does not count against the device."""
+    config = DeviceConfig(target_mac="AA:04", device_name="ELK-BLEDOM", protocol="elk_bledom")
+    backend = VirtualBleBackend.from_configs([config], connect_delay=0.0, write_latency=0.0)
+    backend.advertise_interval = 0.01
+    store = ProfileStore(None)
+    controller = BleDeviceController(config, lambda s: None, lambda c: None, use_real_device=False,
+                                     virtual_backend=backend, profile_store=store, reconnect_interval=1.0)
+    calls = []
+    execute_mode = controller._execute_mode
+
+    async def failing_once():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("supervisor error")
+        await execute_mode()
+
+    controller._execute_mode = failing_once
+    controller.start()
+    try:
+        deadline = time.monotonic() + 5.0
+        while len(calls) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        controller.stop()
+
+    assert len(calls) >= 2
+    assert store.get("AA:04").connect_failures == 0
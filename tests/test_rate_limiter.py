@@ -0,0 +1,100 @@
+"""
+Unit tests for the adaptive AIMD rate governor.
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from core.rate_limiter import RateGovernor
+
+
+class TestRateGovernor:
+    """Tests for RateGovernor."""
+    
+    def test_starts_conservative_and_grows_additively(self):
+        """After the first failure, clean writes slowly raise the rate up to the ceiling."""
+        governor = RateGovernor(max_rate=20.0)
+        assert governor.rate == 10.0
+        governor.record_failure()
+        assert not governor.slow_start
+        
+        previous = governor.rate
+        governor.record_success(0.001)
+        assert previous < governor.rate < previous + 1.0
+        
+        for _ in range(1000):
+            governor.record_success(0.001)
+        assert governor.rate == 20.0
+    
+    def test_slow_start_reaches_ceiling_quickly(self):
+        """Clean traffic doubles the rate per second until the ceiling."""
+        governor = RateGovernor(max_rate=50.0)
+        elapsed = 0.0
+        while governor.rate < 50.0:
+            # Writes go out at the governed rate and take 2 ms each
+            elapsed += governor.interval
+            governor.record_success(0.002)
+            assert elapsed < 10.0
+        # 25 -> 50 fps is one doubling
+        assert elapsed == pytest.approx(1.0, abs=0.2)
+    
+    def test_slow_start_respects_latency_ceiling(self):
+        """Slow start stops growing at 1 / average latency."""
+        governor = RateGovernor(max_rate=50.0)
+        for _ in range(200):
+            governor.record_success(0.05)
+        assert governor.rate == pytest.approx(20.0, rel=0.05)
+    
+    def test_failure_backs_off_multiplicatively(self):
+        """A failed write halves the rate, bounded by min_rate."""
+        governor = RateGovernor(max_rate=40.0, initial_rate=40.0, min_rate=4.0)
+        governor.record_failure()
+        assert governor.rate == 20.0
+        for _ in range(10):
+            governor.record_failure()
+        assert governor.rate == 4.0
+        assert governor.failures == 11
+    
+    def test_measured_latency_caps_rate(self):
+        """Slow write completions cap the rate at 1 / latency."""
+        governor = RateGovernor(max_rate=50.0, initial_rate=50.0)
+        for _ in range(50):
+            governor.record_success(0.1)
+        assert governor.rate == pytest.approx(10.0, rel=0.05)
+    
+    def test_set_max_rate_clamps_current_rate(self):
+        """Lowering the ceiling (driver change) clamps the learned rate."""
+        governor = RateGovernor(max_rate=50.0, initial_rate=50.0)
+        governor.set_max_rate(20.0)
+        assert governor.rate == 20.0
+    
+    @pytest.mark.asyncio
+    async def test_acquire_paces_writes(self):
+        """Consecutive acquires are spaced by the current interval."""
+        governor = RateGovernor(max_rate=100.0, initial_rate=100.0)
+        start = time.monotonic()
+        for _ in range(6):
+            await governor.acquire()
+        elapsed = time.monotonic() - start
+        # First slot is immediate, the next five are 10 ms apart
+        assert elapsed >= 0.045
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_acquires_get_separate_slots(self, monkeypatch):
+        """Two callers waiting at the same time do not share a slot."""
+        governor = RateGovernor(max_rate=20.0, initial_rate=20.0)
+        await governor.acquire()
+        # Slots are what the callers sleep until; wake-up times jitter on a loaded runner
+        slots = []
+        sleep = asyncio.sleep
+        
+        async def record_sleep(delay):
+            slots.append(time.monotonic() + delay)
+            await sleep(delay)
+        
+        monkeypatch.setattr(asyncio, "sleep", record_sleep)
+        await asyncio.gather(governor.acquire(), governor.acquire())
+        assert len(slots) == 2
+        assert slots[1] - slots[0] >= governor.interval * 0.9
@@ -0,0 +1,280 @@
+"""
+Unit tests for background metric sampling.
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from core.sampling import (
+    DiskIoSource, MetricSampler, MetricSnapshot, MetricSource, RingBuffer, create_metric_source
+)
+from core.models import ColorMode, DeviceConfig
+from core.controller import BleDeviceController
+
+
+class TestRingBuffer:
+    """Tests for RingBuffer."""
+    
+    def test_keeps_newest_samples(self):
+        """Oldest samples fall out once capacity is reached."""
+        buffer = RingBuffer(capacity=3)
+        assert buffer.latest() is None
+        for v in range(5):
+            buffer.append(float(v), timestamp=v)
+        assert buffer.values() == [2.0, 3.0, 4.0]
+        assert buffer.latest() == (4, 4.0)
+
+
+class _CountingSource(MetricSource):
+    """Test source returning consecutive integers."""
+    
+    name = "counting"
+    
+    def __init__(self, fail_every: int = 0):
+        super().__init__()
+        self.reads = 0
+        self.fail_every = fail_every
+    
+    def read(self, snapshot):
+        self.reads += 1
+        if self.fail_every and self.reads % self.fail_every == 0:
+            raise RuntimeError("sensor busy")
+        return float(self.reads)
+
+
+class _ReleaseHookLock:
+    """Lock calling a hook right after every release."""
+    
+    def __init__(self, on_release):
+        self._lock = threading.Lock()
+        self._on_release = on_release
+    
+    def __enter__(self):
+        self._lock.acquire()
+    
+    def __exit__(self, *exc):
+        self._lock.release()
+        self._on_release()
+
+
+class TestMetricSampler:
+    """Tests for MetricSampler."""
+    
+    def test_publishes_samples_in_background(self, wait_until):
+        """Samples appear without the caller blocking."""
+        sampler = MetricSampler(interval=0.05)
+        source = _CountingSource()
+        buffer = sampler.subscribe("counting", source)
+        try:
+            wait_until(lambda: len(buffer) >= 3)
+        finally:
+            sampler.unsubscribe("counting")
+        assert len(buffer) >= 3
+        assert buffer.values()[0] == 1.0
+        assert not sampler.is_running
+    
+    def test_only_delta_sources_drop_their_first_read(self):
+        """Priming skips the first read of delta sources, not of gauges."""
+        class _DeltaSource(_CountingSource):
+            needs_priming = True
+        
+        sampler = MetricSampler(interval=10.0)
+        sampler.start = lambda: None  # ticks driven by the test
+        gauge = sampler.subscribe("gauge", _CountingSource())
+        delta = sampler.subscribe("delta", _DeltaSource())
+        sampler.sample_once()
+        sampler.sample_once()
+        assert gauge.values() == [1.0, 2.0]
+        assert delta.values() == [2.0]
+    
+    def test_source_errors_do_not_kill_thread(self, wait_until):
+        """A failing sample is skipped, sampling continues."""
+        sampler = MetricSampler(interval=0.05)
+        buffer = sampler.subscribe("counting", _CountingSource(fail_every=2))
+        try:
+            wait_until(lambda: len(buffer) >= 2)
+        finally:
+            sampler.unsubscribe("counting")
+        assert len(buffer) >= 2
+        assert all(v % 2 for v in buffer.values())
+    
+    def test_shared_subscription_reads_once_per_tick(self, wait_until):
+        """Two subscribers of the same metric share one source and buffer."""
+        sampler = MetricSampler(interval=10.0)
+        source = _CountingSource()
+        first = sampler.subscribe("counting", source)
+        second = sampler.subscribe("counting")
+        try:
+            wait_until(lambda: source.reads >= 1)
+            sampler.sample_once()
+        finally:
+            sampler.unsubscribe("counting")
+        assert first is second
+        assert source.reads == 2
+        assert sampler.is_running  # one subscriber left
+        sampler.unsubscribe("counting")
+        assert not sampler.is_running
+        assert sampler.buffer("counting") is None
+    
+    def test_last_unsubscribe_does_not_wait_for_slow_read(self, wait_until):
+        """Leaving a metric mode on the BLE loop never blocks on a psutil read in progress."""
+        class _SlowSource(_CountingSource):
+            def read(self, snapshot):
+                time.sleep(0.5)
+                return super().read(snapshot)
+
+        sampler = MetricSampler(interval=0.05)
+        source = _SlowSource()
+        sampler.subscribe("slow", source)
+        time.sleep(0.05)  # first read in progress
+        start = time.monotonic()
+        sampler.unsubscribe("slow")
+        assert time.monotonic() - start < 0.1
+        assert not sampler.is_running
+
+        # Resubscribing at once starts a fresh thread
+        buffer = sampler.subscribe("counting", _CountingSource())
+        try:
+            wait_until(lambda: len(buffer) >= 1)
+        finally:
+            sampler.stop()
+        assert len(buffer) >= 1
+    
+    def test_subscribe_racing_last_unsubscribe_keeps_thread(self):
+        """A subscribe landing between the last unsubscribe and its stop keeps sampling alive."""
+        sampler = MetricSampler(interval=10.0)
+        sampler.subscribe("counting", _CountingSource())
+        fired = []
+
+        def subscribe_from_other_thread():
+            # Runs each time unsubscribe() releases the lock; fires once refs hit zero
+            if not sampler._refs and not fired:
+                fired.append(True)
+                other = threading.Thread(target=sampler.subscribe, args=("counting", _CountingSource()))
+                other.start()
+                other.join(timeout=1.0)
+
+        sampler._lock = _ReleaseHookLock(subscribe_from_other_thread)
+        try:
+            sampler.unsubscribe("counting")
+            assert fired
+            assert sampler.is_running
+        finally:
+            sampler.stop()
+    
+    def test_sources_must_implement_read(self):
+        """MetricSource is abstract."""
+        with pytest.raises(TypeError):
+            MetricSource()
+    
+    def test_sources_share_psutil_calls_within_tick(self, monkeypatch):
+        """Per-disk sources reuse one disk_io_counters call per tick."""
+        Disk = namedtuple("Disk", "read_bytes write_bytes")
+        calls = {"n": 0}
+        
+        def fake_counters(perdisk=False):
+            calls["n"] += 1
+            return {"sda": Disk(1000, 0), "sdb": Disk(0, 2000)}
+        
+        monkeypatch.setattr("core.sampling.psutil.disk_io_counters", fake_counters)
+        snapshot = MetricSnapshot()
+        sda = DiskIoSource("sda")
+        sdb = DiskIoSource("sdb")
+        sda.read(snapshot)
+        sdb.read(snapshot)
+        assert calls["n"] == 1
+        assert snapshot.calls == 1
+
+
+class TestMetricSources:
+    """Tests for the metric source registry."""
+    
+    def test_create_from_spec(self):
+        """Specs select a source and optional device."""
+        source = create_metric_source("net:eth0")
+        assert source.name == "net"
+        assert source.device == "eth0"
+        assert create_metric_source("memory").device is None
+    
+    def test_unknown_spec_raises(self):
+        """Unknown sources are rejected."""
+        with pytest.raises(ValueError):
+            create_metric_source("gpu")
+    
+    def test_builtin_sources_read(self):
+        """Every built-in source reads without error (None if unavailable)."""
+        for spec in ("cpu", "memory", "disk_io", "net", "temperature", "load"):
+            source = create_metric_source(spec)
+            snapshot = MetricSnapshot()
+            source.read(snapshot)
+            value = source.read(MetricSnapshot())
+            assert value is None or value >= 0.0
+    
+    def test_rate_source_reports_throughput(self, monkeypatch):
+        """Rate sources convert byte counter deltas into MB/s."""
+        Nic = namedtuple("Nic", "bytes_sent bytes_recv")
+        totals = iter([0, 2_000_000])
+        monkeypatch.setattr(
+            "core.sampling.psutil.net_io_counters",
+            lambda pernic=False: {"eth0": Nic(next(totals), 0)}
+        )
+        clock = iter([100.0, 101.0])
+        monkeypatch.setattr("core.sampling.time.monotonic", lambda: next(clock))
+        source = create_metric_source("net:eth0")
+        assert source.read(MetricSnapshot()) is None
+        assert source.read(MetricSnapshot()) == pytest.approx(2.0)
+
+
+@pytest.mark.asyncio
+async def test_cpu_mode_frame_does_not_block_event_loop():
+    """CPU mode reads the latest sample instead of blocking for 0.5 s."""
+    cfg = DeviceConfig(target_mac="")
+    ctrl = BleDeviceController(cfg, lambda s: None, lambda c: None, use_real_device=False)
+    ctrl.metric_sampler = MetricSampler(interval=10.0)
+    buffer = ctrl.metric_sampler.subscribe("cpu", _CountingSource())
+    buffer.append(85.0)
+    driver = MagicMock()
+    driver.set_color = AsyncMock(return_value=True)
+    ctrl.device_driver = driver
+    
+    start = time.monotonic()
+    try:
+        await ctrl._execute_metric_mode(ColorMode.CPU)
+    finally:
+        ctrl.metric_sampler.unsubscribe("cpu")
+    
+    assert time.monotonic() - start < 0.1
+    assert ctrl.status.cpu_usage == 85.0
+    expected = ctrl.metric_mappers["CPU"].current
+    driver.set_color.assert_called_once_with(expected.r, expected.g, expected.b)
+
+
+@pytest.mark.asyncio
+async def test_metric_mode_uses_configured_source_and_device_cpu_mode():
+    """Memory mode reads its own source and puts the device in its CPU mode."""
+    cfg = DeviceConfig(target_mac="")
+    ctrl = BleDeviceController(cfg, lambda s: None, lambda c: None, use_real_device=False)
+    ctrl.metric_sampler = MetricSampler(interval=10.0)
+    buffer = ctrl.metric_sampler.subscribe("memory", _CountingSource())
+    buffer.append(50.0)
+    driver = MagicMock()
+    driver.set_color = AsyncMock(return_value=True)
+    driver.set_mode = AsyncMock(return_value=True)
+    driver.__class__.get_supported_modes = MagicMock(return_value={"CPU": 7})
+    ctrl.device_driver = driver
+    ctrl.is_running = True
+    ctrl.current_mode = ColorMode.MEMORY
+    
+    try:
+        assert await ctrl._send_mode_command(ColorMode.MEMORY)
+        await ctrl._execute_metric_mode(ColorMode.MEMORY)
+    finally:
+        ctrl.metric_sampler.unsubscribe("memory")
+    
+    driver.set_mode.assert_awaited_once_with(7, ctrl.speed)
+    assert ctrl.status.metric_value == 50.0
+    assert driver.set_color.await_count == 1
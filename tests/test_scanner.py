@@ -0,0 +1,195 @@
+"""
+Unit tests for the continuous BLE scanner and advertisement index.
+"""
+
+import asyncio
+import time
+
+import pytest
+from unittest.mock import AsyncMock
+from bleak import BLEDevice
+from bleak.backends.scanner import AdvertisementData
+
+from core.scanner import Advertisement, AdvertisementIndex, BleScanner
+from core.drivers.device_factory import DeviceFactory
+from core.drivers.tuya import TuyaDriver
+from core.controller import BleDeviceController
+from core.models import DeviceConfig
+
+
+def _advertise(scanner: BleScanner, address: str, name=None, uuids=(), rssi=-60, manufacturer_data=None):
+    device = BLEDevice(address, name, None)
+    data = AdvertisementData(
+        local_name=name,
+        manufacturer_data=manufacturer_data or {},
+        service_data={},
+        service_uuids=list(uuids),
+        tx_power=None,
+        rssi=rssi,
+        platform_data=()
+    )
+    scanner._on_detection(device, data)
+    return device
+
+
+class _FakeBleakScanner:
+    """Stands in for BleakScanner: records lifecycle calls."""
+    
+    def __init__(self, detection_callback=None, scanning_mode="active"):
+        self.detection_callback = detection_callback
+        self.started = False
+    
+    async def start(self):
+        self.started = True
+    
+    async def stop(self):
+        self.started = False
+
+
+class TestAdvertisementIndex:
+    """Tests for AdvertisementIndex."""
+    
+    def test_entries_expire_after_ttl(self):
+        """Entries older than the TTL are evicted."""
+        index = AdvertisementIndex(ttl=10.0)
+        now = time.monotonic()
+        index.update(Advertisement("AA:00", "LED old", -50, (), last_seen=now - 11))
+        index.update(Advertisement("AA:01", "LED new", -70, (), last_seen=now))
+        assert index.get("aa:00") is None
+        assert [e.address for e in index.entries()] == ["AA:01"]
+    
+    def test_entries_sorted_by_signal(self):
+        """Strongest signal first."""
+        index = AdvertisementIndex()
+        now = time.monotonic()
+        for address, rssi in (("A", -80), ("B", -40), ("C", -60)):
+            index.update(Advertisement(address, None, rssi, (), last_seen=now))
+        assert [e.address for e in index.entries()] == ["B", "C", "A"]
+
+
+class TestBleScanner:
+    """Tests for BleScanner filtering and lookups."""
+    
+    def test_driver_service_uuids_are_known(self):
+        """Scanner filters on the UUIDs drivers declare."""
+        scanner = BleScanner(scanner_factory=_FakeBleakScanner)
+        assert "0000fff0-0000-1000-8000-00805f9b34fb" in scanner.service_uuids
+        assert set(DeviceFactory.get_advertised_service_uuids()) == scanner.service_uuids
+    
+    def test_only_supported_devices_are_indexed(self):
+        """Unrelated advertisements are dropped in the callback."""
+        scanner = BleScanner(scanner_factory=_FakeBleakScanner)
+        _advertise(scanner, "11:11:11:11:11:11", "Galaxy Buds")
+        _advertise(scanner, "22:22:22:22:22:22", None, ["0000ffd5-0000-1000-8000-00805f9b34fb"])
+        _advertise(scanner, "33:33:33:33:33:33", "ELK-BLEDOM")
+        scanner.watch("44:44:44:44:44:44")
+        _advertise(scanner, "44:44:44:44:44:44", None)
+        indexed = {e.address for e in scanner.index.entries()}
+        assert indexed == {"22:22:22:22:22:22", "33:33:33:33:33:33", "44:44:44:44:44:44"}
+    
+    def test_rejected_advertisements_are_not_built(self, monkeypatch):
+        """Unsupported devices are dropped before an Advertisement is built."""
+        built = []
+        original = Advertisement.from_classified.__func__
+    
+        def recording(cls, device, *args):
+            built.append(device.address)
+            return original(cls, device, *args)
+    
+        monkeypatch.setattr(Advertisement, "from_classified", classmethod(recording))
+        scanner = BleScanner(scanner_factory=_FakeBleakScanner)
+        _advertise(scanner, "11:11:11:11:11:11", "Galaxy Buds", manufacturer_data={0x004C: b"\x02\x15"})
+        _advertise(scanner, "33:33:33:33:33:33", "ELK-BLEDOM")
+        assert built == ["33:33:33:33:33:33"]
+        assert scanner.index.get("33:33:33:33:33:33").driver_class is not None
+    
+    @pytest.mark.asyncio
+    async def test_wait_for_reads_index_instantly(self):
+        """Known devices are returned without waiting."""
+        scanner = BleScanner(scanner_factory=_FakeBleakScanner)
+        _advertise(scanner, "33:33:33:33:33:33", "ELK-BLEDOM")
+        start = time.monotonic()
+        entry = await scanner.wait_for("33:33:33:33:33:33", timeout=5.0)
+        assert entry is not None and entry.name == "ELK-BLEDOM"
+        assert time.monotonic() - start < 0.01
+    
+    @pytest.mark.asyncio
+    async def test_wait_for_wakes_on_advertisement(self):
+        """A pending lookup completes as soon as the device advertises."""
+        scanner = BleScanner(scanner_factory=_FakeBleakScanner)
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.02, _advertise, scanner, "55:55:55:55:55:55", None)
+        entry = await scanner.wait_for("55:55:55:55:55:55", timeout=1.0)
+        assert entry is not None
+        assert await scanner.wait_for("66:66:66:66:66:66", timeout=0.01) is None
+    
+    @pytest.mark.asyncio
+    async def test_start_and_stop(self):
+        """Scanner lifecycle uses the injected factory."""
+        scanner = BleScanner(scanner_factory=_FakeBleakScanner)
+        assert await scanner.start()
+        assert scanner.is_running
+        await scanner.stop()
+        assert not scanner.is_running
+
+
+@pytest.mark.asyncio
+async def test_controller_finds_device_from_index(monkeypatch):
+    """Reconnect lookups read the index instead of running a blocking scan."""
+    import core.controller as controller_module
+    scanner = BleScanner(scanner_factory=_FakeBleakScanner)
+    await scanner.start()
+    device = _advertise(scanner, "FF:FF:10:69:5B:2A", "ELK-BLEDOM")
+    
+    blocking_scan = AsyncMock(side_effect=AssertionError("blocking scan used"))
+    monkeypatch.setattr(controller_module.BleakScanner, "find_device_by_address", blocking_scan)
+    monkeypatch.setattr(controller_module.BleakScanner, "discover", blocking_scan)
+    
+    ctrl = BleDeviceController(
+        DeviceConfig(target_mac="FF:FF:10:69:5B:2A"), lambda s: None, lambda c: None, scanner=scanner
+    )
+    start = time.monotonic()
+    found = await ctrl._find_device()
+    assert found is device
+    assert time.monotonic() - start < 0.05
+    assert ctrl.device_driver.get_protocol_name() == "ELK-BLEDOM"
+
+
+@pytest.mark.asyncio
+async def test_controller_picks_driver_from_manufacturer_data():
+    """A fingerprinted advertisement selects the driver without name or UUID hints."""
+    scanner = BleScanner(scanner_factory=_FakeBleakScanner)
+    await scanner.start()
+    _advertise(scanner, "77:77:77:77:77:77", "Strip", manufacturer_data={0x07D0: b"\x01\x02"})
+    entry = scanner.index.get("77:77:77:77:77:77")
+    assert entry is not None and entry.driver_class is TuyaDriver
+    
+    ctrl = BleDeviceController(
+        DeviceConfig(target_mac="77:77:77:77:77:77"), lambda s: None, lambda c: None, scanner=scanner
+    )
+    await ctrl._find_device()
+    assert isinstance(ctrl.device_driver, TuyaDriver)
+
+
+def test_rank_candidates_weighs_signal_confidence_and_history():
+    """Signal, fingerprint confidence and connect history all move the ranking."""
+    from core.profiles import ProfileStore
+    from core.scanner import rank_candidates
+    from core.drivers.elk_bledom import ElkBledomDriver
+
+    def adv(address, rssi, confidence, driver_class=ElkBledomDriver):
+        return Advertisement(address, "LED", rssi, (), device=BLEDevice(address, "LED", None),
+                             driver_class=driver_class, confidence=confidence)
+
+    store = ProfileStore(None)
+    strong_generic = adv("AA:01", -50, 0.3)
+    weaker_fingerprinted = adv("AA:02", -60, 0.95)
+    unsupported = adv("AA:03", -30, 0.0, driver_class=None)
+    assert rank_candidates([strong_generic, weaker_fingerprinted, unsupported], store) == [
+        weaker_fingerprinted, strong_generic
+    ]
+
+    # A device that keeps failing to connect drops below a similar one
+    for _ in range(5):
+        store.record_connect_failure("AA:02")
+    assert rank_candidates([weaker_fingerprinted, adv("AA:04", -60, 0.95)], store)[0].address == "AA:04"
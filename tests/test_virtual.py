@@ -0,0 +1,135 @@
+"""
+Unit tests for the virtual BLE device backend.
+"""
+
+import time
+
+import pytest
+
+from core.commands import Command, CommandType
+from core.controller import BleDeviceController
+from core.drivers.elk_bledom import ElkBledomDriver
+from core.drivers.magichome import MagicHomeDriver
+from core.drivers.triones import TrionesDriver
+from core.drivers.tuya import TuyaDriver
+from core.manager import DeviceManager
+from core.models import Color, DeviceConfig
+from core.scanner import BleScanner
+from core.virtual import VirtualBleBackend, VirtualDeviceSpec
+
+
+class TestDecodePacket:
+    """Drivers decode what they encode."""
+
+    @pytest.mark.parametrize("driver_class", [ElkBledomDriver, TrionesDriver, MagicHomeDriver, TuyaDriver])
+    def test_color_round_trip(self, driver_class):
+        packet = driver_class().encode_color(12, 200, 255)
+        assert driver_class.decode_packet(packet) == {"command": "color", "r": 12, "g": 200, "b": 255}
+
+    @pytest.mark.parametrize("driver_class", [ElkBledomDriver, TrionesDriver, MagicHomeDriver, TuyaDriver])
+    def test_garbage_is_not_decoded(self, driver_class):
+        assert driver_class.decode_packet(b"\x00") is None
+
+
+@pytest.mark.asyncio
+async def test_client_delivers_packets_and_simulates_loss():
+    """Writes land in device state after the latency; lost writes change nothing."""
+    backend = VirtualBleBackend([VirtualDeviceSpec("AA:01", "Triones-1", "triones", write_latency=0.0)], seed=1)
+    device = backend.get("aa:01")
+    driver = TrionesDriver()
+
+    async with backend.create_client(device.ble_device) as client:
+        assert await driver.connect(client)
+        assert driver.actual_uuid == TrionesDriver.WRITE_CHAR_UUID
+        assert await driver.set_color(1, 2, 3)
+        assert await driver.set_brightness(100)
+        assert device.color == (1, 2, 3)
+        assert device.brightness == 255
+
+        device.spec.loss_rate = 1.0
+        assert await driver.set_color(9, 9, 9)  # Write without response: loss goes unnoticed
+        assert device.color == (1, 2, 3)
+        assert device.packets_lost == 1
+
+    assert not device.is_connected
+
+
+@pytest.mark.asyncio
+async def test_link_loss_calls_disconnected_callback():
+    backend = VirtualBleBackend([VirtualDeviceSpec("AA:02", write_latency=0.0, disconnect_rate=1.0)])
+    dropped = []
+    client = backend.create_client("AA:02", disconnected_callback=dropped.append)
+    await client.connect()
+    driver = ElkBledomDriver()
+    await driver.connect(client)
+
+    assert not await driver.set_color(1, 1, 1)
+    assert dropped == [client]
+    assert not client.is_connected
+    assert backend.get("AA:02").disconnects == 1
+
+
+@pytest.mark.asyncio
+async def test_scanner_indexes_virtual_devices():
+    """BleScanner runs on the virtual scanner and classifies what it advertises."""
+    backend = VirtualBleBackend([VirtualDeviceSpec("AA:03", "MH-Strip", "magichome")], advertise_interval=0.01)
+    scanner = BleScanner(scanner_factory=backend.create_scanner)
+    assert await scanner.start()
+    try:
+        advertisement = await scanner.wait_for("AA:03", timeout=1.0)
+    finally:
+        await scanner.stop()
+    assert advertisement.driver_class is MagicHomeDriver
+
+
+def test_controller_runs_against_virtual_device(wait_until):
+    """use_real_device=False: find, connect, write and reconnect without an adapter."""
+    config = DeviceConfig(target_mac="AA:04", device_name="ELK-BLEDOM", protocol="elk_bledom")
+    backend = VirtualBleBackend.from_configs([config], connect_delay=0.0, write_latency=0.0)
+    backend.advertise_interval = 0.01
+    device = backend.get("AA:04")
+    ctrl = BleDeviceController(config, lambda s: None, lambda c: None, use_real_device=False,
+                               virtual_backend=backend, keepalive_interval=0)
+    ctrl.set_color(Color(10, 20, 30))
+    ctrl.start()
+    try:
+        assert wait_until(lambda: device.color == (10, 20, 30))
+        device.drop_link()
+        assert wait_until(lambda: device.connects == 2)
+        ctrl.set_color(Color(40, 50, 60))
+        assert wait_until(lambda: device.color == (40, 50, 60))
+    finally:
+        ctrl.stop()
+
+
+def test_controller_stays_disconnected_until_connect_command(wait_until):
+    """A disconnect request must not turn into an immediate fast-path reconnect loop."""
+    config = DeviceConfig(target_mac="AA:06", device_name="ELK-BLEDOM", protocol="elk_bledom")
+    backend = VirtualBleBackend.from_configs([config], connect_delay=0.0, write_latency=0.0)
+    backend.advertise_interval = 0.01
+    device = backend.get("AA:06")
+    ctrl = BleDeviceController(config, lambda s: None, lambda c: None, use_real_device=False,
+                               virtual_backend=backend, keepalive_interval=0)
+    ctrl.start()
+    try:
+        assert wait_until(lambda: device.connects == 1)
+        ctrl.submit(Command(CommandType.DISCONNECT))
+        assert wait_until(lambda: device.client is None)
+        connects = device.connects
+        time.sleep(0.3)
+        assert device.connects == connects
+        assert not ctrl.status.is_connected
+
+        ctrl.submit(Command(CommandType.CONNECT))
+        assert wait_until(lambda: device.connects == connects + 1)
+    finally:
+        ctrl.stop()
+
+
+
+def test_manager_uses_virtual_backend_for_all_devices():
+    backend = VirtualBleBackend([VirtualDeviceSpec("AA:05")])
+    manager = DeviceManager(virtual_backend=backend)
+    controller = manager.add_device(DeviceConfig(target_mac="AA:05"))
+    assert controller.virtual_backend is backend
+    assert manager.profile_store.path is None  # Virtual runs never touch the profile file
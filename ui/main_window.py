@@ -9,7 +9,7 @@ from core.models import Color, ColorMode, DeviceStatus, AppPreferences, ColorPre
 from core.services import ConfigService, LoggerService as logger
 from ui.components import (
     NavButton, EffectListItem, ScheduleCard, DeviceListItem,
-    ColorPreview, ColorWheelPicker, SliderGroup
+    ColorPreview, ColorWheelPicker, SliderGroup, DeviceDiscoveryList
 )
 
 
@@ -22,6 +22,8 @@ class ModernUIController:
         self.on_brightness_changed: Optional[Callable[[float], None]] = None
         self.on_speed_changed: Optional[Callable[[int], None]] = None
         self.on_preferences_saved: Optional[Callable[[], None]] = None
+        self.on_scan_requested: Optional[Callable[[], list]] = None
+        self.on_metrics_requested: Optional[Callable[[], List[str]]] = None
     
     def emit_color_change(self, color: Color):
         """Emit color change event."""
@@ -42,6 +44,18 @@ class ModernUIController:
         """Emit speed change event."""
         if self.on_speed_changed:
             self.on_speed_changed(speed)
+    
+    def request_scan(self) -> list:
+        """Get currently advertising devices (empty if no handler is wired)."""
+        if self.on_scan_requested:
+            return self.on_scan_requested()
+        return []
+    
+    def request_metrics(self) -> List[str]:
+        """Get the current metric digest lines (empty if no handler is wired)."""
+        if self.on_metrics_requested:
+            return self.on_metrics_requested()
+        return []
 
 
 # ======================== EFFECTS MAPPING ========================
@@ -58,6 +72,11 @@ EFFECTS_LIST = [
     ("White Gradual Change", ColorMode.MANUAL),
     ("Red Green Cross Fade", ColorMode.MANUAL),
     ("CPU Monitor (Breath)", ColorMode.CPU),
+    ("RAM Monitor", ColorMode.MEMORY),
+    ("Disk Activity Monitor", ColorMode.DISK),
+    ("Network Activity Monitor", ColorMode.NETWORK),
+    ("Temperature Monitor", ColorMode.TEMPERATURE),
+    ("System Load Monitor", ColorMode.LOAD),
     ("Neon Breath", ColorMode.BREATH),
     ("Rainbow Cycle", ColorMode.RAINBOW),
 ]
@@ -628,7 +647,7 @@ class DashboardView(ctk.CTk):
         device_item.pack(fill="x", pady=10)
         self.device_items.append(device_item)
         
-        # Scan button (placeholder)
+        # Scan button (reads the live advertisement index)
         ctk.CTkButton(
             scroll_frame,
             text="Scan for Devices",
@@ -636,6 +655,30 @@ class DashboardView(ctk.CTk):
             fg_color="#3a3a3a",
             height=40
         ).pack(fill="x", pady=15)
+        
+        # Discovered devices
+        self.discovery_list = DeviceDiscoveryList(
+            scroll_frame,
+            on_select=self._on_discovered_device_selected,
+            fg_color="#1a1a1a"
+        )
+        self.discovery_list.pack(fill="both", expand=True, pady=10)
+        
+        # Link metrics (refreshed with the device status)
+        ctk.CTkLabel(
+            scroll_frame,
+            text="Link Metrics",
+            font=("Arial", 12, "bold"),
+            text_color="#e0e0e0"
+        ).pack(anchor="w", pady=(15, 5))
+        self.metrics_label = ctk.CTkLabel(
+            scroll_frame,
+            text="--",
+            font=("Consolas", 10),
+            text_color="#a0a0a0",
+            justify="left"
+        )
+        self.metrics_label.pack(anchor="w")
     
     def _on_device_connect(self):
         """Handle device connect."""
@@ -648,6 +691,15 @@ class DashboardView(ctk.CTk):
     def _on_scan_devices(self):
         """Handle scan devices."""
         logger.info("Scanning for devices...")
+        devices = self.controller.request_scan()
+        self.discovery_list.clear()
+        for device in devices:
+            self.discovery_list.add_device(device.name or "Unknown", device.address, device.rssi)
+        logger.info(f"Found {len(devices)} devices")
+    
+    def _on_discovered_device_selected(self, name: str, mac: str):
+        """Handle selection of a discovered device."""
+        logger.info(f"Discovered device selected: {name} ({mac})")
     
     # ======================== SETTINGS MODAL ========================
     
@@ -730,6 +782,19 @@ class DashboardView(ctk.CTk):
         # Update device list if visible
         if self.device_items:
             self.device_items[0].update_connection_status(status.is_connected)
+        
+        self.update_metrics()
+    
+    def update_metrics(self):
+        """Refresh the link metrics panel."""
+        if getattr(self, "metrics_label", None) is None:
+            return
+        try:
+            lines = self.controller.request_metrics()
+        except Exception as e:
+            logger.debug(f"Metrics refresh failed: {e}")
+            return
+        self.metrics_label.configure(text="\n".join(lines) if lines else "--")
     
     def on_closing(self):
         """Handle window closing."""
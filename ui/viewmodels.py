@@ -40,6 +40,8 @@ class Application:
                 ui_window.controller.on_mode_changed = self._handle_mode_change
                 ui_window.controller.on_brightness_changed = self._handle_brightness_change
                 ui_window.controller.on_speed_changed = self._handle_speed_change
+                ui_window.controller.on_scan_requested = self.bridge.discovered_devices
+                ui_window.controller.on_metrics_requested = self.bridge.metrics_summary
             
             # Initialize BLE bridge with status callback
             self.bridge.on_status_change = self._handle_device_status_update